@@ -2,46 +2,470 @@
 Microservicio de Cuidados
 Gestiona riegos, fertilización y cuidados generales de las plantas
 """
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from flask_cors import CORS
-from models import CuidadoManager
+from werkzeug.local import LocalProxy
+from models import CAMPOS_CUIDADO, CuidadoManager
+from db import SQLITE_INT_MAX, SQLITE_INT_MIN
+from http_cache import conditional_get
+from streaming import STREAM_CHUNK_SIZE, stream_json
+from compression import init_compression
+from metrics import MULTIPROC_DIR, MetricsRegistry, db_gauges, init_metrics, instrument_manager
+from admin import require_admin
+from query_stats import query_stats
+from profiling import (CpuProfiler, errores_de_perfilado, init_profiling, memory_profiler,
+                       numero_param, parametros_cpu)
+from plantas_client import PlantasServiceError, client_from_env
+from riego_scheduler import RiegoScheduler, SchedulerSync
 from datetime import datetime
+from typing import Optional
+import os
 
-app = Flask(__name__)
-CORS(app)
+# Rutas del servicio; create_app() las registra en cada aplicación
+bp = Blueprint('cuidados', __name__)
 
-# Inicializar el gestor de cuidados
-cuidado_manager = CuidadoManager()
+# Estado de la aplicación que atiende la petición (ver create_app)
+cuidado_manager = LocalProxy(lambda: current_app.extensions['cuidado_manager'])
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
+cpu_profiler = LocalProxy(lambda: current_app.extensions['cpu_profiler'])
+riego_scheduler = LocalProxy(lambda: current_app.extensions['riego_scheduler'])
 
-@app.route('/health', methods=['GET'])
+# Si es 1, un fallo de plantas-service rechaza el registro (503) en lugar de aceptarlo
+VALIDACION_ESTRICTA = os.environ.get('PLANTAS_VALIDACION_ESTRICTA', '0') == '1'
+
+def create_app(config: Optional[dict] = None) -> Flask:
+    """
+    Fábrica de la aplicación (gunicorn "app:create_app()"). Cada llamada crea
+    su propio gestor de cuidados (con su pool de conexiones y, si está
+    activa, la cola de escritura), registro de métricas, perfilador de CPU,
+    cliente de plantas-service y planificador de riegos, así que cada worker
+    arma su estado después del fork en lugar de heredarlo del master.
+    """
+    app = Flask(__name__)
+    if config:
+        app.config.update(config)
+    CORS(app)
+    init_compression(app)
+
+    manager = CuidadoManager()
+
+    # Métricas para /metrics (peticiones HTTP y llamadas al gestor); con
+    # METRICS_MULTIPROC_DIR se suman las de todos los workers
+    registry = MetricsRegistry(MULTIPROC_DIR)
+    init_metrics(app, registry)
+    instrument_manager(manager, registry)
+    db_gauges(registry, manager)
+    registry.iniciar_volcado()
+
+    # Perfilado bajo demanda (/admin/profile/...): sin sesión activa no tiene costo
+    profiler = CpuProfiler()
+    init_profiling(app, profiler)
+
+    # Validación de planta_id contra plantas-service (desactivada si no hay PLANTAS_SERVICE_URL)
+    client = client_from_env()
+    # Planificador de riegos pendientes (requiere plantas-service para conocer la frecuencia)
+    scheduler = RiegoScheduler()
+    sync = SchedulerSync(scheduler, client, manager) if client else None
+
+    app.extensions.update(cuidado_manager=manager, metrics=registry, cpu_profiler=profiler,
+                          plantas_client=client, riego_scheduler=scheduler, scheduler_sync=sync)
+    app.register_blueprint(bp)
+    return app
+
+def _plantas_inexistentes(planta_ids):
+    """
+    Devuelve (ids_inexistentes, error_response) consultando plantas-service.
+    Sin cliente configurado todos los ids se consideran válidos.
+    """
+    plantas_client = current_app.extensions['plantas_client']
+    if plantas_client is None:
+        return set(), None
+    try:
+        existen = plantas_client.existen(planta_ids)
+    except PlantasServiceError as e:
+        if VALIDACION_ESTRICTA:
+            return None, (jsonify({
+                'success': False,
+                'message': f'No se pudo validar planta_id: {str(e)}'
+            }), 503)
+        return set(), None
+    return {planta_id for planta_id, existe in existen.items() if not existe}, None
+
+def _validar_planta_existe(planta_id: int):
+    """Devuelve una respuesta de error si la planta no existe, o None"""
+    inexistentes, error = _plantas_inexistentes([planta_id])
+    if error:
+        return error
+    if inexistentes:
+        return jsonify({
+            'success': False,
+            'message': f'Planta con ID {planta_id} no encontrada'
+        }), 400
+    return None
+
+# Paginación por cursor (keyset) para los listados
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+def _wants_stream() -> bool:
+    """`?stream=1` pide la respuesta en streaming (sin límite de página por defecto)"""
+    return request.args.get('stream', '').lower() in ('1', 'true')
+
+def _entero_param(nombre: str, defecto: Optional[int] = None, minimo: int = 0,
+                  maximo: int = SQLITE_INT_MAX) -> Optional[int]:
+    """
+    Entero del query string dentro de [minimo, maximo]; el máximo por defecto es el
+    de un INTEGER de SQLite, que no puede recibir un int de Python más grande.
+    ValueError con un mensaje legible si falta el número o queda fuera de rango.
+    """
+    valor = request.args.get(nombre)
+    if valor is None:
+        return defecto
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ValueError(f'{nombre} debe ser un número entero')
+    if not minimo <= numero <= maximo:
+        raise ValueError(f'{nombre} debe estar entre {minimo} y {maximo}')
+    return numero
+
+def _pagination_params(stream: bool = False):
+    """
+    Lee `after_id` y `limit` del query string.
+    Con stream=True `limit` es opcional (None = todas las filas) y no tiene máximo.
+    Devuelve (after_id, limit, error_response)
+    """
+    try:
+        after_id = _entero_param('after_id', 0)
+        limit = _entero_param('limit', None if stream else DEFAULT_PAGE_SIZE, 1,
+                              SQLITE_INT_MAX if stream else MAX_PAGE_SIZE)
+    except ValueError as e:
+        return None, None, (jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400)
+    return after_id, limit, None
+
+def _paginate(rows: list, limit: int, key: str = 'id'):
+    """Recorta la página pedida (se consultan limit + 1 filas) y calcula el siguiente cursor"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][key]
+    return rows, None
+
+def _fields_param(permitidos):
+    """
+    Lee `fields` (columnas separadas por comas) del query string.
+    Devuelve (campos, mensaje_error); campos es None si no se pidió proyección.
+    """
+    raw = request.args.get('fields')
+    if raw is None:
+        return None, None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    if not fields or any(f not in permitidos for f in fields):
+        return None, f"fields debe ser una lista de campos entre: {', '.join(permitidos)}"
+    return fields, None
+
+def _epoch_param(nombre: str) -> Optional[int]:
+    """
+    Epoch UTC de un parámetro dado como entero o como fecha ISO 8601 (sin zona: hora local).
+    ValueError si no se puede interpretar o queda fuera del rango de SQLite.
+    """
+    valor = request.args.get(nombre)
+    if valor is None:
+        return None
+    try:
+        epoch = int(valor)
+    except ValueError:
+        try:
+            epoch = int(datetime.fromisoformat(valor).timestamp())
+        except (OverflowError, OSError):
+            raise ValueError(f'{nombre} fuera de rango')
+    if not SQLITE_INT_MIN <= epoch <= SQLITE_INT_MAX:
+        raise ValueError(f'{nombre} fuera de rango')
+    return epoch
+
+def _rango_fechas_params():
+    """
+    Lee `from` (inclusive) y `to` (exclusive) del query string.
+    Devuelve (desde, hasta, mensaje_error) como epoch UTC.
+    """
+    try:
+        desde = _epoch_param('from')
+        hasta = _epoch_param('to')
+    except ValueError:
+        return None, None, 'from y to deben ser fechas ISO 8601 o epoch en segundos'
+    return desde, hasta, None
+
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    plantas_client = current_app.extensions['plantas_client']
     return jsonify({
         'status': 'healthy',
         'service': 'cuidados-service',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'db_pool': cuidado_manager.pool_stats(),
+        'write_queue': cuidado_manager.write_queue_stats(),
+        'plantas_client': plantas_client.stats() if plantas_client else None
+    }), 200
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    GET /metrics
+    Métricas en formato de texto de Prometheus
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+QUERY_STATS_ORDEN = ('total_ms', 'count', 'avg_ms', 'max_ms', 'rows', 'slow')
+
+@bp.route('/admin/queries', methods=['GET'])
+@require_admin
+def admin_queries():
+    """
+    GET /admin/queries?order_by=total_ms&limit=20
+    Estadísticas por sentencia SQL y últimas consultas lentas con su plan
+    """
+    order_by = request.args.get('order_by', 'total_ms')
+    if order_by not in QUERY_STATS_ORDEN:
+        return jsonify({
+            'success': False,
+            'message': f"order_by debe ser una de: {', '.join(QUERY_STATS_ORDEN)}"
+        }), 400
+    try:
+        limit = _entero_param('limit')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    return jsonify({
+        'success': True,
+        'data': query_stats.snapshot(order_by, limit)
     }), 200
 
-@app.route('/api/cuidados', methods=['GET'])
+@bp.route('/admin/queries', methods=['DELETE'])
+@require_admin
+def admin_queries_reset():
+    """
+    DELETE /admin/queries
+    Reinicia las estadísticas de consultas
+    """
+    query_stats.reset()
+    return jsonify({
+        'success': True,
+        'message': 'Estadísticas de consultas reiniciadas'
+    }), 200
+
+@bp.route('/admin/profile/cpu', methods=['POST'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_cpu_start():
+    """
+    POST /admin/profile/cpu?mode=cprofile&seconds=30
+    POST /admin/profile/cpu?mode=sample&requests=500&interval_ms=5
+    Inicia una sesión de perfilado de CPU por tiempo o por cantidad de peticiones
+    """
+    return jsonify({
+        'success': True,
+        'data': cpu_profiler.start(**parametros_cpu(request.args))
+    }), 202
+
+@bp.route('/admin/profile/cpu', methods=['GET'])
+@require_admin
+def admin_profile_cpu_status():
+    """
+    GET /admin/profile/cpu
+    Estado de la sesión de perfilado de CPU actual o de la última
+    """
+    return jsonify({
+        'success': True,
+        'data': cpu_profiler.status()
+    }), 200
+
+@bp.route('/admin/profile/cpu', methods=['DELETE'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_cpu_stop():
+    """
+    DELETE /admin/profile/cpu
+    Termina antes de tiempo la sesión de perfilado de CPU
+    """
+    return jsonify({
+        'success': True,
+        'data': cpu_profiler.stop()
+    }), 200
+
+@bp.route('/admin/profile/cpu/download', methods=['GET'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_cpu_download():
+    """
+    GET /admin/profile/cpu/download?format=raw|text&sort=cumulative&limit=50
+    Descarga el resultado de la última sesión (pstats, informe de texto o pilas folded)
+    """
+    contenido, mimetype, extension = cpu_profiler.resultado(
+        request.args.get('format', 'raw'),
+        request.args.get('sort', 'cumulative'),
+        numero_param(request.args, 'limit', int, 50))
+    return Response(contenido, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=cuidados-service-cpu.{extension}'
+    })
+
+@bp.route('/admin/profile/memory', methods=['POST'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_start():
+    """
+    POST /admin/profile/memory?frames=1
+    Activa tracemalloc y toma la instantánea base para las diferencias
+    """
+    return jsonify({
+        'success': True,
+        'data': memory_profiler.start(numero_param(request.args, 'frames', int, 1))
+    }), 200
+
+@bp.route('/admin/profile/memory', methods=['GET'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_top():
+    """
+    GET /admin/profile/memory?group_by=lineno&limit=20&diff=1
+    Mayores asignaciones de memoria o, con diff=1, cambios desde la instantánea base
+    """
+    top = memory_profiler.top(
+        request.args.get('group_by', 'lineno'),
+        numero_param(request.args, 'limit', int, 20),
+        request.args.get('diff', '').lower() in ('1', 'true'))
+    return jsonify({
+        'success': True,
+        'data': dict(memory_profiler.status(), top=top)
+    }), 200
+
+@bp.route('/admin/profile/memory/download', methods=['GET'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_download():
+    """
+    GET /admin/profile/memory/download
+    Descarga la instantánea actual de tracemalloc (tracemalloc.Snapshot.load)
+    """
+    return Response(memory_profiler.dump(), mimetype='application/octet-stream', headers={
+        'Content-Disposition': 'attachment; filename=cuidados-service-memory.tracemalloc'
+    })
+
+@bp.route('/admin/profile/memory', methods=['DELETE'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_stop():
+    """
+    DELETE /admin/profile/memory
+    Detiene tracemalloc y descarta la instantánea base
+    """
+    return jsonify({
+        'success': True,
+        'data': memory_profiler.stop()
+    }), 200
+
+@bp.route('/api/cuidados', methods=['GET'])
+@conditional_get(lambda scope: cuidado_manager.get_version(scope), 'cuidados')
 def get_cuidados():
     """
-    GET /api/cuidados
-    Obtiene todos los registros de cuidados
+    GET /api/cuidados?after_id=0&limit=100
+    Obtiene los registros de cuidados paginados por cursor
+    GET /api/cuidados?stream=1
+    Exporta todos los cuidados (desde after_id) en streaming
+    Con ?fields=id,tipo,fecha solo se devuelven esas columnas (el id siempre)
+    GET /api/cuidados?from=2024-05-01&to=2024-05-08
+    Solo los cuidados con fecha en [from, to) (ISO 8601 o epoch)
     """
-    cuidados = cuidado_manager.get_all()
+    fields, error = _fields_param(CAMPOS_CUIDADO)
+    if not error:
+        desde, hasta, error = _rango_fechas_params()
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    stream = _wants_stream()
+    after_id, limit, error = _pagination_params(stream)
+    if error:
+        return error
+    if stream:
+        return stream_json(cuidado_manager.iter_all(after_id, limit, STREAM_CHUNK_SIZE, fields,
+                                                    desde, hasta))
+    cuidados, next_cursor = _paginate(
+        cuidado_manager.get_all(after_id, limit + 1, fields, desde, hasta), limit)
     return jsonify({
         'success': True,
         'data': cuidados,
-        'count': len(cuidados)
+        'count': len(cuidados),
+        'next_cursor': next_cursor
     }), 200
 
-@app.route('/api/cuidados/<int:cuidado_id>', methods=['GET'])
+# Máximo de ids aceptados en una consulta por lista de ids
+MAX_IDS = int(os.environ.get('MAX_IDS', 500))
+
+def _parse_ids(raw: str):
+    """
+    Convierte '1,2,3' en [1, 2, 3]; devuelve (ids, mensaje_error).
+    Cada id debe estar entre 1 y el máximo de un INTEGER de SQLite.
+    """
+    try:
+        ids = [int(x) for x in raw.split(',') if x.strip()]
+    except ValueError:
+        return None, 'ids debe ser una lista de enteros separados por comas'
+    if not ids or len(ids) > MAX_IDS:
+        return None, f'ids debe contener entre 1 y {MAX_IDS} elementos'
+    if any(not 0 < i <= SQLITE_INT_MAX for i in ids):
+        return None, f'Cada id debe estar entre 1 y {SQLITE_INT_MAX}'
+    return ids, None
+
+@bp.route('/api/cuidados/plantas', methods=['GET'])
+@conditional_get(lambda scope: cuidado_manager.get_version(scope), 'cuidados')
+def get_cuidados_by_plantas():
+    """
+    GET /api/cuidados/plantas?ids=1,2,3&limit_per_planta=5
+    Obtiene los cuidados de varias plantas en una sola consulta
+    (con limit_per_planta, solo los N más recientes de cada una)
+    """
+    ids, error = _parse_ids(request.args.get('ids', ''))
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    try:
+        limit_per_planta = _entero_param('limit_per_planta', None, 1, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    por_planta = cuidado_manager.get_by_plantas(ids, limit_per_planta)
+    data = [{'planta_id': planta_id, 'cuidados': cuidados, 'count': len(cuidados)}
+            for planta_id, cuidados in por_planta.items()]
+    return jsonify({
+        'success': True,
+        'data': data,
+        'count': len(data)
+    }), 200
+
+@bp.route('/api/cuidados/<int:cuidado_id>', methods=['GET'])
 def get_cuidado(cuidado_id):
     """
-    GET /api/cuidados/{id}
+    GET /api/cuidados/{id}?fields=tipo,fecha
     Obtiene un registro de cuidado específico
     """
-    cuidado = cuidado_manager.get_by_id(cuidado_id)
+    fields, error = _fields_param(CAMPOS_CUIDADO)
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    cuidado = cuidado_manager.get_by_id(cuidado_id, fields)
     if cuidado:
         return jsonify({
             'success': True,
@@ -52,21 +476,154 @@ def get_cuidado(cuidado_id):
         'message': f'Cuidado con ID {cuidado_id} no encontrado'
     }), 404
 
-@app.route('/api/cuidados/planta/<int:planta_id>', methods=['GET'])
+@bp.route('/api/cuidados/planta/<int:planta_id>', methods=['GET'])
+@conditional_get(lambda scope: cuidado_manager.get_version(scope), lambda planta_id: f'planta:{planta_id}')
 def get_cuidados_by_planta(planta_id):
     """
-    GET /api/cuidados/planta/{planta_id}
-    Obtiene todos los cuidados de una planta específica
+    GET /api/cuidados/planta/{planta_id}?after_id=0&limit=100
+    Obtiene los cuidados de una planta específica paginados por cursor
+    (admite ?stream=1, ?fields= y el rango ?from=&to=)
     """
-    cuidados = cuidado_manager.get_by_planta(planta_id)
+    fields, error = _fields_param(CAMPOS_CUIDADO)
+    if not error:
+        desde, hasta, error = _rango_fechas_params()
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    stream = _wants_stream()
+    after_id, limit, error = _pagination_params(stream)
+    if error:
+        return error
+    if stream:
+        return stream_json(cuidado_manager.iter_by_planta(planta_id, after_id, limit, STREAM_CHUNK_SIZE,
+                                                          fields, desde, hasta),
+                           {'planta_id': planta_id})
+    cuidados, next_cursor = _paginate(
+        cuidado_manager.get_by_planta(planta_id, after_id, limit + 1, fields, desde, hasta), limit)
     return jsonify({
         'success': True,
         'data': cuidados,
         'count': len(cuidados),
-        'planta_id': planta_id
+        'planta_id': planta_id,
+        'next_cursor': next_cursor
+    }), 200
+
+# Posición máxima alcanzable paginando una búsqueda (el costo de OFFSET crece con ella)
+BUSQUEDA_MAX_OFFSET = int(os.environ.get('BUSQUEDA_MAX_OFFSET', 10000))
+
+@bp.route('/api/cuidados/buscar', methods=['GET'])
+@conditional_get(lambda scope: cuidado_manager.get_version(scope), 'cuidados')
+def buscar_cuidados():
+    """
+    GET /api/cuidados/buscar?q=plaga&planta_id=3&offset=0&limit=100
+    Busca en notas y descripción (índice FTS5), de más a menos relevante.
+    Todas las palabras deben aparecer; `palabra*` busca por prefijo.
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({
+            'success': False,
+            'message': 'El parámetro q es requerido'
+        }), 400
+    try:
+        offset = _entero_param('offset', 0, 0, BUSQUEDA_MAX_OFFSET)
+        limit = _entero_param('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        planta_id = _entero_param('planta_id', None, 1)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    # El orden por relevancia no admite cursor por id: se pagina por posición,
+    # hasta BUSQUEDA_MAX_OFFSET para que SQLite no tenga que ordenar y descartar
+    # una cantidad arbitraria de coincidencias en cada página
+    resultados = cuidado_manager.buscar(q, planta_id, offset, limit + 1)
+    hay_mas = len(resultados) > limit and offset + limit <= BUSQUEDA_MAX_OFFSET
+    next_offset = offset + limit if hay_mas else None
+    resultados = resultados[:limit]
+    return jsonify({
+        'success': True,
+        'data': resultados,
+        'count': len(resultados),
+        'q': q,
+        'next_offset': next_offset
     }), 200
 
-@app.route('/api/cuidados/riego', methods=['POST'])
+@bp.route('/api/cuidados/resumen', methods=['GET'])
+@conditional_get(lambda scope: cuidado_manager.get_version(scope), 'cuidados')
+def get_resumenes():
+    """
+    GET /api/cuidados/resumen?after_id=0&limit=100
+    Resumen de cuidados (total de agua, último riego, fertilizaciones...)
+    de cada planta con cuidados, paginado por planta_id
+    """
+    after_id, limit, error = _pagination_params()
+    if error:
+        return error
+    resumenes, next_cursor = _paginate(
+        cuidado_manager.get_resumenes(after_id, limit + 1), limit, key='planta_id')
+    return jsonify({
+        'success': True,
+        'data': resumenes,
+        'count': len(resumenes),
+        'next_cursor': next_cursor
+    }), 200
+
+@bp.route('/api/cuidados/resumen/<int:planta_id>', methods=['GET'])
+@conditional_get(lambda scope: cuidado_manager.get_version(scope), lambda planta_id: f'planta:{planta_id}')
+def get_resumen(planta_id):
+    """
+    GET /api/cuidados/resumen/{planta_id}
+    Resumen de cuidados de una planta
+    """
+    return jsonify({
+        'success': True,
+        'data': cuidado_manager.get_resumen(planta_id)
+    }), 200
+
+# Campos requeridos por tipo de cuidado (mismas reglas que los endpoints individuales)
+CAMPOS_POR_TIPO = {
+    'riego': ['planta_id', 'cantidad_ml'],
+    'fertilizacion': ['planta_id', 'tipo_fertilizante', 'cantidad'],
+    'general': ['planta_id', 'descripcion'],
+}
+# Campos de texto de cada evento (notas es opcional en todos los tipos)
+CAMPOS_TEXTO = ('tipo_fertilizante', 'cantidad', 'descripcion', 'notas')
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 500))
+
+def _validar_cuidado(item, tipo: Optional[str] = None) -> str:
+    """
+    Valida un evento de cuidado (del tipo indicado o, si no, del de item['tipo']);
+    devuelve el mensaje de error o None.
+    Los tipos se comprueban aquí porque SQLite no admite objetos ni enteros
+    de más de 64 bits, y un bool de JSON no debe guardarse como 1.
+    """
+    if not isinstance(item, dict):
+        return 'Cada cuidado debe ser un objeto JSON'
+    tipo = tipo or item.get('tipo')
+    if tipo not in CAMPOS_POR_TIPO:
+        return f"tipo debe ser uno de: {', '.join(CAMPOS_POR_TIPO)}"
+    for field in CAMPOS_POR_TIPO[tipo]:
+        if field not in item:
+            return f'Campo requerido: {field}'
+    planta_id = item['planta_id']
+    if isinstance(planta_id, bool) or not isinstance(planta_id, int) or not 0 < planta_id <= SQLITE_INT_MAX:
+        return 'planta_id debe ser un número entero positivo'
+    if tipo == 'riego':
+        cantidad_ml = item['cantidad_ml']
+        if (isinstance(cantidad_ml, bool) or not isinstance(cantidad_ml, (int, float))
+                or not 0 < cantidad_ml <= SQLITE_INT_MAX):
+            return 'cantidad_ml debe ser un número positivo'
+    for field in CAMPOS_TEXTO:
+        if field in CAMPOS_POR_TIPO[tipo] or (field == 'notas' and item.get('notas') is not None):
+            if not isinstance(item[field], str):
+                return f'{field} debe ser un texto'
+    return None
+
+@bp.route('/api/cuidados/riego', methods=['POST'])
 def registrar_riego():
     """
     POST /api/cuidados/riego
@@ -80,37 +637,24 @@ def registrar_riego():
     try:
         data = request.get_json()
 
-        # Validar campos requeridos
-        if 'planta_id' not in data:
+        # Validar campos requeridos y sus tipos
+        error = _validar_cuidado(data, 'riego')
+        if error:
             return jsonify({
                 'success': False,
-                'message': 'Campo requerido: planta_id'
+                'message': error
             }), 400
 
-        if 'cantidad_ml' not in data:
-            return jsonify({
-                'success': False,
-                'message': 'Campo requerido: cantidad_ml'
-            }), 400
-
-        # Validar tipos de datos
-        if not isinstance(data['planta_id'], int) or data['planta_id'] <= 0:
-            return jsonify({
-                'success': False,
-                'message': 'planta_id debe ser un número entero positivo'
-            }), 400
-
-        if not isinstance(data['cantidad_ml'], (int, float)) or data['cantidad_ml'] <= 0:
-            return jsonify({
-                'success': False,
-                'message': 'cantidad_ml debe ser un número positivo'
-            }), 400
+        error = _validar_planta_existe(data['planta_id'])
+        if error:
+            return error
 
         cuidado = cuidado_manager.registrar_riego(
             planta_id=data['planta_id'],
             cantidad_ml=data['cantidad_ml'],
             notas=data.get('notas', '')
         )
+        riego_scheduler.registrar_riego(cuidado['planta_id'], cuidado['fecha'])
 
         return jsonify({
             'success': True,
@@ -123,7 +667,7 @@ def registrar_riego():
             'message': f'Error al registrar riego: {str(e)}'
         }), 500
 
-@app.route('/api/cuidados/fertilizacion', methods=['POST'])
+@bp.route('/api/cuidados/fertilizacion', methods=['POST'])
 def registrar_fertilizacion():
     """
     POST /api/cuidados/fertilizacion
@@ -138,22 +682,18 @@ def registrar_fertilizacion():
     try:
         data = request.get_json()
 
-        # Validar campos requeridos
-        required_fields = ['planta_id', 'tipo_fertilizante', 'cantidad']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'message': f'Campo requerido: {field}'
-                }), 400
-
-        # Validar planta_id
-        if not isinstance(data['planta_id'], int) or data['planta_id'] <= 0:
+        # Validar campos requeridos y sus tipos
+        error = _validar_cuidado(data, 'fertilizacion')
+        if error:
             return jsonify({
                 'success': False,
-                'message': 'planta_id debe ser un número entero positivo'
+                'message': error
             }), 400
 
+        error = _validar_planta_existe(data['planta_id'])
+        if error:
+            return error
+
         cuidado = cuidado_manager.registrar_fertilizacion(
             planta_id=data['planta_id'],
             tipo_fertilizante=data['tipo_fertilizante'],
@@ -172,7 +712,7 @@ def registrar_fertilizacion():
             'message': f'Error al registrar fertilización: {str(e)}'
         }), 500
 
-@app.route('/api/cuidados/general', methods=['POST'])
+@bp.route('/api/cuidados/general', methods=['POST'])
 def registrar_cuidado_general():
     """
     POST /api/cuidados/general
@@ -186,25 +726,17 @@ def registrar_cuidado_general():
     try:
         data = request.get_json()
 
-        # Validar campos requeridos
-        if 'planta_id' not in data:
+        # Validar campos requeridos y sus tipos
+        error = _validar_cuidado(data, 'general')
+        if error:
             return jsonify({
                 'success': False,
-                'message': 'Campo requerido: planta_id'
+                'message': error
             }), 400
 
-        if 'descripcion' not in data:
-            return jsonify({
-                'success': False,
-                'message': 'Campo requerido: descripcion'
-            }), 400
-
-        # Validar planta_id
-        if not isinstance(data['planta_id'], int) or data['planta_id'] <= 0:
-            return jsonify({
-                'success': False,
-                'message': 'planta_id debe ser un número entero positivo'
-            }), 400
+        error = _validar_planta_existe(data['planta_id'])
+        if error:
+            return error
 
         cuidado = cuidado_manager.registrar_cuidado_general(
             planta_id=data['planta_id'],
@@ -223,7 +755,132 @@ def registrar_cuidado_general():
             'message': f'Error al registrar cuidado: {str(e)}'
         }), 500
 
-@app.route('/api/cuidados/<int:cuidado_id>', methods=['DELETE'])
+@bp.route('/api/cuidados/batch', methods=['POST'])
+def registrar_lote():
+    """
+    POST /api/cuidados/batch
+    Registra varios cuidados en una sola transacción
+    Body: {
+        "cuidados": [
+            {"tipo": "riego", "planta_id": 1, "cantidad_ml": 500},
+            {"tipo": "fertilizacion", "planta_id": 2, "tipo_fertilizante": "Orgánico", "cantidad": "10ml"},
+            {"tipo": "general", "planta_id": 3, "descripcion": "Poda"}
+        ]
+    }
+    Los elementos inválidos se informan en `results` y no se insertan.
+    """
+    try:
+        data = request.get_json()
+        items = data.get('cuidados') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'success': False,
+                'message': 'Se requiere una lista no vacía en "cuidados"'
+            }), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({
+                'success': False,
+                'message': f'El lote no puede superar {MAX_BATCH_SIZE} elementos'
+            }), 400
+
+        results = []
+        validos = []
+        for index, item in enumerate(items):
+            error = _validar_cuidado(item)
+            if error:
+                results.append({'index': index, 'success': False, 'message': error})
+            else:
+                results.append(None)
+                validos.append(index)
+
+        # Una sola consulta a plantas-service para todos los planta_id del lote
+        inexistentes, error = _plantas_inexistentes({items[i]['planta_id'] for i in validos})
+        if error:
+            return error
+        for i in [i for i in validos if items[i]['planta_id'] in inexistentes]:
+            results[i] = {'index': i, 'success': False,
+                          'message': f"Planta con ID {items[i]['planta_id']} no encontrada"}
+            validos.remove(i)
+
+        if not validos:
+            return jsonify({
+                'success': False,
+                'message': 'Ningún cuidado del lote es válido',
+                'results': results
+            }), 400
+
+        # Solo se guardan los campos propios de cada tipo, igual que en los endpoints individuales
+        eventos = [{k: items[i][k] for k in CAMPOS_POR_TIPO[items[i]['tipo']] + ['tipo', 'notas']
+                    if k in items[i]} for i in validos]
+        creados = cuidado_manager.registrar_lote(eventos)
+        for index, cuidado in zip(validos, creados):
+            results[index] = {'index': index, 'success': True, 'data': cuidado}
+            if cuidado['tipo'] == 'riego':
+                riego_scheduler.registrar_riego(cuidado['planta_id'], cuidado['fecha'])
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(creados)} de {len(items)} cuidados registrados',
+            'created': len(creados),
+            'failed': len(items) - len(creados),
+            'results': results
+        }), 201
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error al registrar lote: {str(e)}'
+        }), 500
+
+@bp.route('/api/riego/pendientes', methods=['GET'])
+def get_riegos_pendientes():
+    """
+    GET /api/riego/pendientes?before=2025-12-04T10:00:00&limit=100
+    Plantas cuyo próximo riego (último riego + frecuencia_riego_dias)
+    es anterior a `before` (por defecto ahora), de la más atrasada a la más reciente
+    """
+    scheduler_sync = current_app.extensions['scheduler_sync']
+    if scheduler_sync is None:
+        return jsonify({
+            'success': False,
+            'message': 'Se requiere PLANTAS_SERVICE_URL para calcular los riegos pendientes'
+        }), 503
+    try:
+        before = request.args.get('before')
+        before = datetime.fromisoformat(before) if before else datetime.now()
+        if before.tzinfo is not None:
+            before = before.astimezone().replace(tzinfo=None)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'before debe ser una fecha ISO 8601'
+        }), 400
+    try:
+        limit = _entero_param('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    try:
+        scheduler_sync.sync()
+    except PlantasServiceError as e:
+        # Con datos previos se responde con lo último conocido
+        if not len(riego_scheduler):
+            return jsonify({
+                'success': False,
+                'message': f'No se pudo consultar plantas-service: {str(e)}'
+            }), 503
+
+    pendientes = riego_scheduler.pendientes(before, limit)
+    return jsonify({
+        'success': True,
+        'data': pendientes,
+        'count': len(pendientes),
+        'before': before.isoformat()
+    }), 200
+
+@bp.route('/api/cuidados/<int:cuidado_id>', methods=['DELETE'])
 def delete_cuidado(cuidado_id):
     """
     DELETE /api/cuidados/{id}
@@ -239,7 +896,7 @@ def delete_cuidado(cuidado_id):
         'message': f'Cuidado con ID {cuidado_id} no encontrado'
     }), 404
 
-@app.route('/')
+@bp.route('/')
 def index():
     """Ruta raíz: muestra información básica y endpoints del servicio"""
     return jsonify({
@@ -252,18 +909,22 @@ def index():
             'obtener_cuidado': '/api/cuidados/{id}',
             'cuidados_por_planta': '/api/cuidados/planta/{planta_id}',
             'registrar_riego': '/api/cuidados/riego (POST)',
-            'registrar_fertilizacion': '/api/cuidados/fertilizacion (POST)'
+            'registrar_fertilizacion': '/api/cuidados/fertilizacion (POST)',
+            'registrar_lote': '/api/cuidados/batch (POST)',
+            'resumen': '/api/cuidados/resumen',
+            'resumen_planta': '/api/cuidados/resumen/{planta_id}',
+            'riegos_pendientes': '/api/riego/pendientes'
         }
     }), 200
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         'success': False,
         'message': 'Endpoint no encontrado'
     }), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     return jsonify({
         'success': False,
@@ -271,7 +932,7 @@ def internal_error(error):
     }), 500
 
 if __name__ == '__main__':
-    import os
+    app = create_app()
 
     # Puerto: usa PORT de variable de entorno o 5002 por defecto
     port = int(os.environ.get('PORT', 5002))
@@ -0,0 +1,83 @@
+"""
+Microbenchmarks de CuidadoManager
+
+Uso (desde cuidados-service/):
+    python -m benchmarks.bench_cuidados                        # 1k, 100k y 1M cuidados
+    python -m benchmarks.bench_cuidados --sizes 1000 --ops 200
+    python -m benchmarks.bench_cuidados --save-baseline        # fija la línea base
+    python -m benchmarks.bench_cuidados --data-dir /tmp/bench  # reutiliza las bases sembradas
+
+Sale con código 1 si alguna operación empeoró respecto de benchmarks/baseline.json.
+"""
+import random
+import sys
+import time
+from typing import List
+
+from benchmarks.harness import Benchmark, cerrar, main
+from models import CuidadoManager
+from seed import CUIDADOS_POR_PLANTA, sembrar_cuidados
+
+PAGINA = 100
+
+
+def sembrar(ruta: str, n: int, rng: random.Random):
+    """Crea la base con n cuidados (70 % riegos) con la siembra masiva de seed.py"""
+    sembrar_cuidados(ruta, n, max(1, n // CUIDADOS_POR_PLANTA), rng)
+
+
+def abrir(ruta: str) -> CuidadoManager:
+    return CuidadoManager(db_path=ruta)
+
+
+def crear_benchmarks(manager: CuidadoManager, n: int, rng: random.Random, ops: int) -> List[Benchmark]:
+    """Operaciones medidas, de solo lectura primero para que las escrituras no las alteren"""
+    plantas = max(1, n // CUIDADOS_POR_PLANTA)
+    hace_90_dias = int(time.time()) - 90 * 86400
+
+    def planta() -> int:
+        return rng.randint(1, plantas)
+
+    def pagina(after_id: int):
+        return manager.get_all(after_id=after_id, limit=PAGINA)
+
+    def de_planta(planta_id: int):
+        return manager.get_by_planta(planta_id, limit=PAGINA)
+
+    def de_planta_recientes(planta_id: int):
+        return manager.get_by_planta(planta_id, limit=PAGINA, desde=hace_90_dias)
+
+    def de_plantas(planta_ids: list):
+        return manager.get_by_plantas(planta_ids, limit_per_planta=5)
+
+    def buscar(q: str):
+        return manager.buscar(q, limit=20)
+
+    def exportar(planta_id: int):
+        return sum(1 for _ in manager.iter_by_planta(planta_id))
+
+    def riego(planta_id: int):
+        return manager.registrar_riego(planta_id, 250, 'Riego de rutina')
+
+    def lote(planta_id: int):
+        return manager.registrar_lote([
+            {'planta_id': planta_id, 'tipo': 'riego', 'cantidad_ml': 100}
+        ] * 50)
+
+    return [
+        ('get_by_id', manager.get_by_id, [(rng.randint(1, n),) for _ in range(ops)]),
+        ('get_all_page', pagina, [(max(0, rng.randint(0, n) - PAGINA),) for _ in range(ops)]),
+        ('get_by_planta', de_planta, [(planta(),) for _ in range(ops)]),
+        ('get_by_planta_90d', de_planta_recientes, [(planta(),) for _ in range(ops)]),
+        ('get_by_plantas_20x5', de_plantas, [([planta() for _ in range(20)],) for _ in range(ops)]),
+        ('get_resumen', manager.get_resumen, [(planta(),) for _ in range(ops)]),
+        ('buscar', buscar, [(rng.choice(('poda', 'hojas', 'plagas', 'sustrato')),)
+                            for _ in range(max(20, ops // 10))]),
+        ('iter_by_planta', exportar, [(planta(),) for _ in range(ops)]),
+        ('registrar_riego', riego, [(planta(),) for _ in range(ops)]),
+        ('registrar_lote_50', lote, [(planta(),) for _ in range(max(20, ops // 10))]),
+    ]
+
+
+if __name__ == '__main__':
+    sys.exit(main(__doc__.strip().split('\n')[0], 'cuidados', sembrar, abrir, crear_benchmarks))
@@ -0,0 +1,138 @@
+"""
+Compresión negociada de respuestas (gzip y, si están instalados, brotli o zstd)
+Se aplica en after_request a las respuestas JSON/texto que superan un tamaño
+mínimo, y a las respuestas en streaming bloque a bloque.
+"""
+import os
+import zlib
+from typing import Dict, Iterable, Iterator, Optional
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # dependencia opcional
+    zstandard = None
+
+COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+# Bytes mínimos para comprimir (por debajo, la cabecera gzip no compensa)
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+COMPRESS_ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3))
+
+_COMPRIMIBLES = ('application/json', 'text/')
+
+
+class _Gzip:
+    def __init__(self):
+        # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib crudo
+        self._obj = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._obj = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        self._obj = zstandard.ZstdCompressor(level=COMPRESS_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+def codecs_disponibles() -> Dict[str, type]:
+    """Codificaciones soportadas, en orden de preferencia ante igual q del cliente"""
+    codecs = {}
+    if brotli is not None:
+        codecs['br'] = _Brotli
+    if zstandard is not None:
+        codecs['zstd'] = _Zstd
+    codecs['gzip'] = _Gzip
+    return codecs
+
+
+def _elegir_codificacion(codecs: Dict[str, type]) -> Optional[str]:
+    return request.accept_encodings.best_match(list(codecs))
+
+
+def _comprimir_stream(chunks: Iterable, compresor) -> Iterator[bytes]:
+    """Comprime cada bloque y lo vacía (flush) para que el cliente lo reciba sin esperar al final"""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compresor.compress(chunk) + compresor.flush()
+            if data:
+                yield data
+        yield compresor.finish()
+    finally:
+        # Cerrar el generador original libera la conexión a la base de datos
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+
+def compress_response(response: Response) -> Response:
+    """Hook after_request: comprime la respuesta según Accept-Encoding"""
+    if (not COMPRESS_ENABLED or request.method == 'HEAD'
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(_COMPRIMIBLES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    codecs = codecs_disponibles()
+    codificacion = _elegir_codificacion(codecs)
+    if codificacion is None:
+        return response
+
+    compresor = codecs[codificacion]()
+    if response.is_streamed:
+        response.response = _comprimir_stream(response.response, compresor)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compresor.compress(data) + compresor.finish())
+    response.headers['Content-Encoding'] = codificacion
+    # El cuerpo comprimido no es idéntico byte a byte: el ETag pasa a ser débil
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app: Flask):
+    app.after_request(compress_response)
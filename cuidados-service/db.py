@@ -0,0 +1,292 @@
+"""
+Pool de conexiones SQLite reutilizables y migraciones de esquema
+para los gestores del servicio
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from query_stats import QUERY_STATS_ENABLED, InstrumentedConnection
+
+# Configuración aplicada una sola vez a cada conexión nueva
+DEFAULT_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -16000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024)),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'foreign_keys': 'ON',
+}
+DEFAULT_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.environ.get('SQLITE_POOL_TIMEOUT', 10))
+# Rango de un INTEGER de SQLite: un int de Python fuera de él no se puede enlazar
+SQLITE_INT_MIN, SQLITE_INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class PoolTimeout(Exception):
+    """No se pudo obtener una conexión del pool a tiempo"""
+
+
+class ConnectionPool:
+    """Pool acotado de conexiones SQLite compartidas entre hilos"""
+
+    def __init__(self, db_path: str, max_size: int = DEFAULT_POOL_SIZE,
+                 pragmas: Optional[dict] = None,
+                 timeout: float = DEFAULT_ACQUIRE_TIMEOUT):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._closed = False
+        self._pid = os.getpid()
+        self._stats = {
+            'created': 0,
+            'acquired': 0,
+            'reused': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        # Con SQLITE_QUERY_STATS cada sentencia se mide (ver query_stats.py)
+        factory = InstrumentedConnection if QUERY_STATS_ENABLED else sqlite3.Connection
+        conn = sqlite3.connect(self.db_path, timeout=self.pragmas['busy_timeout'] / 1000,
+                               check_same_thread=False, factory=factory)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _check_fork(self):
+        """
+        Tras un fork (p. ej. workers de gunicorn con preload) las conexiones
+        heredadas no se pueden usar ni cerrar: se abandonan y se empieza de cero.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._size = 0
+                    self._pid = os.getpid()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Obtiene una conexión libre, creando una nueva si hay capacidad"""
+        self._check_fork()
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats['acquired'] += 1
+                self._stats['reused'] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._size < self.max_size:
+                self._size += 1
+                create = True
+            else:
+                create = False
+                self._stats['waits'] += 1
+
+        if create:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+            with self._lock:
+                self._stats['created'] += 1
+                self._stats['acquired'] += 1
+            return conn
+
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(f'Sin conexiones libres en el pool de {self.db_path}')
+        with self._lock:
+            self._stats['acquired'] += 1
+            self._stats['reused'] += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False):
+        """Devuelve una conexión al pool, descartándola si quedó inutilizable"""
+        if self._pid != os.getpid():
+            return
+        if not broken and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+        if broken or self._closed:
+            conn.close()
+            with self._lock:
+                self._size -= 1
+                if broken:
+                    self._stats['discarded'] += 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager que presta una conexión y la devuelve al terminar"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            broken = not isinstance(e, (sqlite3.IntegrityError, sqlite3.OperationalError))
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close(self):
+        """Cierra todas las conexiones libres del pool"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._size -= 1
+
+    def stats(self) -> dict:
+        """Estadísticas del pool para monitoreo"""
+        with self._lock:
+            data = dict(self._stats)
+            data['size'] = self._size
+        data['idle'] = self._idle.qsize()
+        data['in_use'] = data['size'] - data['idle']
+        data['max_size'] = self.max_size
+        data['db_path'] = self.db_path
+        return data
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Versión del esquema guardada en PRAGMA user_version"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations: List[Tuple[int, List[str]]]) -> int:
+    """
+    Aplica en orden las migraciones con versión mayor a la actual.
+    Cada migración es (version, [sentencias SQL]) y se registra en
+    PRAGMA user_version, todo dentro de una única transacción.
+    """
+    current = schema_version(conn)
+    if all(version <= current for version, _ in migrations):
+        return current
+    if conn.in_transaction:
+        conn.commit()
+    # BEGIN IMMEDIATE evita que dos procesos migren a la vez
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = schema_version(conn)
+        for version, statements in sorted(migrations, key=lambda m: m[0]):
+            if version <= current:
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            current = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return current
+
+
+# Configuración de las cargas masivas (siembra de datos sintéticos): sin fsync,
+# diario de rollback en memoria y caché grande. Un corte a mitad de la carga
+# puede dañar la base, por eso solo se usa con el servicio detenido.
+BULK_PRAGMAS = {
+    'locking_mode': 'EXCLUSIVE',
+    'journal_mode': 'MEMORY',
+    'synchronous': 'OFF',
+    'cache_size': int(os.environ.get('SQLITE_BULK_CACHE_SIZE', -262144)),
+    'temp_store': 'MEMORY',
+}
+
+
+@contextmanager
+def bulk_connection(db_path: str):
+    """
+    Conexión exclusiva con BULK_PRAGMAS, en modo autocommit (las transacciones
+    se abren con BEGIN explícito). Al salir vuelve al modo de diario habitual
+    (SQLITE_JOURNAL_MODE) para que el servicio abra la base como siempre.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        for name, value in BULK_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        yield conn
+        conn.execute('PRAGMA locking_mode = NORMAL')
+        conn.execute(f"PRAGMA journal_mode = {DEFAULT_PRAGMAS['journal_mode']}")
+    finally:
+        conn.close()
+
+
+@contextmanager
+def deferred_indexes(conn: sqlite3.Connection, table: str):
+    """
+    Quita los índices y triggers de `table` durante el bloque y los vuelve a
+    crear al final con su SQL original: construir un índice sobre la tabla
+    llena es mucho más rápido que mantenerlo fila por fila. Lo que hacían los
+    triggers (tablas derivadas, versiones) queda a cargo de quien llama.
+    """
+    objetos = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)).fetchall()
+    for tipo, nombre, _ in objetos:
+        conn.execute(f'DROP {tipo.upper()} IF EXISTS "{nombre}"')
+    try:
+        yield
+    finally:
+        # Primero los índices: así se crean una sola vez, sin triggers activos
+        for _, _, sql in sorted(objetos, key=lambda o: o[0] != 'index'):
+            conn.execute(sql)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, **kwargs) -> ConnectionPool:
+    """Devuelve el pool asociado a db_path, creándolo la primera vez"""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def close_all():
+    """Cierra todos los pools registrados"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def pool_stats() -> list:
+    """Estadísticas de todos los pools registrados"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [p.stats() for p in pools]
@@ -0,0 +1,65 @@
+"""
+Configuración de gunicorn para servir cuidados-service en producción
+Uso: gunicorn -c gunicorn.conf.py "app:create_app()"
+Recarga sin cortar conexiones: kill -HUP <pid del master>
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+
+# Procesos y hilos por proceso (gthread: cada worker atiende varias peticiones a la vez)
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Conexiones keep-alive y tiempos de espera
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Reciclado gradual de workers para acotar el crecimiento de memoria (0 lo desactiva)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Cada worker importa la app y abre sus propias conexiones SQLite
+# (nunca se comparten conexiones entre procesos)
+preload_app = False
+reload = os.environ.get('GUNICORN_RELOAD', '0') == '1'
+
+# Archivos que comparten los workers, en un directorio propio de este master
+COMPARTIDO = os.path.join(tempfile.gettempdir(), f'cuidados-service-{os.getpid()}')
+# Cada worker vuelca sus métricas aquí y /metrics suma las de todos; el master
+# guarda las de los workers reciclados (ver los hooks)
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(COMPARTIDO, 'metrics'))
+# Estado y resultado de la sesión de perfilado de CPU, visibles desde cualquier worker
+os.environ.setdefault('PROFILE_DIR', os.path.join(COMPARTIDO, 'profile'))
+
+accesslog = '-' if os.environ.get('GUNICORN_ACCESS_LOG', '1') == '1' else None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    """Confirma las escrituras pendientes de la cola de group commit antes de salir"""
+    worker.wsgi.extensions['cuidado_manager'].close()
+
+
+def on_starting(server):
+    """Crea los directorios compartidos y borra las métricas de una ejecución anterior"""
+    from metrics import limpiar_directorio
+    limpiar_directorio(os.environ['METRICS_MULTIPROC_DIR'])
+    os.makedirs(os.environ['PROFILE_DIR'], exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Suma las métricas del worker terminado a las de los retirados"""
+    from metrics import retirar_proceso
+    retirar_proceso(os.environ['METRICS_MULTIPROC_DIR'], worker.pid)
+
+
+def on_exit(server):
+    """Borra los directorios compartidos por defecto al detener el servicio"""
+    import shutil
+    shutil.rmtree(COMPARTIDO, ignore_errors=True)
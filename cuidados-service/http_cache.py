@@ -0,0 +1,58 @@
+"""
+Soporte de GET condicional (ETag / Last-Modified) basado en la
+versión de cambios que mantienen los triggers de la tabla `versiones`
+"""
+import zlib
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Optional, Tuple, Union
+
+from flask import Response, make_response, request
+
+
+def _etag(scope: str, version: int) -> str:
+    # El query string forma parte del ETag: cada página/filtro se valida por separado
+    return f'{scope}-{version}-{zlib.crc32(request.query_string):08x}'
+
+
+def _not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        # Comparación débil: la variante comprimida se envía con el mismo ETag marcado W/
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def _set_headers(response: Response, etag: str, last_modified: Optional[datetime]) -> Response:
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # El cliente puede guardar la respuesta pero debe revalidarla en cada uso
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_get(get_version: Callable[[str], Tuple[int, Optional[int]]],
+                    scope: Union[str, Callable[..., str]]):
+    """
+    Decorador para endpoints GET: responde 304 sin ejecutar la vista si
+    el cliente ya tiene la versión actual de `scope`.
+    scope puede ser un texto fijo o una función que recibe los argumentos de la ruta.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current_scope = scope(**kwargs) if callable(scope) else scope
+            version, updated_at = get_version(current_scope)
+            etag = _etag(current_scope, version)
+            last_modified = (datetime.fromtimestamp(updated_at, timezone.utc)
+                             if updated_at else None)
+            if _not_modified(etag, last_modified):
+                return _set_headers(Response(status=304), etag, last_modified)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _set_headers(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
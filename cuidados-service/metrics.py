@@ -0,0 +1,460 @@
+"""
+Métricas en formato de texto de Prometheus para /metrics
+Cada hilo acumula en su propio fragmento, así que registrar una petición o
+una consulta no toma ningún lock; al exportar se suman los fragmentos. Los
+fragmentos de hilos terminados se suman a un acumulado común y se descartan.
+Con METRICS_MULTIPROC_DIR cada proceso vuelca sus valores en un archivo de
+ese directorio y /metrics suma los de todos los workers (incluidos los que
+gunicorn ya recicló), así que no importa qué worker atienda la petición.
+"""
+import atexit
+import bisect
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, g, request
+
+# Límites superiores (segundos) de los buckets de los histogramas
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQLITE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Directorio compartido por los workers (sin definir, las métricas son por proceso)
+MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') or None
+# Cada cuántos segundos vuelca cada worker sus valores al directorio
+FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+# Archivo con los valores de los workers que ya terminaron
+RETIRADOS = 'retirados.json'
+# Identificadores de procesos retirados que se recuerdan (ver retirar_proceso)
+MAX_RETIRADOS_RECORDADOS = 100
+
+
+class _Fragmento:
+    """Contadores e histogramas de un hilo (solo ese hilo los modifica)"""
+    __slots__ = ('contadores', 'histogramas')
+
+    def __init__(self):
+        self.contadores: Dict[Tuple[str, Labels], float] = {}
+        self.histogramas: Dict[Tuple[str, Labels], List[float]] = {}
+
+
+def _acumular(destino: _Fragmento, origen: _Fragmento):
+    """Suma los contadores e histogramas de `origen` en `destino`"""
+    for key, valor in _copiar(origen.contadores):
+        destino.contadores[key] = destino.contadores.get(key, 0) + valor
+    for key, entrada in _copiar(origen.histogramas):
+        total = destino.histogramas.setdefault(key, [0] * len(entrada))
+        for i, valor in enumerate(list(entrada)):
+            total[i] += valor
+
+
+def _copiar(d: dict) -> list:
+    # Otro hilo puede agregar una clave mientras se copia: se reintenta
+    while True:
+        try:
+            return list(d.items())
+        except RuntimeError:
+            continue
+
+
+def _labels(pares) -> Labels:
+    # JSON convierte las tuplas en listas
+    return tuple(tuple(par) for par in pares)
+
+
+def leer_json(ruta: str) -> Optional[dict]:
+    """Contenido de un archivo JSON compartido entre workers, o None si no existe o no se puede leer"""
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def escribir_archivo(ruta: str, contenido: bytes):
+    """Reemplaza el archivo de forma atómica: quien lo lee nunca lo ve a medias"""
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def escribir_json(ruta: str, datos: dict):
+    escribir_archivo(ruta, json.dumps(datos).encode('utf-8'))
+
+
+def proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _sumar_volcado(contadores: dict, histogramas: dict, datos: dict):
+    """Suma los contadores e histogramas de un archivo volcado"""
+    for name, labels, valor in datos.get('counters', ()):
+        key = (name, _labels(labels))
+        contadores[key] = contadores.get(key, 0) + valor
+    for name, labels, entrada in datos.get('histograms', ()):
+        total = histogramas.setdefault((name, _labels(labels)), [0] * len(entrada))
+        for i, valor in enumerate(entrada):
+            total[i] += valor
+
+
+def retirar_proceso(directorio: str, pid: int):
+    """
+    Suma los contadores e histogramas de un worker terminado al archivo de
+    retirados y borra el suyo (lo llama el master de gunicorn en child_exit).
+    Los gauges del worker se descartan: ya no describen nada vivo.
+    """
+    ruta = os.path.join(directorio, f'{pid}.json')
+    datos = leer_json(ruta)
+    if datos is None:
+        return
+    retirados = leer_json(os.path.join(directorio, RETIRADOS)) or {}
+    contadores: Dict[Tuple[str, Labels], float] = {}
+    histogramas: Dict[Tuple[str, Labels], List[float]] = {}
+    _sumar_volcado(contadores, histogramas, retirados)
+    _sumar_volcado(contadores, histogramas, datos)
+    # Quien lee el directorio mientras tanto puede ver a la vez este archivo y
+    # el del worker: los ids recordados evitan contarlo dos veces
+    ids = (retirados.get('ids', []) + [datos.get('id')])[-MAX_RETIRADOS_RECORDADOS:]
+    escribir_json(os.path.join(directorio, RETIRADOS), {
+        'ids': ids,
+        'counters': [[n, l, v] for (n, l), v in contadores.items()],
+        'histograms': [[n, l, e] for (n, l), e in histogramas.items()],
+    })
+    os.remove(ruta)
+
+
+def limpiar_directorio(directorio: str):
+    """Crea el directorio o borra los volcados de una ejecución anterior (al iniciar el master)"""
+    os.makedirs(directorio, exist_ok=True)
+    for archivo in os.listdir(directorio):
+        if archivo.endswith('.json') or archivo.endswith('.tmp'):
+            os.remove(os.path.join(directorio, archivo))
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formato_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(labels) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+
+class MetricsRegistry:
+    """
+    Registro de contadores, gauges e histogramas de un proceso. Con
+    `directorio`, render() suma además los valores volcados por los demás
+    procesos (ver iniciar_volcado).
+    """
+
+    def __init__(self, directorio: Optional[str] = None, intervalo: float = FLUSH_SECONDS):
+        self._local = threading.local()
+        # Fragmentos de los hilos vivos; los de hilos terminados se suman a _retirados
+        self._fragmentos: List[Tuple[threading.Thread, _Fragmento]] = []
+        self._retirados = _Fragmento()
+        self._lock = threading.Lock()  # solo al registrar un hilo nuevo y al exportar
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._gauges: Dict[str, Callable[[], Iterable[Tuple[Labels, float]]]] = {}
+        self._agregacion: Dict[str, str] = {}
+        self._directorio = directorio
+        self._intervalo = intervalo
+        self._id = uuid.uuid4().hex
+        self._volcador: Optional[threading.Thread] = None
+
+    def _fragmento(self) -> _Fragmento:
+        fragmento = getattr(self._local, 'fragmento', None)
+        if fragmento is None:
+            fragmento = _Fragmento()
+            with self._lock:
+                # Con un hilo por petición (servidor de Werkzeug) la lista no crece sin límite
+                self._recoger()
+                self._fragmentos.append((threading.current_thread(), fragmento))
+            self._local.fragmento = fragmento
+        return fragmento
+
+    def _recoger(self):
+        """
+        Suma a _retirados los fragmentos de hilos que ya terminaron y los quita
+        de la lista (con self._lock tomado). Un hilo terminado ya no escribe en
+        su fragmento, así que se puede leer sin carreras.
+        """
+        vivos = []
+        for hilo, fragmento in self._fragmentos:
+            if hilo.is_alive():
+                vivos.append((hilo, fragmento))
+            else:
+                _acumular(self._retirados, fragmento)
+        self._fragmentos = vivos
+
+    def fragmentos(self) -> int:
+        """Cantidad de fragmentos de hilos vivos (para pruebas y diagnóstico)"""
+        with self._lock:
+            self._recoger()
+            return len(self._fragmentos)
+
+    def counter(self, name: str, help_text: str):
+        self._meta[name] = ('counter', help_text)
+
+    def gauge(self, name: str, help_text: str,
+              callback: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None,
+              agregacion: str = 'sum'):
+        """
+        Gauge que se suma con inc() o, con callback, que se calcula al exportar.
+        `agregacion` ('sum' o 'max') combina los valores de los workers vivos.
+        """
+        self._meta[name] = ('gauge', help_text)
+        self._agregacion[name] = agregacion
+        if callback:
+            self._gauges[name] = callback
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        self._meta[name] = ('histogram', help_text)
+        self._buckets[name] = tuple(sorted(buckets))
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1):
+        contadores = self._fragmento().contadores
+        key = (name, labels)
+        contadores[key] = contadores.get(key, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float):
+        histogramas = self._fragmento().histogramas
+        key = (name, labels)
+        entrada = histogramas.get(key)
+        buckets = self._buckets[name]
+        if entrada is None:
+            # Un contador por bucket, uno para +Inf y la suma de valores
+            entrada = histogramas[key] = [0] * (len(buckets) + 1) + [0.0]
+        entrada[bisect.bisect_left(buckets, value)] += 1
+        entrada[-1] += value
+
+    def _sumar(self):
+        total = _Fragmento()
+        with self._lock:
+            self._recoger()
+            _acumular(total, self._retirados)
+            fragmentos = [fragmento for _, fragmento in self._fragmentos]
+        for fragmento in fragmentos:
+            _acumular(total, fragmento)
+        return total.contadores, total.histogramas
+
+    def _valores(self):
+        """Contadores, histogramas y gauges de este proceso"""
+        contadores, histogramas = self._sumar()
+        gauges = {}
+        for key in [key for key in contadores if self._meta.get(key[0], ('',))[0] == 'gauge']:
+            gauges[key] = contadores.pop(key)
+        for name, callback in self._gauges.items():
+            for labels, valor in callback():
+                gauges[(name, labels)] = valor
+        return contadores, histogramas, gauges
+
+    def volcar(self):
+        """Escribe los valores de este proceso en el directorio compartido"""
+        contadores, histogramas, gauges = self._valores()
+        escribir_json(os.path.join(self._directorio, f'{os.getpid()}.json'), {
+            'id': self._id,
+            'counters': [[n, l, v] for (n, l), v in contadores.items()],
+            'histograms': [[n, l, e] for (n, l), e in histogramas.items()],
+            'gauges': [[n, l, v] for (n, l), v in gauges.items()],
+        })
+
+    def iniciar_volcado(self):
+        """
+        Vuelca los valores cada `intervalo` segundos y al terminar el proceso.
+        Lo que otro worker exporta puede atrasarse hasta un intervalo; los
+        valores del worker que atiende /metrics siempre están al día.
+        """
+        if not self._directorio or self._volcador is not None:
+            return
+        os.makedirs(self._directorio, exist_ok=True)
+
+        def volcar():
+            try:
+                self.volcar()
+            except OSError:
+                pass
+
+        def volcar_periodicamente():
+            while True:
+                time.sleep(self._intervalo)
+                volcar()
+
+        self._volcador = threading.Thread(target=volcar_periodicamente, name='metrics-volcado', daemon=True)
+        self._volcador.start()
+        atexit.register(volcar)
+
+    def _combinar(self):
+        """Valores de este proceso más los volcados por los demás en el directorio"""
+        contadores, histogramas, gauges = self._valores()
+        if not self._directorio:
+            return contadores, histogramas, gauges
+        propio = f'{os.getpid()}.json'
+        try:
+            archivos = os.listdir(self._directorio)
+        except OSError:
+            archivos = []
+        volcados = []
+        for archivo in archivos:
+            if archivo.endswith('.json') and archivo[:-5].isdigit() and archivo != propio:
+                datos = leer_json(os.path.join(self._directorio, archivo))
+                if datos is not None:
+                    volcados.append((int(archivo[:-5]), datos))
+        # Los retirados se leen después: un worker cuyo archivo ya se borró está en ellos
+        retirados = leer_json(os.path.join(self._directorio, RETIRADOS)) or {}
+        ya_retirados = set(retirados.get('ids', ()))
+        _sumar_volcado(contadores, histogramas, retirados)
+        for pid, datos in volcados:
+            if datos.get('id') in ya_retirados:
+                continue
+            _sumar_volcado(contadores, histogramas, datos)
+            if not proceso_vivo(pid):
+                continue
+            for name, labels, valor in datos.get('gauges', ()):
+                key = (name, _labels(labels))
+                if key not in gauges:
+                    gauges[key] = valor
+                elif self._agregacion.get(name) == 'max':
+                    gauges[key] = max(gauges[key], valor)
+                else:
+                    gauges[key] += valor
+        return contadores, histogramas, gauges
+
+    def render(self) -> str:
+        """Exporta todas las métricas en el formato de texto de Prometheus 0.0.4"""
+        contadores, histogramas, gauges = self._combinar()
+        muestras: Dict[str, List[str]] = {name: [] for name in self._meta}
+        for (name, labels), valor in sorted(contadores.items()):
+            muestras.setdefault(name, []).append(f'{name}{_formato_labels(labels)} {valor}')
+        for (name, labels), entrada in sorted(histogramas.items()):
+            if name not in self._buckets:
+                continue
+            acumulado = 0
+            for limite, cantidad in zip(self._buckets[name] + (float('inf'),), entrada):
+                acumulado += cantidad
+                le = '+Inf' if limite == float('inf') else repr(limite)
+                muestras[name].append(f"{name}_bucket{_formato_labels(labels, ('le', le))} {acumulado}")
+            muestras[name].append(f'{name}_sum{_formato_labels(labels)} {entrada[-1]}')
+            muestras[name].append(f'{name}_count{_formato_labels(labels)} {acumulado}')
+        for (name, labels), valor in sorted(gauges.items()):
+            muestras.setdefault(name, []).append(f'{name}{_formato_labels(labels)} {valor}')
+
+        lineas = []
+        for name, (tipo, help_text) in self._meta.items():
+            lineas.append(f'# HELP {name} {help_text}')
+            lineas.append(f'# TYPE {name} {tipo}')
+            lineas.extend(muestras[name])
+        return '\n'.join(lineas) + '\n'
+
+
+def init_metrics(app: Flask, registry: MetricsRegistry):
+    """Registra las métricas HTTP (peticiones, latencia por ruta y estado, en curso)"""
+    registry.counter('http_requests_total', 'Peticiones HTTP atendidas')
+    registry.histogram('http_request_duration_seconds',
+                       'Tiempo hasta generar la respuesta, por ruta y estado', HTTP_BUCKETS)
+    registry.gauge('http_requests_in_flight', 'Peticiones HTTP en curso')
+
+    @app.before_request
+    def _metrics_inicio():
+        g._metrics_inicio = time.perf_counter()
+        registry.inc('http_requests_in_flight')
+
+    @app.after_request
+    def _metrics_estado(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_fin(exc):
+        inicio = g.pop('_metrics_inicio', None)
+        if inicio is None:
+            return
+        registry.inc('http_requests_in_flight', value=-1)
+        # Plantilla de la ruta (no la URL) para acotar la cantidad de series
+        route = request.url_rule.rule if request.url_rule else 'sin_ruta'
+        status = g.pop('_metrics_status', 500)
+        labels = (('method', request.method), ('route', route), ('status', str(status)))
+        registry.inc('http_requests_total', labels)
+        registry.observe('http_request_duration_seconds', labels, time.perf_counter() - inicio)
+
+
+def _medir_generador(gen, registry: MetricsRegistry, labels: Labels):
+    # Solo cuenta el tiempo dentro del generador, no el de quien lo consume
+    duracion = 0.0
+    try:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                duracion += time.perf_counter() - inicio
+            yield item
+    finally:
+        gen.close()
+        registry.inc('sqlite_queries_total', labels)
+        registry.observe('sqlite_query_duration_seconds', labels, duracion)
+
+
+def instrument_manager(manager, registry: MetricsRegistry):
+    """
+    Mide cada método público del gestor (cantidad de llamadas y duración);
+    los que devuelven generadores se miden hasta que terminan.
+    """
+    registry.counter('sqlite_queries_total', 'Llamadas a métodos del gestor de datos')
+    registry.histogram('sqlite_query_duration_seconds',
+                       'Duración de los métodos del gestor de datos', SQLITE_BUCKETS)
+    nombre_manager = type(manager).__name__
+    for nombre, _ in inspect.getmembers(type(manager), inspect.isfunction):
+        if nombre.startswith('_') or nombre.endswith('_stats') or nombre == 'close':
+            continue
+        labels = (('manager', nombre_manager), ('method', nombre))
+        metodo = getattr(manager, nombre)
+
+        @functools.wraps(metodo)
+        def medido(*args, _metodo=metodo, _labels=labels, **kwargs):
+            inicio = time.perf_counter()
+            resultado = _metodo(*args, **kwargs)
+            if inspect.isgenerator(resultado):
+                return _medir_generador(resultado, registry, _labels)
+            registry.inc('sqlite_queries_total', _labels)
+            registry.observe('sqlite_query_duration_seconds', _labels, time.perf_counter() - inicio)
+            return resultado
+
+        setattr(manager, nombre, medido)
+
+
+def db_gauges(registry: MetricsRegistry, manager):
+    """Tamaño de los archivos de la base (incluido el WAL) y estado del pool de conexiones"""
+    def tamanos():
+        for sufijo, archivo in (('', 'db'), ('-wal', 'wal')):
+            try:
+                yield (('file', archivo),), os.path.getsize(manager.db_path + sufijo)
+            except OSError:
+                pass
+
+    def pool():
+        stats = manager.pool_stats()
+        yield (('state', 'in_use'),), stats['in_use']
+        yield (('state', 'idle'),), stats['idle']
+
+    # Todos los workers miden los mismos archivos: se toma uno, no la suma
+    registry.gauge('sqlite_db_size_bytes', 'Tamaño en bytes de los archivos de la base', tamanos, 'max')
+    registry.gauge('sqlite_pool_connections', 'Conexiones del pool por estado', pool)
@@ -1,124 +1,539 @@
 """
 Modelos de datos para el servicio de Cuidados (SQLite)
 """
-import sqlite3
+import json
 import os
+import re
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'cuidados.db')
+from db import get_pool, migrate
+from write_queue import GroupCommitWriter
+
+DB_PATH = os.environ.get('CUIDADOS_DB_PATH',
+                         os.path.join(os.path.dirname(__file__), 'cuidados.db'))
+
+# Recalcula desde cero el resumen de todas las plantas (lo usan la migración 4
+# y la siembra masiva, que inserta sin los triggers que lo mantienen)
+RECALCULAR_RESUMEN = '''
+    INSERT OR REPLACE INTO resumen_cuidados
+    SELECT planta_id,
+           COUNT(*),
+           SUM(tipo = 'riego'),
+           COALESCE(SUM(CASE WHEN tipo = 'riego' THEN cantidad_ml END), 0),
+           MAX(CASE WHEN tipo = 'riego' THEN fecha END),
+           SUM(tipo = 'fertilizacion'),
+           MAX(CASE WHEN tipo = 'fertilizacion' THEN fecha END),
+           SUM(tipo = 'general'),
+           MAX(fecha)
+    FROM cuidados GROUP BY planta_id
+'''
+
+# Migraciones de esquema (version, [sentencias]); nunca modificar las ya publicadas
+MIGRATIONS = [
+    (1, ['''
+        CREATE TABLE IF NOT EXISTS cuidados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            planta_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            cantidad_ml REAL,
+            tipo_fertilizante TEXT,
+            cantidad TEXT,
+            descripcion TEXT,
+            notas TEXT,
+            fecha TEXT NOT NULL
+        )
+    ''']),
+    (2, [
+        'CREATE INDEX IF NOT EXISTS idx_cuidados_planta_id ON cuidados (planta_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_cuidados_planta_tipo_fecha ON cuidados (planta_id, tipo, fecha)',
+    ]),
+    # Versión de cambios por tabla y por planta para ETag / GET condicional
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS versiones (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_version_insert AFTER INSERT ON cuidados
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('cuidados', 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('planta:' || NEW.planta_id, 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_version_update AFTER UPDATE ON cuidados
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('cuidados', 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('planta:' || OLD.planta_id, 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('planta:' || NEW.planta_id, 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_version_delete AFTER DELETE ON cuidados
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('cuidados', 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('planta:' || OLD.planta_id, 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+    ]),
+    # Resumen por planta mantenido de forma incremental en cada alta/baja de cuidados
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS resumen_cuidados (
+            planta_id INTEGER PRIMARY KEY,
+            total_cuidados INTEGER NOT NULL DEFAULT 0,
+            total_riegos INTEGER NOT NULL DEFAULT 0,
+            total_agua_ml REAL NOT NULL DEFAULT 0,
+            ultimo_riego TEXT,
+            total_fertilizaciones INTEGER NOT NULL DEFAULT 0,
+            ultima_fertilizacion TEXT,
+            total_generales INTEGER NOT NULL DEFAULT 0,
+            ultimo_cuidado TEXT
+        )
+        ''',
+        RECALCULAR_RESUMEN,
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_resumen_insert AFTER INSERT ON cuidados
+        BEGIN
+            INSERT INTO resumen_cuidados (planta_id, total_cuidados, total_riegos, total_agua_ml,
+                                          ultimo_riego, total_fertilizaciones, ultima_fertilizacion,
+                                          total_generales, ultimo_cuidado)
+            VALUES (NEW.planta_id, 1,
+                    NEW.tipo = 'riego',
+                    CASE WHEN NEW.tipo = 'riego' THEN COALESCE(NEW.cantidad_ml, 0) ELSE 0 END,
+                    CASE WHEN NEW.tipo = 'riego' THEN NEW.fecha END,
+                    NEW.tipo = 'fertilizacion',
+                    CASE WHEN NEW.tipo = 'fertilizacion' THEN NEW.fecha END,
+                    NEW.tipo = 'general',
+                    NEW.fecha)
+            ON CONFLICT (planta_id) DO UPDATE SET
+                total_cuidados = total_cuidados + 1,
+                total_riegos = total_riegos + excluded.total_riegos,
+                total_agua_ml = total_agua_ml + excluded.total_agua_ml,
+                ultimo_riego = MAX(COALESCE(ultimo_riego, excluded.ultimo_riego),
+                                   COALESCE(excluded.ultimo_riego, ultimo_riego)),
+                total_fertilizaciones = total_fertilizaciones + excluded.total_fertilizaciones,
+                ultima_fertilizacion = MAX(COALESCE(ultima_fertilizacion, excluded.ultima_fertilizacion),
+                                           COALESCE(excluded.ultima_fertilizacion, ultima_fertilizacion)),
+                total_generales = total_generales + excluded.total_generales,
+                ultimo_cuidado = MAX(ultimo_cuidado, excluded.ultimo_cuidado);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_resumen_delete AFTER DELETE ON cuidados
+        BEGIN
+            UPDATE resumen_cuidados SET
+                total_cuidados = total_cuidados - 1,
+                total_riegos = total_riegos - (OLD.tipo = 'riego'),
+                total_agua_ml = total_agua_ml
+                    - CASE WHEN OLD.tipo = 'riego' THEN COALESCE(OLD.cantidad_ml, 0) ELSE 0 END,
+                ultimo_riego = CASE WHEN OLD.tipo = 'riego' THEN (
+                    SELECT MAX(fecha) FROM cuidados
+                    WHERE planta_id = OLD.planta_id AND tipo = 'riego') ELSE ultimo_riego END,
+                total_fertilizaciones = total_fertilizaciones - (OLD.tipo = 'fertilizacion'),
+                ultima_fertilizacion = CASE WHEN OLD.tipo = 'fertilizacion' THEN (
+                    SELECT MAX(fecha) FROM cuidados
+                    WHERE planta_id = OLD.planta_id AND tipo = 'fertilizacion') ELSE ultima_fertilizacion END,
+                total_generales = total_generales - (OLD.tipo = 'general'),
+                ultimo_cuidado = (SELECT MAX(fecha) FROM cuidados WHERE planta_id = OLD.planta_id)
+            WHERE planta_id = OLD.planta_id;
+            DELETE FROM resumen_cuidados WHERE planta_id = OLD.planta_id AND total_cuidados <= 0;
+        END
+        ''',
+    ]),
+    # Índice de texto completo (FTS5) sobre notas y descripción, con contenido
+    # externo: guarda solo el índice y lee las columnas de `cuidados`
+    (5, [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS cuidados_fts USING fts5(
+            notas, descripcion,
+            content='cuidados', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        "INSERT INTO cuidados_fts (cuidados_fts) VALUES ('rebuild')",
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_fts_insert AFTER INSERT ON cuidados
+        BEGIN
+            INSERT INTO cuidados_fts (rowid, notas, descripcion)
+            VALUES (NEW.id, NEW.notas, NEW.descripcion);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_fts_delete AFTER DELETE ON cuidados
+        BEGIN
+            INSERT INTO cuidados_fts (cuidados_fts, rowid, notas, descripcion)
+            VALUES ('delete', OLD.id, OLD.notas, OLD.descripcion);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_fts_update AFTER UPDATE OF notas, descripcion ON cuidados
+        BEGIN
+            INSERT INTO cuidados_fts (cuidados_fts, rowid, notas, descripcion)
+            VALUES ('delete', OLD.id, OLD.notas, OLD.descripcion);
+            INSERT INTO cuidados_fts (rowid, notas, descripcion)
+            VALUES (NEW.id, NEW.notas, NEW.descripcion);
+        END
+        ''',
+    ]),
+    # Fecha como epoch UTC (entero) para consultas por rango con índice;
+    # `fecha` conserva el texto ISO en hora local. El trigger solo completa
+    # las filas insertadas sin fecha_epoch (la aplicación la envía siempre).
+    (6, [
+        'ALTER TABLE cuidados ADD COLUMN fecha_epoch INTEGER',
+        "UPDATE cuidados SET fecha_epoch = CAST(strftime('%s', fecha, 'utc') AS INTEGER)",
+        'CREATE INDEX IF NOT EXISTS idx_cuidados_fecha_epoch ON cuidados (fecha_epoch)',
+        'CREATE INDEX IF NOT EXISTS idx_cuidados_planta_fecha_epoch ON cuidados (planta_id, fecha_epoch)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cuidados_fecha_epoch_insert AFTER INSERT ON cuidados
+        WHEN NEW.fecha_epoch IS NULL
+        BEGIN
+            UPDATE cuidados SET fecha_epoch = CAST(strftime('%s', NEW.fecha, 'utc') AS INTEGER)
+            WHERE id = NEW.id;
+        END
+        ''',
+    ]),
+]
+
+def _ahora() -> Tuple[str, int]:
+    """Fecha actual en ISO (hora local, formato de `fecha`) y como epoch UTC"""
+    now = datetime.now()
+    return now.isoformat(), int(now.timestamp())
+
+def expresion_fts(q: str) -> Optional[str]:
+    """
+    Convierte el texto buscado en una consulta FTS5 segura: cada palabra
+    entre comillas (todas deben aparecer) y `palabra*` como prefijo.
+    Devuelve None si no hay palabras.
+    """
+    terminos = [f'"{palabra}"{prefijo}' for palabra, prefijo in re.findall(r'(\w+)(\*?)', q)]
+    return ' '.join(terminos) or None
+
+# Columnas que se pueden pedir con ?fields= (el id se incluye siempre)
+CAMPOS_CUIDADO = ('id', 'planta_id', 'tipo', 'cantidad_ml', 'tipo_fertilizante', 'cantidad',
+                  'descripcion', 'notas', 'fecha', 'fecha_epoch')
 
 class CuidadoManager:
     """Gestor de cuidados usando SQLite"""
 
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None, group_commit: Optional[bool] = None):
+        """
+        group_commit: si es True, las inserciones individuales pasan por una
+        cola con commit agrupado (por defecto según CUIDADOS_GROUP_COMMIT).
+        """
+        self.db_path = db_path or DB_PATH
+        self._pool = get_pool(self.db_path)
         self._ensure_db()
+        if group_commit is None:
+            group_commit = os.environ.get('CUIDADOS_GROUP_COMMIT', '0') == '1'
+        self._writer = None
+        if group_commit:
+            self._writer = GroupCommitWriter(self._pool, 'SELECT * FROM cuidados WHERE id IN ({})')
 
     def _get_conn(self):
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Presta una conexión del pool (usar con `with`)"""
+        return self._pool.connection()
+
+    def pool_stats(self) -> dict:
+        return self._pool.stats()
+
+    def write_queue_stats(self) -> Optional[dict]:
+        """Métricas de la cola de escritura (None si group commit está desactivado)"""
+        return self._writer.stats() if self._writer else None
+
+    def close(self):
+        """Confirma las escrituras pendientes y detiene la cola"""
+        if self._writer:
+            self._writer.close()
 
     def _ensure_db(self):
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS cuidados (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                planta_id INTEGER NOT NULL,
-                tipo TEXT NOT NULL,
-                cantidad_ml REAL,
-                tipo_fertilizante TEXT,
-                cantidad TEXT,
-                descripcion TEXT,
-                notas TEXT,
-                fecha TEXT NOT NULL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self._get_conn() as conn:
+            migrate(conn, MIGRATIONS)
+
+    def get_version(self, scope: str) -> Tuple[int, Optional[int]]:
+        """Versión de cambios y fecha (epoch) de la última modificación de `scope`"""
+        with self._get_conn() as conn:
+            row = conn.execute('SELECT version, updated_at FROM versiones WHERE scope = ?',
+                               (scope,)).fetchone()
+        return (row['version'], row['updated_at']) if row else (0, None)
 
     def _row_to_dict(self, row) -> dict:
         if row is None:
             return None
         return {k: row[k] for k in row.keys()}
 
-    def registrar_riego(self, planta_id: int, cantidad_ml: float, notas: str = "") -> dict:
-        now = datetime.now().isoformat()
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('''
-            INSERT INTO cuidados (planta_id, tipo, cantidad_ml, notas, fecha)
-            VALUES (?, 'riego', ?, ?, ?)
-        ''', (planta_id, cantidad_ml, notas, now))
-        conn.commit()
-        last_id = cur.lastrowid
-        cur.execute('SELECT * FROM cuidados WHERE id = ?', (last_id,))
-        row = cur.fetchone()
-        conn.close()
+    def _columnas(self, fields: Optional[List[str]]) -> str:
+        """Lista del SELECT para la proyección pedida (None = todas las columnas)"""
+        if not fields:
+            return '*'
+        invalidos = set(fields) - set(CAMPOS_CUIDADO)
+        if invalidos:
+            raise ValueError(f"Campos no permitidos: {', '.join(sorted(invalidos))}")
+        return ', '.join(c for c in CAMPOS_CUIDADO if c == 'id' or c in fields)
+
+    def _insert(self, sql: str, params: tuple) -> dict:
+        if self._writer:
+            return self._row_to_dict(self._writer.execute(sql, params))
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            conn.commit()
+            last_id = cur.lastrowid
+            cur.execute('SELECT * FROM cuidados WHERE id = ?', (last_id,))
+            row = cur.fetchone()
         return self._row_to_dict(row)
 
+    def registrar_riego(self, planta_id: int, cantidad_ml: float, notas: str = "") -> dict:
+        now, epoch = _ahora()
+        return self._insert('''
+            INSERT INTO cuidados (planta_id, tipo, cantidad_ml, notas, fecha, fecha_epoch)
+            VALUES (?, 'riego', ?, ?, ?, ?)
+        ''', (planta_id, cantidad_ml, notas, now, epoch))
+
     def registrar_fertilizacion(self, planta_id: int, tipo_fertilizante: str,
                                 cantidad: str, notas: str = "") -> dict:
-        now = datetime.now().isoformat()
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('''
-            INSERT INTO cuidados (planta_id, tipo, tipo_fertilizante, cantidad, notas, fecha)
-            VALUES (?, 'fertilizacion', ?, ?, ?, ?)
-        ''', (planta_id, tipo_fertilizante, cantidad, notas, now))
-        conn.commit()
-        last_id = cur.lastrowid
-        cur.execute('SELECT * FROM cuidados WHERE id = ?', (last_id,))
-        row = cur.fetchone()
-        conn.close()
-        return self._row_to_dict(row)
+        now, epoch = _ahora()
+        return self._insert('''
+            INSERT INTO cuidados (planta_id, tipo, tipo_fertilizante, cantidad, notas, fecha, fecha_epoch)
+            VALUES (?, 'fertilizacion', ?, ?, ?, ?, ?)
+        ''', (planta_id, tipo_fertilizante, cantidad, notas, now, epoch))
 
     def registrar_cuidado_general(self, planta_id: int, descripcion: str,
                                   notas: str = "") -> dict:
-        now = datetime.now().isoformat()
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('''
-            INSERT INTO cuidados (planta_id, tipo, descripcion, notas, fecha)
-            VALUES (?, 'general', ?, ?, ?)
-        ''', (planta_id, descripcion, notas, now))
-        conn.commit()
-        last_id = cur.lastrowid
-        cur.execute('SELECT * FROM cuidados WHERE id = ?', (last_id,))
-        row = cur.fetchone()
-        conn.close()
-        return self._row_to_dict(row)
+        now, epoch = _ahora()
+        return self._insert('''
+            INSERT INTO cuidados (planta_id, tipo, descripcion, notas, fecha, fecha_epoch)
+            VALUES (?, 'general', ?, ?, ?, ?)
+        ''', (planta_id, descripcion, notas, now, epoch))
+
+    def registrar_lote(self, eventos: List[dict]) -> List[dict]:
+        """
+        Inserta varios cuidados en una sola transacción (un único commit).
+        Cada evento trae 'planta_id', 'tipo' y los campos propios de su tipo.
+        """
+        if not eventos:
+            return []
+        now, epoch = _ahora()
+        params = [(
+            e['planta_id'], e['tipo'], e.get('cantidad_ml'), e.get('tipo_fertilizante'),
+            e.get('cantidad'), e.get('descripcion'), e.get('notas', ''), now, epoch
+        ) for e in eventos]
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            # BEGIN IMMEDIATE toma el lock de escritura: los ids quedan consecutivos
+            cur.execute('BEGIN IMMEDIATE')
+            cur.executemany('''
+                INSERT INTO cuidados (planta_id, tipo, cantidad_ml, tipo_fertilizante,
+                                      cantidad, descripcion, notas, fecha, fecha_epoch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', params)
+            last_id = cur.execute('SELECT last_insert_rowid()').fetchone()[0]
+            conn.commit()
+            first_id = last_id - len(params) + 1
+            cur.execute('SELECT * FROM cuidados WHERE id BETWEEN ? AND ? ORDER BY id',
+                        (first_id, last_id))
+            rows = cur.fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def _rango_fechas(self, desde: Optional[int], hasta: Optional[int],
+                      indice: str) -> Tuple[str, str, list]:
+        """
+        Condición SQL sobre fecha_epoch: desde inclusive, hasta exclusive (epoch UTC).
+        Devuelve (indexed_by, condicion, params). Sin estadísticas (ANALYZE) SQLite
+        prefiere recorrer por id para evitar ordenar, así que se fuerza el índice
+        de fecha: el costo pasa a depender de las filas dentro del rango.
+        """
+        sql, params = '', []
+        if desde is not None:
+            sql += ' AND fecha_epoch >= ?'
+            params.append(desde)
+        if hasta is not None:
+            sql += ' AND fecha_epoch < ?'
+            params.append(hasta)
+        return (f' INDEXED BY {indice}' if params else ''), sql, params
 
-    def get_all(self) -> List[dict]:
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM cuidados ORDER BY id')
-        rows = cur.fetchall()
-        conn.close()
+    def get_all(self, after_id: int = 0, limit: Optional[int] = None,
+                fields: Optional[List[str]] = None, desde: Optional[int] = None,
+                hasta: Optional[int] = None) -> List[dict]:
+        """
+        Lista cuidados con id > after_id (paginación por cursor), solo con las
+        columnas `fields` y, si se indica, con fecha_epoch en [desde, hasta)
+        """
+        columnas = self._columnas(fields)
+        indice, rango, params = self._rango_fechas(desde, hasta, 'idx_cuidados_fecha_epoch')
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(f'SELECT {columnas} FROM cuidados{indice} WHERE id > ?{rango} ORDER BY id LIMIT ?',
+                        (after_id, *params, -1 if limit is None else limit))
+            rows = cur.fetchall()
         return [self._row_to_dict(r) for r in rows]
 
-    def get_by_id(self, cuidado_id: int) -> Optional[dict]:
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM cuidados WHERE id = ?', (cuidado_id,))
-        row = cur.fetchone()
-        conn.close()
+    def _iter_query(self, sql: str, params: tuple, chunk_size: int) -> Iterator[dict]:
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_dict(row)
+
+    def iter_all(self, after_id: int = 0, limit: Optional[int] = None,
+                 chunk_size: int = 500, fields: Optional[List[str]] = None,
+                 desde: Optional[int] = None, hasta: Optional[int] = None) -> Iterator[dict]:
+        """Recorre los cuidados leyendo del cursor por bloques (fetchmany)"""
+        indice, rango, params = self._rango_fechas(desde, hasta, 'idx_cuidados_fecha_epoch')
+        return self._iter_query(f'''
+            SELECT {self._columnas(fields)} FROM cuidados{indice} WHERE id > ?{rango}
+            ORDER BY id LIMIT ?
+        ''', (after_id, *params, -1 if limit is None else limit), chunk_size)
+
+    def iter_by_planta(self, planta_id: int, after_id: int = 0, limit: Optional[int] = None,
+                       chunk_size: int = 500, fields: Optional[List[str]] = None,
+                       desde: Optional[int] = None, hasta: Optional[int] = None) -> Iterator[dict]:
+        """Recorre los cuidados de una planta leyendo del cursor por bloques"""
+        indice, rango, params = self._rango_fechas(desde, hasta, 'idx_cuidados_planta_fecha_epoch')
+        return self._iter_query(f'''
+            SELECT {self._columnas(fields)} FROM cuidados{indice}
+            WHERE planta_id = ? AND id > ?{rango}
+            ORDER BY id LIMIT ?
+        ''', (planta_id, after_id, *params, -1 if limit is None else limit), chunk_size)
+
+    def get_by_id(self, cuidado_id: int, fields: Optional[List[str]] = None) -> Optional[dict]:
+        columnas = self._columnas(fields)
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(f'SELECT {columnas} FROM cuidados WHERE id = ?', (cuidado_id,))
+            row = cur.fetchone()
         return self._row_to_dict(row)
 
-    def get_by_planta(self, planta_id: int) -> List[dict]:
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM cuidados WHERE planta_id = ? ORDER BY id', (planta_id,))
-        rows = cur.fetchall()
-        conn.close()
+    def get_by_planta(self, planta_id: int, after_id: int = 0,
+                      limit: Optional[int] = None, fields: Optional[List[str]] = None,
+                      desde: Optional[int] = None, hasta: Optional[int] = None) -> List[dict]:
+        columnas = self._columnas(fields)
+        indice, rango, params = self._rango_fechas(desde, hasta, 'idx_cuidados_planta_fecha_epoch')
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(f'''
+                SELECT {columnas} FROM cuidados{indice}
+                WHERE planta_id = ? AND id > ?{rango}
+                ORDER BY id LIMIT ?
+            ''', (planta_id, after_id, *params, -1 if limit is None else limit))
+            rows = cur.fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def _resumen_vacio(self, planta_id: int) -> dict:
+        return {
+            'planta_id': planta_id,
+            'total_cuidados': 0,
+            'total_riegos': 0,
+            'total_agua_ml': 0,
+            'ultimo_riego': None,
+            'total_fertilizaciones': 0,
+            'ultima_fertilizacion': None,
+            'total_generales': 0,
+            'ultimo_cuidado': None,
+        }
+
+    def get_resumen(self, planta_id: int) -> dict:
+        """Resumen de cuidados de una planta (lectura O(1) de la tabla resumen)"""
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT * FROM resumen_cuidados WHERE planta_id = ?', (planta_id,))
+            row = cur.fetchone()
+        return self._row_to_dict(row) if row else self._resumen_vacio(planta_id)
+
+    def get_resumenes(self, after_id: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Resúmenes de todas las plantas con cuidados, paginados por planta_id"""
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute('SELECT * FROM resumen_cuidados WHERE planta_id > ? ORDER BY planta_id LIMIT ?',
+                        (after_id, -1 if limit is None else limit))
+            rows = cur.fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def get_by_plantas(self, planta_ids: List[int],
+                       limit_per_planta: Optional[int] = None) -> Dict[int, List[dict]]:
+        """
+        Cuidados de varias plantas en una sola consulta, agrupados por planta_id.
+        Con limit_per_planta devuelve solo los N más recientes de cada una
+        (una búsqueda acotada por índice por planta, sin recorrer su historial).
+        """
+        planta_ids = list(dict.fromkeys(planta_ids))
+        resultado = {planta_id: [] for planta_id in planta_ids}
+        if not planta_ids:
+            return resultado
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            if limit_per_planta is None:
+                cur.execute(f'''
+                    SELECT * FROM cuidados
+                    WHERE planta_id IN ({', '.join('?' * len(planta_ids))})
+                    ORDER BY planta_id, id DESC
+                ''', planta_ids)
+            else:
+                cur.execute('''
+                    SELECT c.* FROM json_each(?) AS j
+                    JOIN cuidados AS c ON c.id IN (
+                        SELECT id FROM cuidados WHERE planta_id = j.value
+                        ORDER BY id DESC LIMIT ?
+                    )
+                    ORDER BY c.planta_id, c.id DESC
+                ''', (json.dumps(planta_ids), limit_per_planta))
+            rows = cur.fetchall()
+        for row in rows:
+            resultado[row['planta_id']].append(self._row_to_dict(row))
+        return resultado
+
+    def buscar(self, q: str, planta_id: Optional[int] = None, offset: int = 0,
+               limit: Optional[int] = None) -> List[dict]:
+        """
+        Búsqueda de texto completo en notas y descripción, de más a menos
+        relevante (bm25). Cada resultado incluye su `relevancia` (menor es mejor).
+        """
+        expresion = expresion_fts(q)
+        if expresion is None:
+            return []
+        sql = '''
+            SELECT c.*, bm25(cuidados_fts) AS relevancia
+            FROM cuidados_fts JOIN cuidados AS c ON c.id = cuidados_fts.rowid
+            WHERE cuidados_fts MATCH ?
+        '''
+        params = [expresion]
+        if planta_id is not None:
+            sql += ' AND c.planta_id = ?'
+            params.append(planta_id)
+        sql += ' ORDER BY relevancia, c.id LIMIT ? OFFSET ?'
+        params.extend([-1 if limit is None else limit, offset])
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
         return [self._row_to_dict(r) for r in rows]
 
     def delete(self, cuidado_id: int) -> bool:
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM cuidados WHERE id = ?', (cuidado_id,))
-        conn.commit()
-        affected = cur.rowcount
-        conn.close()
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute('DELETE FROM cuidados WHERE id = ?', (cuidado_id,))
+            conn.commit()
+            affected = cur.rowcount
         return affected > 0
@@ -0,0 +1,167 @@
+"""
+Cliente HTTP hacia plantas-service para validar planta_id y consultar plantas
+Usa conexiones keep-alive reutilizables y una caché de existencia
+(positiva y negativa) con TTL, consultando en lote los ids que faltan.
+"""
+import http.client
+import json
+import os
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from cache import LRUCache
+from db import SQLITE_INT_MAX
+
+DEFAULT_TIMEOUT = float(os.environ.get('PLANTAS_SERVICE_TIMEOUT', 2))
+DEFAULT_POOL_SIZE = int(os.environ.get('PLANTAS_SERVICE_POOL_SIZE', 4))
+DEFAULT_TTL_EXISTE = float(os.environ.get('PLANTAS_CACHE_TTL_EXISTE', 300))
+DEFAULT_TTL_NO_EXISTE = float(os.environ.get('PLANTAS_CACHE_TTL_NO_EXISTE', 30))
+# Ids por petición (plantas-service acepta hasta MAX_IDS)
+MAX_IDS_POR_CONSULTA = 500
+
+
+class PlantasServiceError(Exception):
+    """plantas-service no respondió o devolvió una respuesta inválida"""
+
+
+class PlantasClient:
+    """Consulta plantas-service (existencia y listado de plantas)"""
+
+    def __init__(self, base_url: str, timeout: float = DEFAULT_TIMEOUT,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 ttl_existe: float = DEFAULT_TTL_EXISTE,
+                 ttl_no_existe: float = DEFAULT_TTL_NO_EXISTE,
+                 cache_size: int = 10000):
+        url = urlsplit(base_url)
+        self._https = url.scheme == 'https'
+        self._host = url.hostname
+        self._port = url.port
+        self._prefix = url.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._existe = LRUCache(cache_size, ttl_existe)
+        self._no_existe = LRUCache(cache_size, ttl_no_existe)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'connections_created': 0, 'errors': 0}
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        with self._lock:
+            self._stats['connections_created'] += 1
+        return cls(self._host, self._port, timeout=self.timeout)
+
+    def _request(self, path: str, headers: Optional[dict] = None) -> Tuple[int, str, Optional[dict]]:
+        """
+        GET con una conexión del pool; reintenta una vez si la conexión estaba cerrada.
+        Devuelve (status, etag, json); json es None para 304.
+        """
+        headers = dict(headers or {}, Accept='application/json')
+        for intento in range(2):
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._new_connection()
+            try:
+                conn.request('GET', self._prefix + path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if intento == 0:
+                    continue
+                with self._lock:
+                    self._stats['errors'] += 1
+                raise PlantasServiceError(f'No se pudo contactar a plantas-service: {e}')
+            with self._lock:
+                self._stats['requests'] += 1
+            if response.will_close:
+                conn.close()
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            if response.status == 304:
+                return 304, response.getheader('ETag'), None
+            if response.status != 200:
+                with self._lock:
+                    self._stats['errors'] += 1
+                raise PlantasServiceError(f'plantas-service respondió {response.status}')
+            try:
+                return 200, response.getheader('ETag'), json.loads(body)
+            except ValueError:
+                raise PlantasServiceError('Respuesta inválida de plantas-service')
+
+    def _get_json(self, path: str) -> dict:
+        return self._request(path)[2]
+
+    def listar_plantas(self, etag: Optional[str] = None) -> Tuple[Optional[List[dict]], Optional[str]]:
+        """
+        Descarga todas las plantas recorriendo la paginación.
+        Si `etag` sigue vigente devuelve (None, etag) sin descargar nada.
+        """
+        headers = {'If-None-Match': etag} if etag else None
+        status, nuevo_etag, data = self._request(f'/api/plantas?limit={MAX_IDS_POR_CONSULTA}', headers)
+        if status == 304:
+            return None, etag
+        plantas = list(data['data'])
+        while data.get('next_cursor') is not None:
+            _, _, data = self._request(
+                f"/api/plantas?limit={MAX_IDS_POR_CONSULTA}&after_id={data['next_cursor']}")
+            plantas.extend(data['data'])
+        return plantas, nuevo_etag
+
+    def existen(self, ids: Iterable[int]) -> Dict[int, bool]:
+        """
+        Indica para cada id si la planta existe, consultando solo los que no están en caché.
+        Un id fuera de 1..2^63-1 no puede existir: se responde False sin consultar
+        (plantas-service lo rechazaría con 400 y se tomaría como un fallo).
+        """
+        resultado = {}
+        faltantes = []
+        for planta_id in set(ids):
+            if not 0 < planta_id <= SQLITE_INT_MAX:
+                resultado[planta_id] = False
+            elif self._existe.get(planta_id):
+                resultado[planta_id] = True
+            elif self._no_existe.get(planta_id):
+                resultado[planta_id] = False
+            else:
+                faltantes.append(planta_id)
+
+        faltantes.sort()
+        for i in range(0, len(faltantes), MAX_IDS_POR_CONSULTA):
+            lote = faltantes[i:i + MAX_IDS_POR_CONSULTA]
+            data = self._get_json('/api/plantas/existentes?ids=' + ','.join(map(str, lote)))
+            existentes = set(data['data']['existentes'])
+            for planta_id in lote:
+                existe = planta_id in existentes
+                (self._existe if existe else self._no_existe).set(planta_id, True)
+                resultado[planta_id] = existe
+        return resultado
+
+    def existe(self, planta_id: int) -> bool:
+        return self.existen([planta_id])[planta_id]
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+        data['idle_connections'] = self._idle.qsize()
+        data['cache_existe'] = self._existe.stats()
+        data['cache_no_existe'] = self._no_existe.stats()
+        return data
+
+
+def client_from_env() -> Optional[PlantasClient]:
+    """Crea el cliente si PLANTAS_SERVICE_URL está definida; si no, la validación queda desactivada"""
+    url = os.environ.get('PLANTAS_SERVICE_URL')
+    return PlantasClient(url) if url else None
@@ -0,0 +1,223 @@
+"""
+Instrumentación de las sentencias SQLite del servicio
+Las conexiones del pool usan un cursor que mide cada sentencia (ejecución
+y lectura de filas), acumula estadísticas por sentencia normalizada y
+registra en el log las que superan SLOW_QUERY_MS junto con la forma de
+sus parámetros y su EXPLAIN QUERY PLAN.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Desactivado por defecto: el cursor instrumentado agrega trabajo en Python y un lock
+# global a cada sentencia; se activa para diagnosticar (SQLITE_QUERY_STATS=1)
+QUERY_STATS_ENABLED = os.environ.get('SQLITE_QUERY_STATS', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+# Sentencias distintas que se siguen y consultas lentas que se conservan
+MAX_STATEMENTS = int(os.environ.get('QUERY_STATS_MAX_STATEMENTS', 500))
+MAX_SLOW_QUERIES = int(os.environ.get('QUERY_STATS_MAX_SLOW', 100))
+
+logger = logging.getLogger('sqlite.slow')
+
+
+@lru_cache(maxsize=1024)
+def normalizar_sql(sql: str) -> str:
+    """Una línea, sin espacios repetidos y con las listas `?, ?, ?` como `?...`"""
+    sql = ' '.join(sql.split())
+    return re.sub(r'\?(?:\s*,\s*\?)+', '?...', sql)
+
+
+def forma_parametros(params) -> str:
+    """Describe los parámetros sin exponer sus valores: tipos o cantidad"""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in params.items()) + '}'
+    params = list(params)
+    if len(params) > 10:
+        return f'({len(params)} parámetros)'
+    return '(' + ', '.join(type(p).__name__ for p in params) + ')'
+
+
+class QueryStats:
+    """Estadísticas por sentencia y registro de consultas lentas"""
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, max_statements: int = MAX_STATEMENTS,
+                 max_slow: int = MAX_SLOW_QUERIES):
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self._stats: Dict[str, dict] = {}
+        self._slow = deque(maxlen=max_slow)
+        self._lock = threading.Lock()
+        self._descartadas = 0
+
+    def record(self, conn: sqlite3.Connection, sql: str, params, elapsed: float,
+               filas: Optional[int] = None):
+        ms = elapsed * 1000
+        clave = normalizar_sql(sql)
+        with self._lock:
+            stats = self._stats.get(clave)
+            if stats is None:
+                if len(self._stats) >= self.max_statements:
+                    self._descartadas += 1
+                    stats = None
+                else:
+                    stats = self._stats[clave] = {
+                        'sql': clave, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                        'rows': 0, 'slow': 0, 'plan': None,
+                    }
+            if stats is not None:
+                stats['count'] += 1
+                stats['total_ms'] += ms
+                stats['max_ms'] = max(stats['max_ms'], ms)
+                stats['rows'] += filas or 0
+        if ms < self.slow_ms:
+            return
+
+        plan = explain(conn, sql, params)
+        entrada = {
+            'sql': clave,
+            'params': forma_parametros(params),
+            'ms': round(ms, 3),
+            'rows': filas,
+            'plan': plan,
+            'at': time.time(),
+        }
+        with self._lock:
+            self._slow.append(entrada)
+            if stats is not None:
+                stats['slow'] += 1
+                stats['plan'] = plan
+        logger.warning('Consulta lenta (%.1f ms) %s params=%s plan=%s',
+                       ms, clave, entrada['params'], ' | '.join(plan or []))
+
+    def snapshot(self, order_by: str = 'total_ms', limit: Optional[int] = None) -> dict:
+        """Estadísticas ordenadas (descendente) y las últimas consultas lentas"""
+        with self._lock:
+            sentencias = [dict(s) for s in self._stats.values()]
+            lentas = list(self._slow)
+            descartadas = self._descartadas
+        for s in sentencias:
+            s['avg_ms'] = round(s['total_ms'] / s['count'], 3) if s['count'] else 0.0
+            s['total_ms'] = round(s['total_ms'], 3)
+            s['max_ms'] = round(s['max_ms'], 3)
+        sentencias.sort(key=lambda s: s.get(order_by, 0), reverse=True)
+        return {
+            'enabled': QUERY_STATS_ENABLED,
+            'slow_query_ms': self.slow_ms,
+            'statements': sentencias[:limit] if limit else sentencias,
+            'untracked_statements': descartadas,
+            'slow_queries': lentas[::-1],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+            self._descartadas = 0
+
+
+query_stats = QueryStats()
+
+
+def explain(conn: sqlite3.Connection, sql: str, params) -> Optional[List[str]]:
+    """EXPLAIN QUERY PLAN de la sentencia (None si no aplica, p. ej. BEGIN o PRAGMA)"""
+    try:
+        # Se usa el execute base para no medir ni registrar la propia consulta del plan
+        cur = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql,
+                                         params if params is not None else ())
+        return [row[-1] for row in cur.fetchall()]
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor que mide cada sentencia: el tiempo de execute más el de leer sus
+    filas (fetch*), y la registra al agotarse, al ejecutar otra o al cerrarse.
+    """
+    _pendiente = None
+
+    def _registrar(self):
+        pendiente, self._pendiente = self._pendiente, None
+        if pendiente is not None:
+            sql, params, elapsed, filas = pendiente
+            query_stats.record(self.connection, sql, params, elapsed, filas)
+
+    def _acumular(self, elapsed: float, filas: int, fin: bool):
+        if self._pendiente is not None:
+            sql, params, total, previas = self._pendiente
+            self._pendiente = (sql, params, total + elapsed, previas + filas)
+            if fin:
+                self._registrar()
+
+    def execute(self, sql, params=()):
+        self._registrar()
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._pendiente = (sql, params, time.perf_counter() - inicio, 0)
+            # Sin columnas de resultado (INSERT, UPDATE, ...) la sentencia ya terminó
+            if self.description is None:
+                self._acumular(0.0, max(self.rowcount, 0), True)
+
+    def executemany(self, sql, seq_of_params):
+        self._registrar()
+        seq_of_params = list(seq_of_params)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            elapsed = time.perf_counter() - inicio
+            params = seq_of_params[0] if seq_of_params else ()
+            query_stats.record(self.connection, sql, params, elapsed, len(seq_of_params))
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        row = super().fetchone()
+        # Las búsquedas por clave leen una sola fila: se da por terminada
+        self._acumular(time.perf_counter() - inicio, 0 if row is None else 1, True)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        inicio = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._acumular(time.perf_counter() - inicio, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        rows = super().fetchall()
+        self._acumular(time.perf_counter() - inicio, len(rows), True)
+        return rows
+
+    def close(self):
+        self._registrar()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._registrar()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de execute) son InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
@@ -0,0 +1,166 @@
+"""
+Planificador de riegos pendientes
+Mantiene un heap con la próxima fecha de riego de cada planta
+(último riego + frecuencia_riego_dias) que se actualiza con cada
+riego registrado y con los cambios de plantas-service.
+"""
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# Segundos entre sincronizaciones con plantas-service y la tabla resumen
+DEFAULT_REFRESH_SECONDS = float(os.environ.get('RIEGO_SCHEDULER_REFRESH', 60))
+
+# Marca para conservar el último riego conocido al actualizar una planta
+_SIN_CAMBIO = object()
+
+
+class RiegoScheduler:
+    """Cola de prioridad (heap) de plantas ordenadas por próximo riego"""
+
+    def __init__(self):
+        self._heap = []  # (proximo_riego, planta_id, generacion)
+        self._plantas: Dict[int, dict] = {}
+        self._generacion = 0
+        self._lock = threading.Lock()
+
+    def _push(self, planta_id: int):
+        planta = self._plantas[planta_id]
+        if planta['ultimo_riego']:
+            base = datetime.fromisoformat(planta['ultimo_riego'])
+            proximo = base + timedelta(days=planta['frecuencia_riego_dias'])
+        else:
+            # Nunca regada: pendiente desde su creación
+            proximo = datetime.fromisoformat(planta['fecha_creacion']) if planta['fecha_creacion'] else datetime.min
+        self._generacion += 1
+        planta['proximo_riego'] = proximo
+        planta['generacion'] = self._generacion
+        heapq.heappush(self._heap, (proximo, planta_id, self._generacion))
+        # Compactar cuando las entradas obsoletas superan a las vigentes
+        if len(self._heap) > 2 * len(self._plantas) + 64:
+            self._heap = [(p['proximo_riego'], pid, p['generacion']) for pid, p in self._plantas.items()]
+            heapq.heapify(self._heap)
+
+    def set_planta(self, planta_id: int, frecuencia_riego_dias: int, nombre: Optional[str] = None,
+                   fecha_creacion: Optional[str] = None, ultimo_riego=_SIN_CAMBIO):
+        """Alta o actualización de una planta; conserva el último riego conocido si no se indica"""
+        with self._lock:
+            actual = self._plantas.get(planta_id)
+            if ultimo_riego is _SIN_CAMBIO:
+                ultimo_riego = actual['ultimo_riego'] if actual else None
+            if (actual and actual['frecuencia_riego_dias'] == frecuencia_riego_dias
+                    and actual['ultimo_riego'] == ultimo_riego):
+                actual['nombre'] = nombre
+                return
+            self._plantas[planta_id] = {
+                'nombre': nombre,
+                'frecuencia_riego_dias': frecuencia_riego_dias,
+                'fecha_creacion': fecha_creacion,
+                'ultimo_riego': ultimo_riego,
+            }
+            self._push(planta_id)
+
+    def remove_planta(self, planta_id: int):
+        with self._lock:
+            self._plantas.pop(planta_id, None)
+
+    def set_ultimos_riegos(self, ultimos: Dict[int, Optional[str]]):
+        """Reemplaza el último riego de todas las plantas conocidas (None si no tiene)"""
+        with self._lock:
+            for planta_id, planta in self._plantas.items():
+                fecha = ultimos.get(planta_id)
+                if planta['ultimo_riego'] != fecha:
+                    planta['ultimo_riego'] = fecha
+                    self._push(planta_id)
+
+    def planta_ids(self) -> set:
+        with self._lock:
+            return set(self._plantas)
+
+    def registrar_riego(self, planta_id: int, fecha: Optional[str]):
+        """Actualiza el último riego de una planta (ignora plantas desconocidas)"""
+        with self._lock:
+            planta = self._plantas.get(planta_id)
+            if planta is None or planta['ultimo_riego'] == fecha:
+                return
+            if fecha and planta['ultimo_riego'] and fecha < planta['ultimo_riego']:
+                return
+            planta['ultimo_riego'] = fecha
+            self._push(planta_id)
+
+    def pendientes(self, before: datetime, limit: Optional[int] = None) -> List[dict]:
+        """
+        Plantas con próximo riego <= before, de la más atrasada a la más reciente.
+        Recorre el heap en orden sin vaciarlo: O(k log k) para k resultados.
+        """
+        resultado = []
+        with self._lock:
+            heap = self._heap
+            frontera = [(heap[0], 0)] if heap else []
+            while frontera and (limit is None or len(resultado) < limit):
+                (proximo, planta_id, generacion), i = heapq.heappop(frontera)
+                if proximo > before:
+                    break
+                planta = self._plantas.get(planta_id)
+                if planta is not None and planta['generacion'] == generacion:
+                    resultado.append({
+                        'planta_id': planta_id,
+                        'nombre': planta['nombre'],
+                        'frecuencia_riego_dias': planta['frecuencia_riego_dias'],
+                        'ultimo_riego': planta['ultimo_riego'],
+                        'proximo_riego': None if proximo == datetime.min else proximo.isoformat(),
+                        'dias_atraso': (before - proximo).days if proximo != datetime.min else None,
+                    })
+                for hijo in (2 * i + 1, 2 * i + 2):
+                    if hijo < len(heap):
+                        heapq.heappush(frontera, (heap[hijo], hijo))
+        return resultado
+
+    def __len__(self):
+        return len(self._plantas)
+
+
+class SchedulerSync:
+    """
+    Alimenta un RiegoScheduler con las plantas de plantas-service (GET
+    condicional con ETag) y con los últimos riegos de la tabla resumen.
+    Se sincroniza como máximo cada `refresh` segundos.
+    """
+
+    def __init__(self, scheduler: RiegoScheduler, plantas_client, cuidado_manager,
+                 refresh: float = DEFAULT_REFRESH_SECONDS):
+        self.scheduler = scheduler
+        self.plantas_client = plantas_client
+        self.cuidado_manager = cuidado_manager
+        self.refresh = refresh
+        self._etag = None
+        self._version_cuidados = None
+        self._ultima_sync = None
+        self._lock = threading.Lock()
+
+    def sync(self, force: bool = False):
+        with self._lock:
+            if not force and self._ultima_sync and time.monotonic() - self._ultima_sync < self.refresh:
+                return
+            plantas, self._etag = self.plantas_client.listar_plantas(self._etag)
+            if plantas is not None:
+                ids = set()
+                for p in plantas:
+                    ids.add(p['id'])
+                    self.scheduler.set_planta(p['id'], p['frecuencia_riego_dias'], p.get('nombre'),
+                                              p.get('fecha_creacion'))
+                for planta_id in self.scheduler.planta_ids() - ids:
+                    self.scheduler.remove_planta(planta_id)
+                # Plantas nuevas: hay que cargar su último riego
+                self._version_cuidados = None
+            # Riegos registrados por otros procesos (o borrados): releer del resumen
+            version = self.cuidado_manager.get_version('cuidados')[0]
+            if version != self._version_cuidados:
+                self.scheduler.set_ultimos_riegos({
+                    r['planta_id']: r['ultimo_riego'] for r in self.cuidado_manager.get_resumenes()
+                })
+                self._version_cuidados = version
+            self._ultima_sync = time.monotonic()
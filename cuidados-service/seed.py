@@ -0,0 +1,208 @@
+"""
+Siembra rápida de cuidados sintéticos para pruebas de volumen (millones de filas)
+
+Uso:
+    python seed.py --cuidados 1000000                         # 50.000 plantas, ~20 cuidados c/u
+    python seed.py --cuidados 5000000 --plantas 100000 --tipos "riego:80,fertilizacion:10,general:10"
+    python seed.py --cuidados 200000 --historial "1:5,10:3,200:1" --db /tmp/cuidados.db
+
+Los cuidados de cada planta se reparten a lo largo de los últimos `--dias` días
+y se insertan en orden cronológico global (ids crecientes con la fecha, como en
+producción). La carga va en una sola transacción, con PRAGMAs de carga masiva y
+sin índices ni triggers; al final se recrean y se reconstruyen el índice FTS,
+el resumen por planta y las versiones. Ejecutar con el servicio detenido.
+"""
+import argparse
+import heapq
+import json
+import random
+import time
+from datetime import datetime
+from typing import Callable, Iterator, List, Tuple
+
+from db import bulk_connection, deferred_indexes
+from models import DB_PATH, RECALCULAR_RESUMEN, CuidadoManager
+
+# Distribuciones por defecto en formato "valor:peso,..."
+TIPOS = 'riego:70,fertilizacion:15,general:15'
+# Largo relativo del historial de cada planta: muchas con pocos cuidados y unas
+# pocas con muchos. Los largos sorteados se escalan para sumar --cuidados.
+HISTORIAL = '1:3,5:3,20:3,80:1'
+# Plantas por defecto: una cada CUIDADOS_POR_PLANTA cuidados
+CUIDADOS_POR_PLANTA = 20
+NOTAS = ('Riego de rutina', 'Hojas amarillas', 'Poda de hojas secas', 'Sustrato seco',
+         'Revisar plagas', 'Aplicar fertilizante líquido', 'Trasplante a maceta más grande', '')
+DESCRIPCIONES = ('Poda de formación', 'Limpieza de hojas', 'Cambio de sustrato', 'Tratamiento contra cochinilla')
+FERTILIZANTES = ('Orgánico', 'NPK 20-20-20', 'Humus de lombriz')
+CANTIDADES_ML = (100, 200, 250, 300, 500)
+DIAS = 730
+# Filas generadas por tanda (los sorteos se hacen de a muchos, es más rápido)
+LOTE = 10000
+
+
+def distribucion(texto: str, convertir: Callable = str) -> Tuple[list, List[float]]:
+    """
+    'riego:70,general:30' -> (['riego', 'general'], [70.0, 30.0]).
+    Un valor sin peso vale 1.
+    """
+    valores, pesos = [], []
+    for parte in texto.split(','):
+        valor, separador, peso = parte.strip().rpartition(':')
+        if not separador:
+            valor, peso = peso, '1'
+        try:
+            valores.append(convertir(valor.strip()))
+            pesos.append(float(peso))
+        except ValueError:
+            raise ValueError(f'Distribución inválida: {parte.strip()!r} (se espera valor:peso)')
+        if pesos[-1] < 0:
+            raise ValueError(f'Peso negativo en la distribución: {parte.strip()!r}')
+    if not valores or sum(pesos) <= 0:
+        raise ValueError(f'Distribución vacía: {texto!r}')
+    return valores, pesos
+
+
+def largos_de_historial(n: int, plantas: int, rng: random.Random, historial: str = HISTORIAL) -> List[int]:
+    """
+    Cantidad de cuidados de cada planta (índice 0 = planta 1): un largo
+    sorteado de `historial` por planta, con ±50 % de variación, escalado para
+    que el total sea exactamente n.
+    """
+    valores, pesos = distribucion(historial, float)
+    if any(v <= 0 for v in valores):
+        raise ValueError('Los largos de historial deben ser positivos')
+    relativos = [v * rng.uniform(0.5, 1.5) for v in rng.choices(valores, pesos, k=plantas)]
+    escala = n / sum(relativos)
+    largos = [int(r * escala) for r in relativos]
+    # Lo que se perdió al truncar va a plantas al azar, de a uno
+    for i in rng.choices(range(plantas), relativos, k=n - sum(largos)):
+        largos[i] += 1
+    return largos
+
+
+def generar_cuidados(n: int, plantas: int, rng: random.Random, tipos: str = TIPOS,
+                     historial: str = HISTORIAL, dias: int = DIAS) -> Iterator[tuple]:
+    """
+    Filas (planta_id, tipo, cantidad_ml, tipo_fertilizante, cantidad,
+    descripcion, notas, fecha, fecha_epoch) en orden cronológico. Cada planta
+    recibe su historial a intervalos regulares (con variación) dentro de los
+    últimos `dias` días; un heap intercala las plantas por fecha. Las
+    distribuciones se validan al llamar (ValueError), no al empezar a iterar.
+    """
+    valores_tipo, pesos_tipo = distribucion(tipos)
+    invalidos = set(valores_tipo) - {'riego', 'fertilizacion', 'general'}
+    if invalidos:
+        raise ValueError(f"Tipos de cuidado desconocidos: {', '.join(sorted(invalidos))}")
+    largos = largos_de_historial(n, plantas, rng, historial) if n else []
+    fin = time.time()
+    ventana = dias * 86400
+
+    # (próxima fecha, planta_id, cuidados restantes, intervalo medio)
+    heap = []
+    for planta_id, largo in enumerate(largos, start=1):
+        if largo:
+            intervalo = ventana / largo
+            heap.append((fin - ventana + rng.random() * intervalo, planta_id, largo, intervalo))
+    heapq.heapify(heap)
+
+    def filas():
+        while heap:
+            k = min(LOTE, n)
+            sorteo_tipos = rng.choices(valores_tipo, pesos_tipo, k=k)
+            sorteo_notas = rng.choices(NOTAS, k=k)
+            sorteo_ml = rng.choices(CANTIDADES_ML, k=k)
+            for j in range(k):
+                if not heap:
+                    return
+                momento, planta_id, restantes, intervalo = heap[0]
+                if restantes > 1:
+                    siguiente = min(momento + intervalo * rng.uniform(0.5, 1.5), fin)
+                    heapq.heapreplace(heap, (siguiente, planta_id, restantes - 1, intervalo))
+                else:
+                    heapq.heappop(heap)
+                epoch = int(momento)
+                fecha = datetime.fromtimestamp(epoch).isoformat()
+                tipo = sorteo_tipos[j]
+                if tipo == 'riego':
+                    yield (planta_id, tipo, sorteo_ml[j], None, None, None, sorteo_notas[j], fecha, epoch)
+                elif tipo == 'fertilizacion':
+                    yield (planta_id, tipo, None, rng.choice(FERTILIZANTES), '10ml', None,
+                           sorteo_notas[j], fecha, epoch)
+                else:
+                    yield (planta_id, tipo, None, None, None, rng.choice(DESCRIPCIONES),
+                           sorteo_notas[j], fecha, epoch)
+    return filas()
+
+
+def sembrar_cuidados(db_path: str, n: int, plantas: int, rng: random.Random, tipos: str = TIPOS,
+                     historial: str = HISTORIAL, dias: int = DIAS) -> dict:
+    """
+    Agrega n cuidados sintéticos de las plantas 1..`plantas` a la base
+    (creándola si no existe) y devuelve un reporte
+    """
+    if plantas <= 0:
+        raise ValueError('Se necesita al menos una planta')
+    inicio = time.perf_counter()
+    # Crea o migra el esquema con el gestor y suelta sus conexiones antes de la carga
+    manager = CuidadoManager(db_path=db_path, group_commit=False)
+    manager._pool.close()
+
+    with bulk_connection(db_path) as conn:
+        ultimo_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM cuidados').fetchone()[0]
+        conn.execute('BEGIN')
+        try:
+            with deferred_indexes(conn, 'cuidados'):
+                conn.executemany('''
+                    INSERT INTO cuidados (planta_id, tipo, cantidad_ml, tipo_fertilizante,
+                                          cantidad, descripcion, notas, fecha, fecha_epoch)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', generar_cuidados(n, plantas, rng, tipos, historial, dias))
+            carga = time.perf_counter() - inicio
+            # Lo que habrían hecho los triggers, de una vez para toda la tabla
+            conn.execute("INSERT INTO cuidados_fts (cuidados_fts) VALUES ('rebuild')")
+            conn.execute(RECALCULAR_RESUMEN)
+            conn.execute('''
+                INSERT INTO versiones (scope, version, updated_at)
+                SELECT scope, 1, CAST(strftime('%s', 'now') AS INTEGER) FROM (
+                    SELECT 'cuidados' AS scope
+                    UNION ALL
+                    SELECT DISTINCT 'planta:' || planta_id FROM cuidados WHERE id > ?
+                ) WHERE true
+                ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+            ''', (ultimo_id,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    segundos = time.perf_counter() - inicio
+    return {
+        'cuidados': n,
+        'plantas': plantas,
+        'primer_id': ultimo_id + 1,
+        'segundos_carga': round(carga, 2),
+        'segundos_derivados': round(segundos - carga, 2),
+        'segundos': round(segundos, 2),
+        'filas_por_segundo': round(n / segundos) if segundos else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cuidados', type=int, default=1000000, help='Cantidad de cuidados a agregar')
+    parser.add_argument('--plantas', type=int,
+                        help=f'Plantas (ids 1..N) a las que pertenecen (por defecto cuidados / {CUIDADOS_POR_PLANTA})')
+    parser.add_argument('--tipos', default=TIPOS, help='Distribución de tipos de cuidado (valor:peso,...)')
+    parser.add_argument('--historial', default=HISTORIAL,
+                        help='Distribución del largo relativo del historial por planta (valor:peso,...)')
+    parser.add_argument('--dias', type=int, default=DIAS, help='Días de historia hacia atrás desde hoy')
+    parser.add_argument('--db', default=DB_PATH, help='Base de datos a poblar (por defecto CUIDADOS_DB_PATH)')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de los datos')
+    args = parser.parse_args()
+
+    plantas = args.plantas or max(1, args.cuidados // CUIDADOS_POR_PLANTA)
+    try:
+        reporte = sembrar_cuidados(args.db, args.cuidados, plantas, random.Random(args.seed),
+                                   args.tipos, args.historial, args.dias)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(reporte, ensure_ascii=False, indent=2))
@@ -0,0 +1,10 @@
+"""
+Configuración común de pruebas: usa una base de datos temporal
+"""
+import os
+import tempfile
+
+# Debe definirse antes de importar app/models para no tocar cuidados.db
+os.environ.setdefault('CUIDADOS_DB_PATH', os.path.join(tempfile.mkdtemp(), 'cuidados_test.db'))
+# La instrumentación de consultas está desactivada por defecto; las pruebas la cubren
+os.environ.setdefault('SQLITE_QUERY_STATS', '1')
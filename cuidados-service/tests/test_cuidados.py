@@ -2,14 +2,32 @@
 Pruebas unitarias para el Servicio de Cuidados
 """
 import pytest
+import sqlite3
 import sys
+import threading
+import gzip
+import json
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 import os
 
 # Agregar el directorio padre al path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import app
-from models import CuidadoManager
+import app as cuidados_app
+from app import create_app
+from plantas_client import PlantasClient, PlantasServiceError
+from riego_scheduler import RiegoScheduler, SchedulerSync
+from models import CuidadoManager, MIGRATIONS
+from db import schema_version
+from query_stats import query_stats
+import admin
+from benchmarks import bench_cuidados
+import random
+import seed
+
+app = create_app()
 
 @pytest.fixture
 def client():
@@ -19,9 +37,64 @@ def client():
         yield client
 
 @pytest.fixture
-def cuidado_manager():
+def cuidado_manager(tmp_path):
     """Fixture para el gestor de cuidados"""
-    return CuidadoManager()
+    return CuidadoManager(db_path=str(tmp_path / 'cuidados.db'))
+
+@pytest.fixture
+def plantas_stub():
+    """Servicio de plantas local de reemplazo que conoce las plantas 1, 2 y 3"""
+    consultas = []
+    listados = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _json(self, data, status=200):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/api/plantas':
+                listados.append(self.headers.get('If-None-Match'))
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self._json({'success': True, 'next_cursor': None, 'data': [
+                    {'id': 1, 'nombre': 'Monstera', 'frecuencia_riego_dias': 7,
+                     'fecha_creacion': '2025-01-01T00:00:00'},
+                    {'id': 2, 'nombre': 'Suculenta', 'frecuencia_riego_dias': 14,
+                     'fecha_creacion': '2025-01-01T00:00:00'},
+                    {'id': 3, 'nombre': 'Helecho', 'frecuencia_riego_dias': 2,
+                     'fecha_creacion': '2025-01-01T00:00:00'},
+                ]})
+                return
+            ids = [int(x) for x in parse_qs(url.query)['ids'][0].split(',')]
+            consultas.append(ids)
+            self._json({'success': True,
+                        'data': {'existentes': [i for i in ids if i in (1, 2, 3)]}})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+    client = PlantasClient(f'http://127.0.0.1:{server.server_address[1]}')
+    client.consultas = consultas
+    client.listados = listados
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
 
 class TestCuidadoManager:
     """Pruebas para CuidadoManager"""
@@ -95,6 +168,74 @@ class TestCuidadoManager:
         cuidados_planta_2 = cuidado_manager.get_by_planta(2)
         assert len(cuidados_planta_2) == 1
 
+    def test_obtener_cuidados_por_planta_paginados(self, cuidado_manager):
+        """Test: Paginación por cursor de los cuidados de una planta"""
+        ids = [cuidado_manager.registrar_riego(1, 100 + i)['id'] for i in range(5)]
+        cuidado_manager.registrar_riego(2, 400)
+
+        pagina = cuidado_manager.get_by_planta(1, after_id=0, limit=2)
+        assert [c['id'] for c in pagina] == ids[:2]
+
+        pagina = cuidado_manager.get_by_planta(1, after_id=ids[1], limit=10)
+        assert [c['id'] for c in pagina] == ids[2:]
+
+    def test_proyeccion_de_campos(self, cuidado_manager):
+        """Test: fields se traslada al SELECT y siempre incluye el id"""
+        riego = cuidado_manager.registrar_riego(1, 250, "Nota larga")
+        esperado = {'id': riego['id'], 'tipo': 'riego', 'fecha': riego['fecha']}
+
+        assert cuidado_manager.get_by_id(riego['id'], fields=['tipo', 'fecha']) == esperado
+        assert cuidado_manager.get_all(fields=['fecha', 'tipo']) == [esperado]
+        assert cuidado_manager.get_by_planta(1, fields=['tipo', 'fecha']) == [esperado]
+        assert list(cuidado_manager.iter_by_planta(1, fields=['tipo', 'fecha'])) == [esperado]
+
+        with pytest.raises(ValueError):
+            cuidado_manager.get_all(fields=['planta_id', '*'])
+
+    def test_iterar_cuidados_por_bloques(self, cuidado_manager):
+        """Test: iter_all/iter_by_planta recorren el cursor con fetchmany"""
+        ids = [cuidado_manager.registrar_riego(1, 100 + i)['id'] for i in range(5)]
+        cuidado_manager.registrar_riego(2, 400)
+
+        assert [c['id'] for c in cuidado_manager.iter_by_planta(1, chunk_size=2)] == ids
+        assert [c['id'] for c in cuidado_manager.iter_by_planta(1, after_id=ids[0], limit=2)] == ids[1:3]
+        assert len(list(cuidado_manager.iter_all(chunk_size=4))) == 6
+
+        # Abandonar el generador devuelve la conexión al pool
+        iterador = cuidado_manager.iter_all(chunk_size=1)
+        next(iterador)
+        iterador.close()
+        assert cuidado_manager.pool_stats()['in_use'] == 0
+
+    def test_obtener_cuidados_de_varias_plantas(self, cuidado_manager):
+        """Test: Cuidados de varias plantas en una consulta, con límite por planta"""
+        for ml in (100, 200, 300):
+            cuidado_manager.registrar_riego(1, ml)
+        cuidado_manager.registrar_riego(2, 50)
+
+        todos = cuidado_manager.get_by_plantas([2, 1, 9])
+        assert list(todos) == [2, 1, 9]
+        assert len(todos[1]) == 3
+        assert todos[9] == []
+
+        recientes = cuidado_manager.get_by_plantas([1, 2], limit_per_planta=2)
+        assert [c['cantidad_ml'] for c in recientes[1]] == [300, 200]
+        assert len(recientes[2]) == 1
+
+    def test_registrar_lote(self, cuidado_manager):
+        """Test: Registrar varios cuidados en una transacción"""
+        cuidado_manager.registrar_riego(9, 100)
+        creados = cuidado_manager.registrar_lote([
+            {'tipo': 'riego', 'planta_id': 1, 'cantidad_ml': 300},
+            {'tipo': 'fertilizacion', 'planta_id': 2, 'tipo_fertilizante': 'NPK', 'cantidad': '5g'},
+            {'tipo': 'general', 'planta_id': 3, 'descripcion': 'Poda', 'notas': 'Ligera'},
+        ])
+
+        assert [c['id'] for c in creados] == [2, 3, 4]
+        assert [c['tipo'] for c in creados] == ['riego', 'fertilizacion', 'general']
+        assert creados[2]['notas'] == 'Ligera'
+        assert len(cuidado_manager.get_all()) == 4
+
     def test_eliminar_cuidado(self, cuidado_manager):
         """Test: Eliminar registro de cuidado"""
         cuidado = cuidado_manager.registrar_riego(1, 500, "Riego temporal")
@@ -105,6 +246,436 @@ class TestCuidadoManager:
         eliminado = cuidado_manager.get_by_id(cuidado['id'])
         assert eliminado is None
 
+class TestConnectionPool:
+    """Pruebas para el pool de conexiones SQLite"""
+
+    def test_reutiliza_conexiones(self, cuidado_manager):
+        """Test: Los registros reutilizan la misma conexión"""
+        cuidado_manager.registrar_riego(1, 300)
+        cuidado_manager.registrar_riego(1, 200)
+        cuidado_manager.get_by_planta(1)
+
+        stats = cuidado_manager.pool_stats()
+        assert stats['created'] == 1
+        assert stats['reused'] >= 3
+        assert stats['in_use'] == 0
+
+    def test_health_incluye_estadisticas_pool(self, client):
+        """Test: /health expone las estadísticas del pool"""
+        response = client.get('/health')
+        data = response.get_json()
+        assert 'db_pool' in data
+        assert data['db_pool']['max_size'] >= 1
+
+class TestResumen:
+    """Pruebas para el resumen incremental por planta"""
+
+    def test_resumen_se_actualiza_en_altas_y_bajas(self, cuidado_manager):
+        """Test: El resumen refleja inserciones y eliminaciones"""
+        r1 = cuidado_manager.registrar_riego(1, 300)
+        r2 = cuidado_manager.registrar_riego(1, 200)
+        cuidado_manager.registrar_fertilizacion(1, 'NPK', '5g')
+        cuidado_manager.registrar_lote([{'tipo': 'general', 'planta_id': 1, 'descripcion': 'Poda'}])
+        cuidado_manager.registrar_riego(2, 50)
+
+        resumen = cuidado_manager.get_resumen(1)
+        assert resumen['total_cuidados'] == 4
+        assert resumen['total_riegos'] == 2
+        assert resumen['total_agua_ml'] == 500
+        assert resumen['ultimo_riego'] == r2['fecha']
+        assert resumen['total_fertilizaciones'] == 1
+        assert resumen['total_generales'] == 1
+
+        cuidado_manager.delete(r2['id'])
+        resumen = cuidado_manager.get_resumen(1)
+        assert resumen['total_riegos'] == 1
+        assert resumen['total_agua_ml'] == 300
+        assert resumen['ultimo_riego'] == r1['fecha']
+
+        assert [r['planta_id'] for r in cuidado_manager.get_resumenes()] == [1, 2]
+
+    def test_resumen_planta_sin_cuidados(self, cuidado_manager):
+        """Test: Una planta sin cuidados tiene un resumen vacío"""
+        cuidado = cuidado_manager.registrar_riego(5, 100)
+        cuidado_manager.delete(cuidado['id'])
+        resumen = cuidado_manager.get_resumen(5)
+        assert resumen['total_cuidados'] == 0
+        assert resumen['ultimo_riego'] is None
+        assert cuidado_manager.get_resumenes() == []
+
+    def test_resumen_backfill_en_migracion(self, tmp_path):
+        """Test: La migración calcula el resumen de los cuidados existentes"""
+        db_path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute(MIGRATIONS[0][1][0])
+        conn.executemany("INSERT INTO cuidados (planta_id, tipo, cantidad_ml, fecha) VALUES (?, ?, ?, ?)",
+                         [(4, 'riego', 100, '2024-01-01'), (4, 'riego', 150, '2024-02-01')])
+        conn.commit()
+        conn.close()
+
+        resumen = CuidadoManager(db_path=db_path).get_resumen(4)
+        assert resumen['total_riegos'] == 2
+        assert resumen['total_agua_ml'] == 250
+        assert resumen['ultimo_riego'] == '2024-02-01'
+
+class TestRangoFechas:
+    """Pruebas para las consultas por rango sobre fecha_epoch"""
+
+    def test_rango_con_indice(self, cuidado_manager):
+        """Test: from inclusive, to exclusive, resuelto con los índices de fecha"""
+        ids = [cuidado_manager.registrar_riego(1, 100)['id'] for _ in range(4)]
+        cuidado_manager.registrar_riego(2, 100)
+        with cuidado_manager._get_conn() as conn:
+            # Un cuidado por día a partir de 2024-05-01 00:00 UTC
+            for i, cuidado_id in enumerate(ids):
+                conn.execute('UPDATE cuidados SET fecha_epoch = ? WHERE id = ?',
+                             (1714521600 + i * 86400, cuidado_id))
+            conn.commit()
+
+        desde, hasta = 1714521600 + 86400, 1714521600 + 3 * 86400
+        assert [c['id'] for c in cuidado_manager.get_by_planta(1, desde=desde, hasta=hasta)] == ids[1:3]
+        assert [c['id'] for c in cuidado_manager.get_all(desde=desde, hasta=hasta)] == ids[1:3]
+        assert [c['id'] for c in cuidado_manager.iter_by_planta(1, desde=desde)] == ids[1:]
+        assert [c['id'] for c in cuidado_manager.iter_all(hasta=desde)] == ids[:1]
+
+        with cuidado_manager._get_conn() as conn:
+            for sql, params in [
+                ('SELECT * FROM cuidados INDEXED BY idx_cuidados_fecha_epoch '
+                 'WHERE id > 0 AND fecha_epoch >= ? AND fecha_epoch < ? ORDER BY id', (desde, hasta)),
+                ('SELECT * FROM cuidados INDEXED BY idx_cuidados_planta_fecha_epoch '
+                 'WHERE planta_id = 1 AND id > 0 AND fecha_epoch >= ? ORDER BY id', (desde,)),
+            ]:
+                plan = ' '.join(r['detail'] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+                assert 'fecha_epoch>?' in plan
+
+    def test_fecha_epoch_al_registrar(self, cuidado_manager):
+        """Test: Cada alta guarda el epoch UTC correspondiente a `fecha`"""
+        riego = cuidado_manager.registrar_riego(1, 100)
+        lote = cuidado_manager.registrar_lote([{'planta_id': 1, 'tipo': 'general', 'descripcion': 'x'}])
+        for cuidado in (riego, lote[0]):
+            assert cuidado['fecha_epoch'] == int(datetime.fromisoformat(cuidado['fecha']).timestamp())
+
+    def test_backfill_en_migracion(self, tmp_path):
+        """Test: La migración calcula fecha_epoch de los cuidados existentes"""
+        db_path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute(MIGRATIONS[0][1][0])
+        conn.execute("INSERT INTO cuidados (planta_id, tipo, fecha) VALUES (3, 'riego', '2024-05-01T12:30:00.250000')")
+        conn.commit()
+        conn.close()
+
+        cuidado = CuidadoManager(db_path=db_path).get_by_planta(3)[0]
+        assert cuidado['fecha_epoch'] == int(datetime(2024, 5, 1, 12, 30).timestamp())
+
+class TestBusqueda:
+    """Pruebas para la búsqueda de texto completo (FTS5)"""
+
+    def test_buscar_por_relevancia(self, cuidado_manager):
+        """Test: Coincidencias en notas y descripción, sin acentos ni mayúsculas"""
+        plaga = cuidado_manager.registrar_riego(1, 100, "Se detectó plaga de cochinilla")
+        trasplante = cuidado_manager.registrar_cuidado_general(2, "Trasplante a maceta grande",
+                                                               "Revisar si vuelve la plaga")
+        cuidado_manager.registrar_cuidado_general(2, "Poda de ramas secas")
+
+        assert {c['id'] for c in cuidado_manager.buscar('plaga')} == {plaga['id'], trasplante['id']}
+        assert [c['id'] for c in cuidado_manager.buscar('DETECTO')] == [plaga['id']]
+        assert [c['id'] for c in cuidado_manager.buscar('trasp*')] == [trasplante['id']]
+        assert [c['id'] for c in cuidado_manager.buscar('plaga maceta')] == [trasplante['id']]
+        assert [c['id'] for c in cuidado_manager.buscar('plaga', planta_id=1)] == [plaga['id']]
+        # Comillas u operadores sueltos no rompen la consulta
+        assert cuidado_manager.buscar('"(') == []
+
+        resultados = cuidado_manager.buscar('plaga')
+        assert [r['relevancia'] for r in resultados] == sorted(r['relevancia'] for r in resultados)
+
+    def test_indice_sincronizado_con_bajas(self, cuidado_manager):
+        """Test: Los triggers quitan del índice los cuidados eliminados"""
+        cuidado = cuidado_manager.registrar_cuidado_general(5, "Trasplante")
+        cuidado_manager.delete(cuidado['id'])
+        assert cuidado_manager.buscar('trasplante') == []
+
+    def test_indice_de_base_existente(self, tmp_path):
+        """Test: La migración indexa los cuidados que ya existían"""
+        db_path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute(MIGRATIONS[0][1][0])
+        conn.execute("INSERT INTO cuidados (planta_id, tipo, notas, fecha) "
+                     "VALUES (3, 'riego', 'hojas con plaga', '2024-01-01T00:00:00')")
+        conn.commit()
+        conn.close()
+
+        assert len(CuidadoManager(db_path=db_path).buscar('plaga')) == 1
+
+class TestGroupCommit:
+    """Pruebas para la cola de escritura con commit agrupado"""
+
+    @pytest.fixture
+    def manager_agrupado(self, tmp_path):
+        manager = CuidadoManager(db_path=str(tmp_path / 'grupo.db'), group_commit=True)
+        manager._writer.max_delay = 0.05
+        yield manager
+        manager.close()
+
+    def test_inserciones_concurrentes_agrupadas(self, manager_agrupado):
+        """Test: Varios hilos insertan y cada uno recibe su propia fila"""
+        resultados = []
+        lock = threading.Lock()
+
+        def registrar(i):
+            cuidado = manager_agrupado.registrar_riego(planta_id=i, cantidad_ml=100 + i)
+            with lock:
+                resultados.append((i, cuidado))
+
+        hilos = [threading.Thread(target=registrar, args=(i,)) for i in range(1, 21)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        assert len(resultados) == 20
+        for i, cuidado in resultados:
+            assert cuidado['planta_id'] == i
+            assert cuidado['cantidad_ml'] == 100 + i
+        assert len({c['id'] for _, c in resultados}) == 20
+
+        stats = manager_agrupado.write_queue_stats()
+        assert stats['committed'] == 20
+        assert stats['batches'] < 20
+        assert stats['queue_depth'] == 0
+
+    def test_error_no_afecta_al_resto_del_lote(self, manager_agrupado):
+        """Test: Un INSERT inválido falla solo para su llamador"""
+        writer = manager_agrupado._writer
+        malo = writer.submit('INSERT INTO cuidados (planta_id, tipo, fecha) VALUES (?, NULL, ?)',
+                             (1, 'x'))
+        bueno = manager_agrupado.registrar_riego(planta_id=2, cantidad_ml=50)
+
+        with pytest.raises(sqlite3.IntegrityError):
+            malo.result(timeout=5)
+        assert bueno['planta_id'] == 2
+        assert manager_agrupado.write_queue_stats()['failed'] == 1
+
+class TestPlantasClient:
+    """Pruebas para la validación de planta_id contra plantas-service"""
+
+    def test_cache_y_keep_alive(self, plantas_stub):
+        """Test: Consulta en lote, cachea positivos/negativos y reutiliza la conexión"""
+        assert plantas_stub.existen([1, 2, 9]) == {1: True, 2: True, 9: False}
+        assert plantas_stub.existe(9) is False
+        assert plantas_stub.existe(3) is True
+
+        assert plantas_stub.consultas == [[1, 2, 9], [3]]
+        stats = plantas_stub.stats()
+        assert stats['requests'] == 2
+        assert stats['connections_created'] == 1
+
+    def test_ids_fuera_de_rango(self, plantas_stub):
+        """Test: Un id que no cabe en 64 bits es inexistente sin consultar a plantas-service"""
+        assert plantas_stub.existen([2 ** 70, 0, 1]) == {2 ** 70: False, 0: False, 1: True}
+        assert plantas_stub.consultas == [[1]]
+
+    def test_servicio_no_disponible(self):
+        """Test: Un plantas-service caído produce PlantasServiceError"""
+        client = PlantasClient('http://127.0.0.1:9', timeout=0.5)
+        with pytest.raises(PlantasServiceError):
+            client.existe(1)
+
+    def test_registro_con_planta_inexistente(self, client, plantas_stub, monkeypatch):
+        """Test: Los endpoints rechazan planta_id desconocidos"""
+        monkeypatch.setitem(app.extensions, 'plantas_client', plantas_stub)
+
+        response = client.post('/api/cuidados/riego', json={'planta_id': 77, 'cantidad_ml': 100})
+        assert response.status_code == 400
+        assert 'no encontrada' in response.get_json()['message']
+
+        response = client.post('/api/cuidados/riego', json={'planta_id': 2, 'cantidad_ml': 100})
+        assert response.status_code == 201
+
+        response = client.post('/api/cuidados/batch', json={'cuidados': [
+            {'tipo': 'riego', 'planta_id': 1, 'cantidad_ml': 10},
+            {'tipo': 'riego', 'planta_id': 88, 'cantidad_ml': 10},
+        ]})
+        data = response.get_json()
+        assert data['created'] == 1
+        assert data['results'][1]['success'] is False
+
+    def test_validacion_estricta(self, client, monkeypatch):
+        """Test: En modo estricto un plantas-service caído devuelve 503"""
+        monkeypatch.setitem(app.extensions, 'plantas_client',
+                            PlantasClient('http://127.0.0.1:9', timeout=0.5))
+        response = client.post('/api/cuidados/riego', json={'planta_id': 1, 'cantidad_ml': 100})
+        assert response.status_code == 201
+
+        monkeypatch.setattr(cuidados_app, 'VALIDACION_ESTRICTA', True)
+        response = client.post('/api/cuidados/riego', json={'planta_id': 1, 'cantidad_ml': 100})
+        assert response.status_code == 503
+
+class TestRiegoScheduler:
+    """Pruebas para el planificador de riegos pendientes"""
+
+    def test_pendientes_ordenados(self):
+        """Test: Devuelve solo las plantas vencidas, de la más atrasada a la más reciente"""
+        scheduler = RiegoScheduler()
+        scheduler.set_planta(1, 7, 'A', '2025-01-01T00:00:00', '2025-03-01T00:00:00')
+        scheduler.set_planta(2, 2, 'B', '2025-01-01T00:00:00', '2025-03-05T00:00:00')
+        scheduler.set_planta(3, 30, 'C', '2025-01-01T00:00:00', '2025-03-01T00:00:00')
+        scheduler.set_planta(4, 5, 'D', '2025-02-20T00:00:00')
+
+        pendientes = scheduler.pendientes(datetime(2025, 3, 10))
+        assert [p['planta_id'] for p in pendientes] == [4, 2, 1]
+        assert pendientes[2]['proximo_riego'] == '2025-03-08T00:00:00'
+        assert pendientes[2]['dias_atraso'] == 2
+
+        scheduler.registrar_riego(1, '2025-03-09T00:00:00')
+        scheduler.registrar_riego(4, '2025-03-09T12:00:00')
+        assert [p['planta_id'] for p in scheduler.pendientes(datetime(2025, 3, 10))] == [2]
+        assert [p['planta_id'] for p in scheduler.pendientes(datetime(2025, 3, 10), limit=0)] == []
+
+    def test_muchas_actualizaciones_compactan_el_heap(self):
+        """Test: Las entradas obsoletas no crecen sin límite"""
+        scheduler = RiegoScheduler()
+        scheduler.set_planta(1, 1, 'A', None, '2025-01-01T00:00:00')
+        for dia in range(2, 29):
+            scheduler.registrar_riego(1, f'2025-01-{dia:02d}T00:00:00')
+        for i in range(200):
+            scheduler.registrar_riego(1, f'2025-02-01T00:{i // 60:02d}:{i % 60:02d}')
+        assert len(scheduler._heap) <= 2 * len(scheduler) + 64
+        assert scheduler.pendientes(datetime(2025, 2, 2, 1))[0]['planta_id'] == 1
+
+    def test_sync_con_plantas_service(self, plantas_stub, cuidado_manager):
+        """Test: Se alimenta de plantas-service (con ETag) y del resumen de cuidados"""
+        cuidado_manager.registrar_riego(1, 100)
+        sync = SchedulerSync(RiegoScheduler(), plantas_stub, cuidado_manager, refresh=0)
+        sync.sync()
+        sync.sync()
+        assert plantas_stub.listados == [None, '"v1"']
+
+        pendientes = sync.scheduler.pendientes(datetime.now())
+        # La planta 1 se acaba de regar; 2 y 3 nunca se regaron
+        assert [p['planta_id'] for p in pendientes] == [2, 3]
+
+    def test_endpoint_pendientes(self, client, plantas_stub, monkeypatch):
+        """Test: GET /api/riego/pendientes"""
+        scheduler = RiegoScheduler()
+        monkeypatch.setitem(app.extensions, 'plantas_client', plantas_stub)
+        monkeypatch.setitem(app.extensions, 'riego_scheduler', scheduler)
+        monkeypatch.setitem(app.extensions, 'scheduler_sync', SchedulerSync(
+            scheduler, plantas_stub, app.extensions['cuidado_manager'], refresh=0))
+
+        client.post('/api/cuidados/riego', json={'planta_id': 3, 'cantidad_ml': 100})
+        response = client.get('/api/riego/pendientes?before=2100-01-01T00:00:00')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert {p['planta_id'] for p in data} == {1, 2, 3}
+        proximos = [p['proximo_riego'] for p in data]
+        assert proximos == sorted(proximos)
+
+        response = client.get('/api/riego/pendientes')
+        ids = [p['planta_id'] for p in response.get_json()['data']]
+        assert 3 not in ids
+
+        assert client.get('/api/riego/pendientes?before=ayer').status_code == 400
+
+    def test_endpoint_sin_plantas_service(self, client):
+        """Test: Sin PLANTAS_SERVICE_URL el endpoint no está disponible"""
+        assert client.get('/api/riego/pendientes').status_code == 503
+
+class TestMigraciones:
+    """Pruebas para las migraciones de esquema"""
+
+    def test_esquema_en_ultima_version(self, cuidado_manager):
+        """Test: Una base nueva queda en la última versión con sus índices"""
+        with cuidado_manager._get_conn() as conn:
+            assert schema_version(conn) == MIGRATIONS[-1][0]
+            indices = {r['name'] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'cuidados'")}
+        assert 'idx_cuidados_planta_id' in indices
+        assert 'idx_cuidados_planta_tipo_fecha' in indices
+
+    def test_migra_base_existente(self, tmp_path):
+        """Test: Una base creada antes de las migraciones se actualiza sin perder datos"""
+        db_path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute(MIGRATIONS[0][1][0])
+        conn.execute("INSERT INTO cuidados (planta_id, tipo, cantidad_ml, fecha) "
+                     "VALUES (3, 'riego', 250, '2024-01-01T00:00:00')")
+        conn.commit()
+        conn.close()
+
+        manager = CuidadoManager(db_path=db_path)
+        assert len(manager.get_by_planta(3)) == 1
+        with manager._get_conn() as conn:
+            assert schema_version(conn) == MIGRATIONS[-1][0]
+            plan = ' '.join(r['detail'] for r in conn.execute(
+                'EXPLAIN QUERY PLAN SELECT * FROM cuidados WHERE planta_id = ? AND id > ? ORDER BY id',
+                (3, 0)))
+        assert 'idx_cuidados_planta_id' in plan
+
+class TestBenchmarks:
+    """Pruebas para la suite de microbenchmarks"""
+
+    def test_ejecutar_suite(self, tmp_path, capsys):
+        """Test: La suite de cuidados siembra, mide cada operación y guarda la línea base"""
+        baseline = str(tmp_path / 'baseline.json')
+        assert bench_cuidados.main('bench', 'cuidados', bench_cuidados.sembrar, bench_cuidados.abrir,
+                                   bench_cuidados.crear_benchmarks,
+                                   ['--sizes', '400', '--ops', '20', '--baseline', baseline,
+                                    '--save-baseline']) == 0
+        with open(baseline, encoding='utf-8') as f:
+            resultados = json.load(f)['results']['400']
+        assert set(resultados) >= {'get_all_page', 'get_by_planta', 'registrar_riego', 'buscar'}
+        assert 'registrar_lote_50' in capsys.readouterr().out
+
+class TestSiembra:
+    """Pruebas para la siembra masiva de datos sintéticos"""
+
+    def test_sembrar_cuidados(self, tmp_path):
+        """Test: La siembra inserta el total pedido en orden cronológico y deja los derivados al día"""
+        ruta = str(tmp_path / 'siembra.db')
+        reporte = seed.sembrar_cuidados(ruta, 3000, 100, random.Random(1),
+                                        tipos='riego:1,general:1', historial='1:1,50:1')
+        assert reporte['cuidados'] == 3000 and reporte['primer_id'] == 1
+
+        conn = sqlite3.connect(ruta)
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('SELECT COUNT(*) FROM cuidados').fetchone()[0] == 3000
+        assert conn.execute("SELECT COUNT(*) FROM cuidados WHERE tipo = 'fertilizacion'").fetchone()[0] == 0
+        # Ids crecientes con la fecha
+        fechas = [r[0] for r in conn.execute('SELECT fecha_epoch FROM cuidados ORDER BY id')]
+        assert fechas == sorted(fechas)
+        # Índices y triggers restaurados; resumen, FTS y versiones reconstruidos
+        nombres = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'cuidados'")}
+        assert {'idx_cuidados_planta_fecha_epoch', 'cuidados_fts_insert', 'cuidados_resumen_insert'} <= nombres
+        assert conn.execute('SELECT SUM(total_cuidados) FROM resumen_cuidados').fetchone()[0] == 3000
+        con_poda = conn.execute("SELECT COUNT(*) FROM cuidados WHERE notas LIKE '%poda%' "
+                                "OR descripcion LIKE '%poda%'").fetchone()[0]
+        assert conn.execute("SELECT COUNT(*) FROM cuidados_fts WHERE cuidados_fts MATCH 'poda'").fetchone()[0] == con_poda
+        planta_id = conn.execute('SELECT planta_id FROM cuidados LIMIT 1').fetchone()[0]
+        conn.close()
+
+        manager = CuidadoManager(db_path=ruta)
+        assert manager.get_version('cuidados')[0] == 1
+        assert manager.get_version(f'planta:{planta_id}')[0] == 1
+        # Los triggers vuelven a mantener el resumen después de la siembra
+        antes = manager.get_resumen(planta_id)['total_cuidados']
+        manager.registrar_riego(planta_id, 100)
+        assert manager.get_resumen(planta_id)['total_cuidados'] == antes + 1
+        manager._pool.close()
+
+    def test_distribucion_invalida(self, tmp_path):
+        """Test: Una distribución mal escrita o un tipo desconocido se rechazan sin dejar filas"""
+        ruta = str(tmp_path / 'siembra.db')
+        assert seed.distribucion('riego:3,general') == (['riego', 'general'], [3.0, 1.0])
+        with pytest.raises(ValueError):
+            seed.distribucion('riego:x')
+        with pytest.raises(ValueError):
+            seed.sembrar_cuidados(ruta, 100, 10, random.Random(1), tipos='poda:1')
+        conn = sqlite3.connect(ruta)
+        assert conn.execute('SELECT COUNT(*) FROM cuidados').fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE tbl_name = 'cuidados' "
+                            "AND type = 'trigger'").fetchone()[0] == 9
+        conn.close()
+
 class TestCuidadosAPI:
     """Pruebas para los endpoints de la API"""
 
@@ -262,6 +833,277 @@ class TestCuidadosAPI:
         data = response.get_json()
         assert data['success'] is False
 
+    def test_paginacion_cuidados_por_planta(self, client):
+        """Test: next_cursor permite recorrer los cuidados de una planta"""
+        for ml in (100, 200, 300):
+            client.post('/api/cuidados/riego', json={'planta_id': 42, 'cantidad_ml': ml})
+
+        primera = client.get('/api/cuidados/planta/42?limit=2').get_json()
+        assert primera['count'] == 2
+        assert primera['next_cursor'] == primera['data'][-1]['id']
+
+        segunda = client.get(
+            f"/api/cuidados/planta/42?limit=2&after_id={primera['next_cursor']}").get_json()
+        assert segunda['count'] == 1
+        assert segunda['next_cursor'] is None
+        assert segunda['data'][0]['cantidad_ml'] == 300
+
+    def test_paginacion_limit_invalido(self, client):
+        """Test: limit fuera de rango"""
+        response = client.get('/api/cuidados?limit=100000')
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+
+    def test_enteros_fuera_de_rango(self, client):
+        """Test: after_id y limit que no caben en 64 bits responden 400, también en streaming"""
+        enorme = 2 ** 70
+        for url in (f'/api/cuidados?after_id={enorme}', f'/api/cuidados/resumen?after_id={enorme}',
+                    f'/api/cuidados/planta/1?after_id={enorme}', f'/api/cuidados?stream=1&limit={enorme}',
+                    f'/api/cuidados/plantas?ids=1&limit_per_planta={enorme}', '/api/cuidados?after_id=-1'):
+            response = client.get(url)
+            assert response.status_code == 400, url
+            assert response.get_json()['success'] is False
+        assert client.get(f'/api/cuidados?stream=1&limit={2 ** 63 - 1}').status_code == 200
+
+    def test_registrar_lote_con_errores(self, client):
+        """Test: El lote inserta los válidos y reporta los inválidos por elemento"""
+        response = client.post('/api/cuidados/batch', json={'cuidados': [
+            {'tipo': 'riego', 'planta_id': 7, 'cantidad_ml': 250},
+            {'tipo': 'riego', 'planta_id': 7, 'cantidad_ml': -1},
+            {'tipo': 'poda', 'planta_id': 7},
+            {'tipo': 'general', 'planta_id': 7, 'descripcion': 'Trasplante'},
+        ]})
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['created'] == 2
+        assert data['failed'] == 2
+        resultados = data['results']
+        assert [r['success'] for r in resultados] == [True, False, False, True]
+        assert resultados[0]['data']['cantidad_ml'] == 250
+        assert resultados[3]['data']['descripcion'] == 'Trasplante'
+        assert 'cantidad_ml' in resultados[1]['message']
+
+    def test_registrar_lote_tipos_invalidos(self, client):
+        """Test: Los elementos con tipos inválidos se rechazan uno a uno y el resto se inserta"""
+        response = client.post('/api/cuidados/batch', json={'cuidados': [
+            {'tipo': 'general', 'planta_id': 7, 'descripcion': {'a': 1}},
+            {'tipo': 'riego', 'planta_id': 7, 'cantidad_ml': 100, 'notas': ['x']},
+            {'tipo': 'riego', 'planta_id': 2 ** 70, 'cantidad_ml': 100},
+            {'tipo': 'riego', 'planta_id': True, 'cantidad_ml': 100},
+            {'tipo': 'riego', 'planta_id': 7, 'cantidad_ml': True},
+            {'tipo': 'fertilizacion', 'planta_id': 7, 'tipo_fertilizante': 'Orgánico', 'cantidad': 10},
+            {'tipo': 'riego', 'planta_id': 7, 'cantidad_ml': 100, 'notas': None},
+        ]})
+        assert response.status_code == 201
+        data = response.get_json()
+        assert [r['success'] for r in data['results']] == [False] * 6 + [True]
+        mensajes = [r.get('message') for r in data['results']]
+        assert 'descripcion' in mensajes[0] and 'notas' in mensajes[1]
+        assert 'planta_id' in mensajes[2] and 'planta_id' in mensajes[3]
+        assert 'cantidad_ml' in mensajes[4] and 'cantidad' in mensajes[5]
+
+        response = client.post('/api/cuidados/riego', json={'planta_id': True, 'cantidad_ml': 100})
+        assert response.status_code == 400
+        response = client.post('/api/cuidados/general', json={'planta_id': 7, 'descripcion': ['Poda']})
+        assert response.status_code == 400
+
+    def test_registrar_lote_vacio(self, client):
+        """Test: Un lote vacío es rechazado"""
+        response = client.post('/api/cuidados/batch', json={'cuidados': []})
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+
+    def test_get_condicional_por_planta(self, client):
+        """Test: La versión por planta solo cambia con cuidados de esa planta"""
+        client.post('/api/cuidados/riego', json={'planta_id': 31, 'cantidad_ml': 100})
+        etag = client.get('/api/cuidados/planta/31').headers['ETag']
+
+        # Un cuidado de otra planta no invalida el ETag de la planta 31
+        client.post('/api/cuidados/riego', json={'planta_id': 32, 'cantidad_ml': 100})
+        response = client.get('/api/cuidados/planta/31', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+        client.post('/api/cuidados/riego', json={'planta_id': 31, 'cantidad_ml': 200})
+        response = client.get('/api/cuidados/planta/31', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.get_json()['count'] == 2
+
+    def test_resumen_endpoint(self, client):
+        """Test: GET /api/cuidados/resumen/{planta_id}"""
+        client.post('/api/cuidados/riego', json={'planta_id': 51, 'cantidad_ml': 120})
+        client.post('/api/cuidados/riego', json={'planta_id': 51, 'cantidad_ml': 80})
+
+        response = client.get('/api/cuidados/resumen/51')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['total_riegos'] == 2
+        assert data['total_agua_ml'] == 200
+
+        response = client.get('/api/cuidados/resumen?limit=1000')
+        assert response.status_code == 200
+        assert 51 in [r['planta_id'] for r in response.get_json()['data']]
+
+    def test_cuidados_de_varias_plantas_endpoint(self, client):
+        """Test: GET /api/cuidados/plantas?ids=...&limit_per_planta=N"""
+        for ml in (10, 20, 30):
+            client.post('/api/cuidados/riego', json={'planta_id': 61, 'cantidad_ml': ml})
+        client.post('/api/cuidados/riego', json={'planta_id': 62, 'cantidad_ml': 5})
+
+        response = client.get('/api/cuidados/plantas?ids=61,62,63&limit_per_planta=2')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert [d['planta_id'] for d in data] == [61, 62, 63]
+        assert [c['cantidad_ml'] for c in data[0]['cuidados']] == [30, 20]
+        assert data[2]['count'] == 0
+
+        assert client.get('/api/cuidados/plantas?ids=61&limit_per_planta=0').status_code == 400
+        assert client.get('/api/cuidados/plantas').status_code == 400
+        assert client.get(f'/api/cuidados/plantas?ids=61,{2 ** 70}').status_code == 400
+
+    def test_exportar_cuidados_en_streaming(self, client):
+        """Test: ?stream=1 en los listados de cuidados"""
+        for ml in (10, 20, 30):
+            client.post('/api/cuidados/riego', json={'planta_id': 71, 'cantidad_ml': ml})
+
+        response = client.get('/api/cuidados/planta/71?stream=1')
+        assert response.status_code == 200
+        assert response.is_streamed
+        data = response.get_json()
+        assert [c['cantidad_ml'] for c in data['data']] == [10, 20, 30]
+        assert data['count'] == 3
+        assert data['planta_id'] == 71
+
+        todos = client.get('/api/cuidados?stream=1').get_json()
+        assert todos['count'] == len(todos['data']) >= 3
+        assert client.get('/api/cuidados?stream=1&limit=1').get_json()['count'] == 1
+        assert client.get('/api/cuidados?stream=1&limit=0').status_code == 400
+
+    def test_parametro_fields(self, client):
+        """Test: ?fields= en los listados y el detalle de cuidados"""
+        cuidado = client.post('/api/cuidados/riego', json={
+            'planta_id': 81, 'cantidad_ml': 150, 'notas': 'Con agua de lluvia'
+        }).get_json()['data']
+
+        data = client.get(f"/api/cuidados/{cuidado['id']}?fields=cantidad_ml").get_json()['data']
+        assert data == {'id': cuidado['id'], 'cantidad_ml': 150}
+
+        data = client.get('/api/cuidados/planta/81?fields=tipo,fecha').get_json()['data']
+        assert data == [{'id': cuidado['id'], 'tipo': 'riego', 'fecha': cuidado['fecha']}]
+
+        data = client.get('/api/cuidados/planta/81?stream=1&fields=tipo').get_json()['data']
+        assert data == [{'id': cuidado['id'], 'tipo': 'riego'}]
+
+        response = client.get('/api/cuidados?fields=planta_id')
+        assert response.status_code == 200
+        assert all(set(c) == {'id', 'planta_id'} for c in response.get_json()['data'])
+
+        assert client.get('/api/cuidados?fields=nombre').status_code == 400
+        assert client.get(f"/api/cuidados/{cuidado['id']}?fields=,").status_code == 400
+
+    def test_buscar_endpoint(self, client):
+        """Test: GET /api/cuidados/buscar con paginación por posición"""
+        for i in range(3):
+            client.post('/api/cuidados/general', json={
+                'planta_id': 91, 'descripcion': f'Fumigación contra pulgón {i}'
+            })
+
+        primera = client.get('/api/cuidados/buscar?q=pulgon&limit=2').get_json()
+        assert primera['count'] == 2
+        assert primera['next_offset'] == 2
+        segunda = client.get('/api/cuidados/buscar?q=pulgon&limit=2&offset=2').get_json()
+        assert segunda['count'] == 1
+        assert segunda['next_offset'] is None
+        ids = [c['id'] for c in primera['data'] + segunda['data']]
+        assert len(set(ids)) == 3
+
+        assert client.get('/api/cuidados/buscar').status_code == 400
+        assert client.get('/api/cuidados/buscar?q=x&limit=0').status_code == 400
+
+    def test_buscar_parametros_fuera_de_rango(self, client, monkeypatch):
+        """Test: planta_id y offset fuera de rango responden 400; el offset tiene un máximo"""
+        for i in range(3):
+            client.post('/api/cuidados/general', json={'planta_id': 92, 'descripcion': f'Injerto {i}'})
+        assert client.get(f'/api/cuidados/buscar?q=injerto&planta_id={2 ** 70}').status_code == 400
+        assert client.get(f'/api/cuidados/buscar?q=injerto&offset={2 ** 70}').status_code == 400
+
+        monkeypatch.setattr(cuidados_app, 'BUSQUEDA_MAX_OFFSET', 1)
+        assert client.get('/api/cuidados/buscar?q=injerto&offset=2').status_code == 400
+        primera = client.get('/api/cuidados/buscar?q=injerto&limit=1').get_json()
+        assert primera['next_offset'] == 1
+        segunda = client.get('/api/cuidados/buscar?q=injerto&limit=1&offset=1').get_json()
+        assert segunda['count'] == 1 and segunda['next_offset'] is None
+
+    def test_rango_de_fechas_endpoint(self, client):
+        """Test: ?from=&to= en los listados de cuidados"""
+        cuidado = client.post('/api/cuidados/riego', json={'planta_id': 95, 'cantidad_ml': 90}).get_json()['data']
+        epoch = cuidado['fecha_epoch']
+
+        data = client.get(f'/api/cuidados/planta/95?from={epoch}&to={epoch + 1}').get_json()['data']
+        assert [c['id'] for c in data] == [cuidado['id']]
+        manana = datetime.fromtimestamp(epoch + 86400).isoformat()
+        assert client.get(f'/api/cuidados/planta/95?from={manana}').get_json()['count'] == 0
+        data = client.get(f'/api/cuidados?from={epoch}&stream=1').get_json()['data']
+        assert cuidado['id'] in [c['id'] for c in data]
+
+        assert client.get('/api/cuidados?from=ayer').status_code == 400
+
+    def test_rango_de_fechas_fuera_de_rango(self, client):
+        """Test: from/to fuera del rango de un entero de SQLite responden 400, también en streaming"""
+        enorme = 10 ** 30
+        for url in (f'/api/cuidados?from={enorme}', f'/api/cuidados?to=-{enorme}',
+                    f'/api/cuidados?from={enorme}&stream=1', f'/api/cuidados/planta/95?to={enorme}',
+                    f'/api/cuidados/planta/95?from={enorme}&stream=1'):
+            response = client.get(url)
+            assert response.status_code == 400, url
+            assert response.get_json() == {
+                'success': False, 'message': 'from y to deben ser fechas ISO 8601 o epoch en segundos'}
+        assert client.get(f'/api/cuidados?from={2 ** 63 - 1}').status_code == 200
+
+    def test_compresion_gzip(self, client):
+        """Test: Listados comprimidos con gzip cuando el cliente lo acepta"""
+        client.post('/api/cuidados/batch', json={'cuidados': [
+            {'tipo': 'riego', 'planta_id': 97, 'cantidad_ml': 100, 'notas': 'Riego de rutina'}
+        ] * 30})
+        for url in ('/api/cuidados/planta/97', '/api/cuidados/planta/97?stream=1'):
+            response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert json.loads(gzip.decompress(response.data))['count'] == 30
+
+    def test_endpoint_metrics(self, client):
+        """Test: GET /metrics incluye peticiones y llamadas al gestor de cuidados"""
+        client.post('/api/cuidados/riego', json={'planta_id': 98, 'cantidad_ml': 100})
+        texto = client.get('/metrics').get_data(as_text=True)
+        assert 'http_requests_total{method="POST",route="/api/cuidados/riego",status="201"}' in texto
+        assert 'sqlite_queries_total{manager="CuidadoManager",method="registrar_riego"}' in texto
+        assert 'sqlite_pool_connections{state="idle"}' in texto
+
+    def test_endpoint_admin_queries(self, client, monkeypatch):
+        """Test: /admin/queries muestra las consultas lentas con su plan y exige ADMIN_TOKEN"""
+        monkeypatch.setattr(admin, 'ADMIN_TOKEN', 'secreto')
+        monkeypatch.setattr(query_stats, 'slow_ms', 0)
+        headers = {'X-Admin-Token': 'secreto'}
+        assert client.get('/admin/queries').status_code == 401
+        client.delete('/admin/queries', headers=headers)
+
+        client.get('/api/cuidados/planta/98?from=2024-01-01')
+        data = client.get('/admin/queries', headers=headers).get_json()['data']
+        lenta = [q for q in data['slow_queries'] if 'fecha_epoch >= ?' in q['sql']][0]
+        assert lenta['params'] == '(int, int, int, int)'
+        assert any('idx_cuidados_planta_fecha_epoch' in paso for paso in lenta['plan'])
+
+    def test_endpoint_profile_cpu(self, client, monkeypatch):
+        """Test: Una sesión de cProfile de una petición se descarga como informe de texto"""
+        monkeypatch.setattr(admin, 'ADMIN_TOKEN', 'secreto')
+        headers = {'X-Admin-Token': 'secreto'}
+        response = client.post('/admin/profile/cpu?requests=1', headers=headers)
+        assert response.status_code == 202
+        assert client.get('/admin/profile/cpu/download', headers=headers).status_code == 409
+
+        client.post('/api/cuidados/riego', json={'planta_id': 96, 'cantidad_ml': 100})
+        response = client.get('/admin/profile/cpu/download?format=text', headers=headers)
+        assert response.status_code == 200
+        assert 'cuidados-service-cpu.txt' in response.headers['Content-Disposition']
+        assert 'registrar_riego' in response.get_data(as_text=True)
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
-
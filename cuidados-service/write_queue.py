@@ -0,0 +1,145 @@
+"""
+Cola de escritura con commit agrupado (group commit) para SQLite
+Un único hilo escritor vacía la cola e inserta en lotes acotados por
+tamaño y por tiempo máximo de espera; cada llamador recibe su fila
+cuando el lote se confirma.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from db import ConnectionPool
+
+DEFAULT_MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 64))
+DEFAULT_MAX_DELAY_MS = float(os.environ.get('GROUP_COMMIT_MAX_DELAY_MS', 5))
+DEFAULT_RESULT_TIMEOUT = float(os.environ.get('GROUP_COMMIT_TIMEOUT', 30))
+
+_Pendiente = Tuple[str, tuple, Future]
+
+
+class GroupCommitWriter:
+    """Escritor en segundo plano que confirma inserciones en grupo"""
+
+    def __init__(self, pool: ConnectionPool, select_sql: str,
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 max_delay_ms: float = DEFAULT_MAX_DELAY_MS,
+                 result_timeout: float = DEFAULT_RESULT_TIMEOUT):
+        """
+        select_sql: consulta con un marcador `{}` para la lista de ids,
+        usada para devolver las filas insertadas de cada lote.
+        """
+        self._pool = pool
+        self._select_sql = select_sql
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.result_timeout = result_timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            'submitted': 0,
+            'committed': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_batch_size': 0,
+            'last_batch_size': 0,
+            'last_commit_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, sql: str, params: tuple) -> Future:
+        """Encola un INSERT; el Future se resuelve con la fila insertada"""
+        if self._closed:
+            raise RuntimeError('La cola de escritura está cerrada')
+        future = Future()
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._queue.put((sql, params, future))
+        return future
+
+    def execute(self, sql: str, params: tuple) -> sqlite3.Row:
+        """Encola un INSERT y espera a que su lote se confirme"""
+        return self.submit(sql, params).result(timeout=self.result_timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Procesa lo pendiente y detiene el hilo escritor"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+        data['queue_depth'] = self._queue.qsize()
+        data['avg_batch_size'] = round(data['committed'] / data['batches'], 2) if data['batches'] else 0
+        data['max_batch'] = self.max_batch
+        data['max_delay_ms'] = self.max_delay * 1000
+        return data
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[_Pendiente]):
+        inicio = time.perf_counter()
+        insertados = []
+        try:
+            with self._pool.connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for sql, params, future in batch:
+                    # Un SAVEPOINT por elemento: un error no descarta el resto del lote
+                    conn.execute('SAVEPOINT elemento')
+                    try:
+                        cur = conn.execute(sql, params)
+                        conn.execute('RELEASE elemento')
+                        insertados.append((future, cur.lastrowid))
+                    except sqlite3.Error as e:
+                        conn.execute('ROLLBACK TO elemento')
+                        conn.execute('RELEASE elemento')
+                        future.set_exception(e)
+                conn.commit()
+                rows = {}
+                if insertados:
+                    ids = [rowid for _, rowid in insertados]
+                    sql = self._select_sql.format(', '.join('?' * len(ids)))
+                    rows = {row['id']: row for row in conn.execute(sql, ids)}
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            with self._lock:
+                self._stats['failed'] += len(batch)
+            return
+
+        for future, rowid in insertados:
+            future.set_result(rows.get(rowid))
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['committed'] += len(insertados)
+            self._stats['failed'] += len(batch) - len(insertados)
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+            self._stats['last_commit_ms'] = round((time.perf_counter() - inicio) * 1000, 3)
@@ -0,0 +1,418 @@
+"""
+Prueba de carga HTTP de plantas-service y cuidados-service juntos
+
+Arranca ambos servicios (gunicorn, o `python app.py` con --server flask) sobre
+bases temporales, los siembra y ejecuta una carga mixta de lecturas y
+escrituras por etapas de concurrencia creciente. Por cada etapa reporta
+req/s, p50/p95/p99 por endpoint y errores (HTTP, SQLite bloqueada, timeouts).
+
+Uso (desde la raíz del repositorio; solo usa la biblioteca estándar):
+    python loadtest/loadtest.py                                   # concurrencia 1,4,16,32; 10 s por etapa
+    python loadtest/loadtest.py --concurrency 8,32,64 --duration 20 --write-ratio 0.3
+    python loadtest/loadtest.py --workers 4 --threads 8 --json resultados.json
+    python loadtest/loadtest.py --plantas-url http://localhost:5001 --cuidados-url http://localhost:5002
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIPOS = ('Interior', 'Exterior', 'Suculenta', 'Aromática', 'Huerta')
+UBICACIONES = ('Sala', 'Cocina', 'Balcón', 'Jardín', 'Ventana', 'Terraza')
+
+
+class Operacion(NamedTuple):
+    nombre: str
+    servicio: str  # 'plantas' o 'cuidados'
+    escritura: bool
+    peso: int
+    # (rng, cantidad de plantas) -> (método, ruta, cuerpo JSON o None)
+    peticion: Callable[[random.Random, int], Tuple[str, str, Optional[dict]]]
+
+
+OPERACIONES = [
+    Operacion('GET /api/plantas', 'plantas', False, 3,
+              lambda r, n: ('GET', f'/api/plantas?limit=50&after_id={r.randint(0, n)}', None)),
+    Operacion('GET /api/plantas/<id>', 'plantas', False, 3,
+              lambda r, n: ('GET', f'/api/plantas/{r.randint(1, n)}', None)),
+    Operacion('GET /api/cuidados/planta/<id>', 'cuidados', False, 3,
+              lambda r, n: ('GET', f'/api/cuidados/planta/{r.randint(1, n)}?limit=50', None)),
+    Operacion('GET /api/cuidados/resumen/<id>', 'cuidados', False, 2,
+              lambda r, n: ('GET', f'/api/cuidados/resumen/{r.randint(1, n)}', None)),
+    Operacion('GET /api/riego/pendientes', 'cuidados', False, 1,
+              lambda r, n: ('GET', '/api/riego/pendientes?limit=20', None)),
+    Operacion('POST /api/cuidados/riego', 'cuidados', True, 6,
+              lambda r, n: ('POST', '/api/cuidados/riego', {
+                  'planta_id': r.randint(1, n), 'cantidad_ml': r.choice((100, 250, 500)),
+                  'notas': 'Riego de prueba de carga'})),
+    Operacion('POST /api/cuidados/fertilizacion', 'cuidados', True, 2,
+              lambda r, n: ('POST', '/api/cuidados/fertilizacion', {
+                  'planta_id': r.randint(1, n), 'tipo_fertilizante': 'Orgánico', 'cantidad': '10ml'})),
+    Operacion('POST /api/cuidados/batch', 'cuidados', True, 1,
+              lambda r, n: ('POST', '/api/cuidados/batch', {'cuidados': [
+                  {'tipo': 'riego', 'planta_id': r.randint(1, n), 'cantidad_ml': 200}
+                  for _ in range(10)]})),
+    Operacion('PUT /api/plantas/<id>', 'plantas', True, 1,
+              lambda r, n: ('PUT', f'/api/plantas/{r.randint(1, n)}',
+                            {'frecuencia_riego_dias': r.randint(2, 21)})),
+]
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Cliente:
+    """Conexiones keep-alive por hilo y por servicio"""
+
+    def __init__(self, urls: Dict[str, str], timeout: float):
+        self.urls = {nombre: urlsplit(url) for nombre, url in urls.items()}
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conexion(self, servicio: str) -> http.client.HTTPConnection:
+        conexiones = self._local.__dict__.setdefault('conexiones', {})
+        conn = conexiones.get(servicio)
+        if conn is None:
+            url = self.urls[servicio]
+            cls = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+            conn = conexiones[servicio] = cls(url.hostname, url.port, timeout=self.timeout)
+        return conn
+
+    def _descartar(self, servicio: str):
+        conn = self._local.__dict__.get('conexiones', {}).pop(servicio, None)
+        if conn is not None:
+            conn.close()
+
+    def request(self, servicio: str, metodo: str, ruta: str, cuerpo=None,
+                headers: Optional[dict] = None, raw: Optional[bytes] = None) -> Tuple[int, bytes]:
+        headers = dict(headers or {})
+        if cuerpo is not None:
+            raw = json.dumps(cuerpo).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for intento in range(2):
+            reutilizada = servicio in self._local.__dict__.get('conexiones', {})
+            conn = self._conexion(servicio)
+            try:
+                conn.request(metodo, self.urls[servicio].path.rstrip('/') + ruta, body=raw, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Conexión keep-alive cerrada por el servidor (p. ej. worker reciclado): se reintenta una vez
+                self._descartar(servicio)
+                if reutilizada and intento == 0:
+                    continue
+                raise
+            except Exception:
+                self._descartar(servicio)
+                raise
+            if response.will_close:
+                self._descartar(servicio)
+            return response.status, data
+
+    def close(self):
+        for servicio in list(self._local.__dict__.get('conexiones', {})):
+            self._descartar(servicio)
+
+
+def clasificar(status: int, cuerpo: bytes) -> Optional[str]:
+    """Tipo de error de una respuesta (None si fue exitosa)"""
+    if status < 400 or status == 304:
+        return None
+    if status >= 500 and b'locked' in cuerpo:
+        return 'sqlite_locked'
+    return f'http_{status}'
+
+
+class Servicios:
+    """Arranca plantas-service y cuidados-service como subprocesos sobre bases temporales"""
+
+    def __init__(self, servidor: str, workers: int, threads: int, directorio: str, env_extra: dict):
+        self.servidor = servidor
+        self.workers = workers
+        self.threads = threads
+        self.directorio = directorio
+        self.env_extra = env_extra
+        self.procesos: List[Tuple[str, subprocess.Popen, str]] = []
+
+    def _arrancar(self, nombre: str, puerto: int, env: dict) -> str:
+        carpeta = os.path.join(RAIZ, f'{nombre}-service')
+        env = dict(os.environ, PORT=str(puerto), PYTHONUNBUFFERED='1', FLASK_ENV='production',
+                   WEB_CONCURRENCY=str(self.workers), GUNICORN_THREADS=str(self.threads),
+                   GUNICORN_ACCESS_LOG='0', **env, **self.env_extra)
+        if self.servidor == 'gunicorn':
+            comando = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:create_app()']
+        else:
+            comando = [sys.executable, 'app.py']
+        log = os.path.join(self.directorio, f'{nombre}.log')
+        with open(log, 'wb') as salida:
+            proceso = subprocess.Popen(comando, cwd=carpeta, env=env, stdout=salida,
+                                       stderr=subprocess.STDOUT)
+        self.procesos.append((nombre, proceso, log))
+        return f'http://127.0.0.1:{puerto}'
+
+    def arrancar(self) -> Dict[str, str]:
+        plantas = self._arrancar('plantas', _puerto_libre(), {
+            'PLANTAS_DB_PATH': os.path.join(self.directorio, 'plantas.db')})
+        cuidados = self._arrancar('cuidados', _puerto_libre(), {
+            'CUIDADOS_DB_PATH': os.path.join(self.directorio, 'cuidados.db'),
+            'PLANTAS_SERVICE_URL': plantas})
+        urls = {'plantas': plantas, 'cuidados': cuidados}
+        for nombre, url in urls.items():
+            self._esperar(nombre, url)
+        return urls
+
+    def _esperar(self, nombre: str, url: str, timeout: float = 30):
+        limite = time.monotonic() + timeout
+        destino = urlsplit(url)
+        while time.monotonic() < limite:
+            proceso = next(p for n, p, _ in self.procesos if n == nombre)
+            if proceso.poll() is not None:
+                break
+            try:
+                conn = http.client.HTTPConnection(destino.hostname, destino.port, timeout=1)
+                conn.request('GET', '/health')
+                if conn.getresponse().status == 200:
+                    conn.close()
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        log = next(l for n, _, l in self.procesos if n == nombre)
+        with open(log, encoding='utf-8', errors='replace') as f:
+            print(f.read()[-2000:], file=sys.stderr)
+        raise RuntimeError(f'{nombre}-service no respondió en {url}')
+
+    def detener(self):
+        for _, proceso, _ in self.procesos:
+            if proceso.poll() is None:
+                proceso.terminate()
+        for _, proceso, _ in self.procesos:
+            try:
+                proceso.wait(10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+
+def sembrar(cliente: Cliente, plantas: int, cuidados: int, rng: random.Random):
+    """Crea las plantas con una importación NDJSON y el historial inicial con lotes de cuidados"""
+    lineas = '\n'.join(json.dumps({
+        'nombre': f'Planta {i}', 'tipo': rng.choice(TIPOS), 'ubicacion': rng.choice(UBICACIONES),
+        'frecuencia_riego_dias': rng.choice((2, 3, 5, 7, 14))}) for i in range(plantas))
+    status, cuerpo = cliente.request('plantas', 'POST', '/api/plantas/import?format=ndjson',
+                                     raw=lineas.encode('utf-8'),
+                                     headers={'Content-Type': 'application/x-ndjson'})
+    if status != 200:
+        raise RuntimeError(f'No se pudieron importar las plantas: {status} {cuerpo[:200]!r}')
+    for inicio in range(0, cuidados, 500):
+        lote = [{'tipo': 'riego', 'planta_id': rng.randint(1, plantas), 'cantidad_ml': 250}
+                for _ in range(min(500, cuidados - inicio))]
+        status, cuerpo = cliente.request('cuidados', 'POST', '/api/cuidados/batch', {'cuidados': lote})
+        if status != 201:
+            raise RuntimeError(f'No se pudieron registrar los cuidados: {status} {cuerpo[:200]!r}')
+
+
+def _percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def etapa(cliente: Cliente, operaciones: List[Operacion], concurrencia: int, duracion: float,
+          write_ratio: float, plantas: int, semilla: int) -> dict:
+    """Carga de lazo cerrado: `concurrencia` hilos envían peticiones sin pausa durante `duracion` s"""
+    lecturas = [op for op in operaciones if not op.escritura]
+    escrituras = [op for op in operaciones if op.escritura]
+    latencias: Dict[str, List[float]] = defaultdict(list)
+    errores: Dict[str, Counter] = defaultdict(Counter)
+    lock = threading.Lock()
+    fin = time.monotonic() + duracion
+
+    def trabajador(i: int):
+        rng = random.Random(semilla * 1000 + i)
+        propias: Dict[str, List[float]] = defaultdict(list)
+        fallos: Dict[str, Counter] = defaultdict(Counter)
+        while time.monotonic() < fin:
+            grupo = escrituras if escrituras and (not lecturas or rng.random() < write_ratio) else lecturas
+            op = rng.choices(grupo, weights=[o.peso for o in grupo])[0]
+            metodo, ruta, cuerpo = op.peticion(rng, plantas)
+            inicio = time.perf_counter()
+            try:
+                status, data = cliente.request(op.servicio, metodo, ruta, cuerpo)
+                error = clasificar(status, data)
+            except socket.timeout:
+                error = 'timeout'
+            except (OSError, http.client.HTTPException) as e:
+                error = f'connection:{type(e).__name__}'
+            propias[op.nombre].append(time.perf_counter() - inicio)
+            if error:
+                fallos[op.nombre][error] += 1
+        cliente.close()
+        with lock:
+            for nombre, valores in propias.items():
+                latencias[nombre].extend(valores)
+            for nombre, contador in fallos.items():
+                errores[nombre].update(contador)
+
+    hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(concurrencia)]
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.monotonic() - inicio
+
+    endpoints = {}
+    for op in operaciones:
+        valores = sorted(v * 1000 for v in latencias.get(op.nombre, []))
+        if not valores:
+            continue
+        fallidas = sum(errores[op.nombre].values())
+        endpoints[op.nombre] = {
+            'requests': len(valores),
+            'rps': round(len(valores) / transcurrido, 1),
+            'p50_ms': round(_percentil(valores, 50), 2),
+            'p95_ms': round(_percentil(valores, 95), 2),
+            'p99_ms': round(_percentil(valores, 99), 2),
+            'max_ms': round(valores[-1], 2),
+            'errors': fallidas,
+            'error_rate': round(fallidas / len(valores), 4),
+            'error_types': dict(errores[op.nombre]),
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    todas = sorted(v * 1000 for valores in latencias.values() for v in valores)
+    fallidas = sum(e['errors'] for e in endpoints.values())
+    tipos = Counter()
+    for contador in errores.values():
+        tipos.update(contador)
+    return {
+        'concurrency': concurrencia,
+        'duration_s': round(transcurrido, 2),
+        'requests': total,
+        'rps': round(total / transcurrido, 1),
+        'p50_ms': round(_percentil(todas, 50), 2),
+        'p95_ms': round(_percentil(todas, 95), 2),
+        'p99_ms': round(_percentil(todas, 99), 2),
+        'errors': fallidas,
+        'error_rate': round(fallidas / total, 4) if total else 0.0,
+        'error_types': dict(tipos),
+        'endpoints': endpoints,
+    }
+
+
+def reporte_etapa(resultado: dict) -> str:
+    lineas = [f"== concurrencia {resultado['concurrency']}: {resultado['rps']} req/s, "
+              f"p95 {resultado['p95_ms']} ms, errores {resultado['error_rate']:.2%} ==",
+              f"{'endpoint':<34}{'n':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'máx ms':>9}{'errores':>9}"]
+    for nombre, e in resultado['endpoints'].items():
+        lineas.append(f"{nombre:<34}{e['requests']:>8}{e['rps']:>9}{e['p50_ms']:>9}{e['p95_ms']:>9}"
+                      f"{e['p99_ms']:>9}{e['max_ms']:>9}{e['error_rate']:>9.2%}")
+    if resultado['error_types']:
+        lineas.append('errores: ' + ', '.join(f'{k}={v}' for k, v in sorted(resultado['error_types'].items())))
+    return '\n'.join(lineas)
+
+
+def capacidad(etapas: List[dict], max_p95_ms: float, max_error_rate: float) -> Optional[dict]:
+    """Etapa con más req/s que cumple los límites de p95 y de errores"""
+    validas = [e for e in etapas if e['p95_ms'] <= max_p95_ms and e['error_rate'] <= max_error_rate]
+    return max(validas, key=lambda e: e['rps']) if validas else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--concurrency', default='1,4,16,32', help='Hilos cliente por etapa, separados por comas')
+    parser.add_argument('--duration', type=float, default=10, help='Segundos por etapa')
+    parser.add_argument('--warmup', type=float, default=2, help='Segundos de calentamiento antes de medir')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Fracción de peticiones de escritura')
+    parser.add_argument('--plantas', type=int, default=500, help='Plantas a sembrar')
+    parser.add_argument('--cuidados', type=int, default=5000, help='Cuidados iniciales a sembrar')
+    parser.add_argument('--server', choices=['gunicorn', 'flask'], default='gunicorn',
+                        help='Servidor de los servicios arrancados')
+    parser.add_argument('--workers', type=int, default=2, help='Workers de gunicorn por servicio')
+    parser.add_argument('--threads', type=int, default=4, help='Hilos por worker de gunicorn')
+    parser.add_argument('--env', action='append', default=[], metavar='CLAVE=VALOR',
+                        help='Variable de entorno extra para ambos servicios (p. ej. CUIDADOS_GROUP_COMMIT=1)')
+    parser.add_argument('--plantas-url', help='Usar un plantas-service ya en ejecución (sin arrancar ni sembrar)')
+    parser.add_argument('--cuidados-url', help='Usar un cuidados-service ya en ejecución')
+    parser.add_argument('--timeout', type=float, default=10, help='Segundos de espera por respuesta')
+    parser.add_argument('--max-p95-ms', type=float, default=100, help='p95 aceptable para la capacidad sostenida')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Errores aceptables para la capacidad sostenida')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep-data', action='store_true', help='Conservar las bases y los logs de los servicios')
+    parser.add_argument('--json', help='Guardar los resultados en este archivo JSON')
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.write_ratio <= 1:
+        parser.error('--write-ratio debe estar entre 0 y 1')
+    if bool(args.plantas_url) != bool(args.cuidados_url):
+        parser.error('--plantas-url y --cuidados-url se indican juntas')
+    niveles = [int(c) for c in args.concurrency.split(',')]
+    env_extra = dict(e.split('=', 1) for e in args.env)
+
+    directorio = tempfile.mkdtemp(prefix='loadtest-')
+    servicios = None
+    try:
+        if args.plantas_url:
+            urls = {'plantas': args.plantas_url, 'cuidados': args.cuidados_url}
+        else:
+            servicios = Servicios(args.server, args.workers, args.threads, directorio, env_extra)
+            urls = servicios.arrancar()
+            print(f'# servicios en {urls} ({args.server}, logs en {directorio})', file=sys.stderr)
+        cliente = Cliente(urls, args.timeout)
+        if servicios:
+            inicio = time.perf_counter()
+            sembrar(cliente, args.plantas, args.cuidados, random.Random(args.seed))
+            print(f'# {args.plantas} plantas y {args.cuidados} cuidados sembrados en '
+                  f'{time.perf_counter() - inicio:.1f} s', file=sys.stderr)
+        if args.warmup > 0:
+            etapa(cliente, OPERACIONES, max(niveles), args.warmup, args.write_ratio, args.plantas, args.seed)
+
+        etapas = []
+        for nivel in niveles:
+            resultado = etapa(cliente, OPERACIONES, nivel, args.duration, args.write_ratio,
+                              args.plantas, args.seed + nivel)
+            etapas.append(resultado)
+            print(reporte_etapa(resultado))
+            print()
+    finally:
+        if servicios:
+            servicios.detener()
+        if not args.keep_data:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    mejor = capacidad(etapas, args.max_p95_ms, args.max_error_rate)
+    print('etapa       req/s    p50 ms    p95 ms    p99 ms   errores')
+    for e in etapas:
+        print(f"{e['concurrency']:>5}{e['rps']:>12}{e['p50_ms']:>10}{e['p95_ms']:>10}{e['p99_ms']:>10}"
+              f"{e['error_rate']:>10.2%}")
+    if mejor:
+        print(f"Capacidad sostenida: {mejor['rps']} req/s con concurrencia {mejor['concurrency']} "
+              f"(p95 ≤ {args.max_p95_ms:g} ms, errores ≤ {args.max_error_rate:.1%})")
+    else:
+        print(f'Ninguna etapa cumple p95 ≤ {args.max_p95_ms:g} ms y errores ≤ {args.max_error_rate:.1%}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'stages': etapas,
+                       'sustained': mejor and {'concurrency': mejor['concurrency'], 'rps': mejor['rps']}},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
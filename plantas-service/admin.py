@@ -0,0 +1,31 @@
+"""
+Protección de los endpoints de administración (/admin/...)
+Solo están disponibles si ADMIN_TOKEN está definida, y cada petición debe
+enviar ese valor en la cabecera X-Admin-Token.
+"""
+import hmac
+import os
+from functools import wraps
+
+from flask import jsonify, request
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+
+def require_admin(view):
+    """Decorador: 404 si la administración está desactivada, 401 si el token no coincide"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({
+                'success': False,
+                'message': 'Endpoints de administración desactivados (ADMIN_TOKEN no configurado)'
+            }), 404
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({
+                'success': False,
+                'message': 'Token de administración inválido'
+            }), 401
+        return view(*args, **kwargs)
+    return wrapper
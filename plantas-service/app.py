@@ -2,46 +2,447 @@
 Microservicio de Plantas
 Gestiona el CRUD de plantas del sistema
 """
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from flask_cors import CORS
-from models import PlantaManager
+from werkzeug.local import LocalProxy
+from models import (CAMPOS_PLANTA, ORDENES_PLANTA, PlantaManager, codificar_cursor,
+                    decodificar_cursor, validar_planta)
+from importer import flujo_de_texto, importar_plantas, leer_registros
+from http_cache import conditional_get
+from streaming import STREAM_CHUNK_SIZE, stream_json
+from compression import init_compression
+from db import SQLITE_INT_MAX
+from metrics import MULTIPROC_DIR, MetricsRegistry, db_gauges, init_metrics, instrument_manager
+from admin import require_admin
+from query_stats import query_stats
+from profiling import (CpuProfiler, errores_de_perfilado, init_profiling, memory_profiler,
+                       numero_param, parametros_cpu)
 from datetime import datetime
+from typing import Optional
+import os
 
-app = Flask(__name__)
-CORS(app)
+# Rutas del servicio; create_app() las registra en cada aplicación
+bp = Blueprint('plantas', __name__)
 
-# Inicializar el gestor de plantas
-planta_manager = PlantaManager()
+# Estado de la aplicación que atiende la petición (ver create_app)
+planta_manager = LocalProxy(lambda: current_app.extensions['planta_manager'])
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
+cpu_profiler = LocalProxy(lambda: current_app.extensions['cpu_profiler'])
 
-@app.route('/health', methods=['GET'])
+def create_app(config: Optional[dict] = None) -> Flask:
+    """
+    Fábrica de la aplicación (gunicorn "app:create_app()"). Cada llamada crea
+    su propio gestor de plantas (con su pool de conexiones), registro de
+    métricas y perfilador de CPU, así que cada worker arma su estado después
+    del fork en lugar de heredarlo del master.
+    """
+    app = Flask(__name__)
+    if config:
+        app.config.update(config)
+    CORS(app)
+    init_compression(app)
+
+    manager = PlantaManager()
+
+    # Métricas para /metrics (peticiones HTTP y llamadas al gestor); con
+    # METRICS_MULTIPROC_DIR se suman las de todos los workers
+    registry = MetricsRegistry(MULTIPROC_DIR)
+    init_metrics(app, registry)
+    instrument_manager(manager, registry)
+    db_gauges(registry, manager)
+    registry.iniciar_volcado()
+
+    # Perfilado bajo demanda (/admin/profile/...): sin sesión activa no tiene costo
+    profiler = CpuProfiler()
+    init_profiling(app, profiler)
+
+    app.extensions.update(planta_manager=manager, metrics=registry, cpu_profiler=profiler)
+    app.register_blueprint(bp)
+    return app
+
+# Paginación por cursor (keyset) para los listados
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+def _wants_stream() -> bool:
+    """`?stream=1` pide la respuesta en streaming (sin límite de página por defecto)"""
+    return request.args.get('stream', '').lower() in ('1', 'true')
+
+def _entero_param(nombre: str, defecto: Optional[int] = None, minimo: int = 0,
+                  maximo: int = SQLITE_INT_MAX) -> Optional[int]:
+    """
+    Entero del query string dentro de [minimo, maximo]; el máximo por defecto es el
+    de un INTEGER de SQLite, que no puede recibir un int de Python más grande.
+    ValueError con un mensaje legible si falta el número o queda fuera de rango.
+    """
+    valor = request.args.get(nombre)
+    if valor is None:
+        return defecto
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ValueError(f'{nombre} debe ser un número entero')
+    if not minimo <= numero <= maximo:
+        raise ValueError(f'{nombre} debe estar entre {minimo} y {maximo}')
+    return numero
+
+def _pagination_params(stream: bool = False, sort: str = 'id'):
+    """
+    Lee `after_id` y `limit` del query string.
+    after_id es el next_cursor de la página anterior: un id o, si se ordena por
+    otra columna, el token con el valor de esa columna (ver codificar_cursor).
+    Con stream=True `limit` es opcional (None = todas las filas) y no tiene máximo.
+    Devuelve (after_id, after_valor, limit, error_response)
+    """
+    try:
+        after_id, after_valor = decodificar_cursor(request.args.get('after_id', '0'), sort)
+    except ValueError as e:
+        return None, None, None, (jsonify({
+            'success': False,
+            'message': f'after_id inválido: {e}'
+        }), 400)
+    try:
+        limit = _entero_param('limit', None if stream else DEFAULT_PAGE_SIZE, 1,
+                              SQLITE_INT_MAX if stream else MAX_PAGE_SIZE)
+    except ValueError as e:
+        return None, None, None, (jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400)
+    return after_id, after_valor, limit, None
+
+def _paginate(rows: list, limit: int, sort: str = 'id'):
+    """Recorta la página pedida (se consultan limit + 1 filas) y calcula el siguiente cursor"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, codificar_cursor(rows[-1], sort)
+    return rows, None
+
+def _fields_param(permitidos):
+    """
+    Lee `fields` (columnas separadas por comas) del query string.
+    Devuelve (campos, mensaje_error); campos es None si no se pidió proyección.
+    """
+    raw = request.args.get('fields')
+    if raw is None:
+        return None, None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    if not fields or any(f not in permitidos for f in fields):
+        return None, f"fields debe ser una lista de campos entre: {', '.join(permitidos)}"
+    return fields, None
+
+def _filtros_params():
+    """
+    Lee los filtros (tipo, ubicacion, nombre, frecuencia_min, frecuencia_max)
+    y el orden (sort=columna o sort=-columna) del listado de plantas.
+    Devuelve (filtros, sort, mensaje_error)
+    """
+    filtros = {
+        'tipo': request.args.get('tipo'),
+        'ubicacion': request.args.get('ubicacion'),
+        'nombre': request.args.get('nombre'),
+    }
+    try:
+        for campo in ('frecuencia_min', 'frecuencia_max'):
+            filtros[campo] = _entero_param(campo)
+    except ValueError as e:
+        return None, None, str(e)
+    sort = request.args.get('sort', 'id')
+    if sort.lstrip('-') not in ORDENES_PLANTA or sort.count('-') > 1:
+        return None, None, f"sort debe ser una de: {', '.join(ORDENES_PLANTA)} (con '-' para orden descendente)"
+    return filtros, sort, None
+
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'service': 'plantas-service',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'db_pool': planta_manager.pool_stats(),
+        'cache': planta_manager.cache_stats()
     }), 200
 
-@app.route('/api/plantas', methods=['GET'])
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    GET /metrics
+    Métricas en formato de texto de Prometheus
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+QUERY_STATS_ORDEN = ('total_ms', 'count', 'avg_ms', 'max_ms', 'rows', 'slow')
+
+@bp.route('/admin/queries', methods=['GET'])
+@require_admin
+def admin_queries():
+    """
+    GET /admin/queries?order_by=total_ms&limit=20
+    Estadísticas por sentencia SQL y últimas consultas lentas con su plan
+    """
+    order_by = request.args.get('order_by', 'total_ms')
+    if order_by not in QUERY_STATS_ORDEN:
+        return jsonify({
+            'success': False,
+            'message': f"order_by debe ser una de: {', '.join(QUERY_STATS_ORDEN)}"
+        }), 400
+    try:
+        limit = _entero_param('limit')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    return jsonify({
+        'success': True,
+        'data': query_stats.snapshot(order_by, limit)
+    }), 200
+
+@bp.route('/admin/queries', methods=['DELETE'])
+@require_admin
+def admin_queries_reset():
+    """
+    DELETE /admin/queries
+    Reinicia las estadísticas de consultas
+    """
+    query_stats.reset()
+    return jsonify({
+        'success': True,
+        'message': 'Estadísticas de consultas reiniciadas'
+    }), 200
+
+@bp.route('/admin/profile/cpu', methods=['POST'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_cpu_start():
+    """
+    POST /admin/profile/cpu?mode=cprofile&seconds=30
+    POST /admin/profile/cpu?mode=sample&requests=500&interval_ms=5
+    Inicia una sesión de perfilado de CPU por tiempo o por cantidad de peticiones
+    """
+    return jsonify({
+        'success': True,
+        'data': cpu_profiler.start(**parametros_cpu(request.args))
+    }), 202
+
+@bp.route('/admin/profile/cpu', methods=['GET'])
+@require_admin
+def admin_profile_cpu_status():
+    """
+    GET /admin/profile/cpu
+    Estado de la sesión de perfilado de CPU actual o de la última
+    """
+    return jsonify({
+        'success': True,
+        'data': cpu_profiler.status()
+    }), 200
+
+@bp.route('/admin/profile/cpu', methods=['DELETE'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_cpu_stop():
+    """
+    DELETE /admin/profile/cpu
+    Termina antes de tiempo la sesión de perfilado de CPU
+    """
+    return jsonify({
+        'success': True,
+        'data': cpu_profiler.stop()
+    }), 200
+
+@bp.route('/admin/profile/cpu/download', methods=['GET'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_cpu_download():
+    """
+    GET /admin/profile/cpu/download?format=raw|text&sort=cumulative&limit=50
+    Descarga el resultado de la última sesión (pstats, informe de texto o pilas folded)
+    """
+    contenido, mimetype, extension = cpu_profiler.resultado(
+        request.args.get('format', 'raw'),
+        request.args.get('sort', 'cumulative'),
+        numero_param(request.args, 'limit', int, 50))
+    return Response(contenido, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=plantas-service-cpu.{extension}'
+    })
+
+@bp.route('/admin/profile/memory', methods=['POST'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_start():
+    """
+    POST /admin/profile/memory?frames=1
+    Activa tracemalloc y toma la instantánea base para las diferencias
+    """
+    return jsonify({
+        'success': True,
+        'data': memory_profiler.start(numero_param(request.args, 'frames', int, 1))
+    }), 200
+
+@bp.route('/admin/profile/memory', methods=['GET'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_top():
+    """
+    GET /admin/profile/memory?group_by=lineno&limit=20&diff=1
+    Mayores asignaciones de memoria o, con diff=1, cambios desde la instantánea base
+    """
+    top = memory_profiler.top(
+        request.args.get('group_by', 'lineno'),
+        numero_param(request.args, 'limit', int, 20),
+        request.args.get('diff', '').lower() in ('1', 'true'))
+    return jsonify({
+        'success': True,
+        'data': dict(memory_profiler.status(), top=top)
+    }), 200
+
+@bp.route('/admin/profile/memory/download', methods=['GET'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_download():
+    """
+    GET /admin/profile/memory/download
+    Descarga la instantánea actual de tracemalloc (tracemalloc.Snapshot.load)
+    """
+    return Response(memory_profiler.dump(), mimetype='application/octet-stream', headers={
+        'Content-Disposition': 'attachment; filename=plantas-service-memory.tracemalloc'
+    })
+
+@bp.route('/admin/profile/memory', methods=['DELETE'])
+@require_admin
+@errores_de_perfilado
+def admin_profile_memory_stop():
+    """
+    DELETE /admin/profile/memory
+    Detiene tracemalloc y descarta la instantánea base
+    """
+    return jsonify({
+        'success': True,
+        'data': memory_profiler.stop()
+    }), 200
+
+@bp.route('/api/plantas', methods=['GET'])
+@conditional_get(lambda scope: planta_manager.get_version(scope), 'plantas')
 def get_plantas():
     """
-    GET /api/plantas
-    Obtiene la lista de todas las plantas
+    GET /api/plantas?after_id=0&limit=100
+    Obtiene la lista de plantas paginada por cursor
+    GET /api/plantas?tipo=Interior&ubicacion=Sala&nombre=Mon&frecuencia_min=3&frecuencia_max=7&sort=-nombre
+    Filtra y ordena en SQL; next_cursor es el id de la última planta o, con otro
+    orden, un token opaco con su valor, que se pasa tal cual como after_id
+    GET /api/plantas?ids=1,2,3
+    Obtiene varias plantas por id en una sola consulta
+    GET /api/plantas?stream=1
+    Exporta todas las plantas (desde after_id) en streaming
+    Con ?fields=id,nombre solo se devuelven esas columnas (el id siempre)
     """
-    plantas = planta_manager.get_all()
+    fields, error = _fields_param(CAMPOS_PLANTA)
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    if 'ids' in request.args:
+        ids, error = _parse_ids(request.args['ids'])
+        if error:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        plantas = planta_manager.get_many(ids, fields)
+        encontradas = {p['id'] for p in plantas}
+        return jsonify({
+            'success': True,
+            'data': plantas,
+            'count': len(plantas),
+            'not_found': [i for i in dict.fromkeys(ids) if i not in encontradas]
+        }), 200
+
+    filtros, sort, error = _filtros_params()
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    stream = _wants_stream()
+    after_id, after_valor, limit, error = _pagination_params(stream, sort)
+    if error:
+        return error
+    try:
+        if stream:
+            return stream_json(planta_manager.iter_all(after_id, limit, STREAM_CHUNK_SIZE, fields,
+                                                       filtros, sort, after_valor))
+        # El cursor necesita la columna del orden aunque no se haya pedido en fields
+        columna = sort.lstrip('-')
+        extra = fields is not None and columna not in fields and columna != 'id'
+        plantas = planta_manager.get_all(after_id, limit + 1, fields + [columna] if extra else fields,
+                                         filtros, sort, after_valor)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    plantas, next_cursor = _paginate(plantas, limit, sort)
+    if extra:
+        for planta in plantas:
+            del planta[columna]
     return jsonify({
         'success': True,
         'data': plantas,
-        'count': len(plantas)
+        'count': len(plantas),
+        'next_cursor': next_cursor
+    }), 200
+
+# Máximo de ids aceptados en una consulta por lista de ids
+MAX_IDS = int(os.environ.get('MAX_IDS', 500))
+
+def _parse_ids(raw: str):
+    """
+    Convierte '1,2,3' en [1, 2, 3]; devuelve (ids, mensaje_error).
+    Cada id debe estar entre 1 y el máximo de un INTEGER de SQLite.
+    """
+    try:
+        ids = [int(x) for x in raw.split(',') if x.strip()]
+    except ValueError:
+        return None, 'ids debe ser una lista de enteros separados por comas'
+    if not ids or len(ids) > MAX_IDS:
+        return None, f'ids debe contener entre 1 y {MAX_IDS} elementos'
+    if any(not 0 < i <= SQLITE_INT_MAX for i in ids):
+        return None, f'Cada id debe estar entre 1 y {SQLITE_INT_MAX}'
+    return ids, None
+
+@bp.route('/api/plantas/existentes', methods=['GET'])
+def get_plantas_existentes():
+    """
+    GET /api/plantas/existentes?ids=1,2,3
+    Indica qué ids de la lista corresponden a plantas existentes
+    (usado por cuidados-service para validar planta_id)
+    """
+    ids, error = _parse_ids(request.args.get('ids', ''))
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    return jsonify({
+        'success': True,
+        'data': {'existentes': planta_manager.existentes(ids)}
     }), 200
 
-@app.route('/api/plantas/<int:planta_id>', methods=['GET'])
+@bp.route('/api/plantas/<int:planta_id>', methods=['GET'])
+@conditional_get(lambda scope: planta_manager.get_version(scope), lambda planta_id: f'planta:{planta_id}')
 def get_planta(planta_id):
     """
-    GET /api/plantas/{id}
+    GET /api/plantas/{id}?fields=nombre,frecuencia_riego_dias
     Obtiene una planta específica por ID
     """
-    planta = planta_manager.get_by_id(planta_id)
+    fields, error = _fields_param(CAMPOS_PLANTA)
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    planta = planta_manager.get_by_id(planta_id, fields)
     if planta:
         return jsonify({
             'success': True,
@@ -52,7 +453,7 @@ def get_planta(planta_id):
         'message': f'Planta con ID {planta_id} no encontrada'
     }), 404
 
-@app.route('/api/plantas', methods=['POST'])
+@bp.route('/api/plantas', methods=['POST'])
 def create_planta():
     """
     POST /api/plantas
@@ -67,20 +468,12 @@ def create_planta():
     try:
         data = request.get_json()
 
-        # Validar campos requeridos
-        required_fields = ['nombre', 'tipo', 'ubicacion', 'frecuencia_riego_dias']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'message': f'Campo requerido faltante: {field}'
-                }), 400
-
-        # Validar frecuencia de riego
-        if not isinstance(data['frecuencia_riego_dias'], int) or data['frecuencia_riego_dias'] <= 0:
+        # Validar campos requeridos y frecuencia de riego
+        error = validar_planta(data)
+        if error:
             return jsonify({
                 'success': False,
-                'message': 'frecuencia_riego_dias debe ser un número entero positivo'
+                'message': error
             }), 400
 
         planta = planta_manager.create(data)
@@ -95,7 +488,48 @@ def create_planta():
             'message': f'Error al crear planta: {str(e)}'
         }), 500
 
-@app.route('/api/plantas/<int:planta_id>', methods=['PUT'])
+@bp.route('/api/plantas/import', methods=['POST'])
+def import_plantas():
+    """
+    POST /api/plantas/import?format=ndjson|csv&chunk_size=500
+    Importa plantas de forma masiva leyendo el cuerpo como flujo.
+    NDJSON: un objeto JSON por línea. CSV: cabecera con
+    nombre,tipo,ubicacion,frecuencia_riego_dias
+    Las filas inválidas se informan en `errores` y no se insertan.
+    """
+    formato = request.args.get('format')
+    if not formato:
+        formato = 'csv' if 'csv' in (request.mimetype or '') else 'ndjson'
+    if formato not in ('ndjson', 'csv'):
+        return jsonify({
+            'success': False,
+            'message': 'format debe ser ndjson o csv'
+        }), 400
+    try:
+        chunk_size = int(request.args.get('chunk_size', 500))
+    except ValueError:
+        chunk_size = 0
+    if chunk_size <= 0:
+        return jsonify({
+            'success': False,
+            'message': 'chunk_size debe ser un número entero positivo'
+        }), 400
+
+    try:
+        registros = leer_registros(flujo_de_texto(request.stream), formato)
+        reporte = importar_plantas(planta_manager, registros, chunk_size=chunk_size)
+        return jsonify({
+            'success': reporte['importadas'] > 0 or reporte['total'] == 0,
+            'message': f"{reporte['importadas']} de {reporte['total']} plantas importadas",
+            'data': reporte
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error al importar plantas: {str(e)}'
+        }), 500
+
+@bp.route('/api/plantas/<int:planta_id>', methods=['PUT'])
 def update_planta(planta_id):
     """
     PUT /api/plantas/{id}
@@ -111,15 +545,21 @@ def update_planta(planta_id):
                 'message': f'Planta con ID {planta_id} no encontrada'
             }), 404
 
-        # Validar frecuencia de riego si se proporciona
-        if 'frecuencia_riego_dias' in data:
-            if not isinstance(data['frecuencia_riego_dias'], int) or data['frecuencia_riego_dias'] <= 0:
-                return jsonify({
-                    'success': False,
-                    'message': 'frecuencia_riego_dias debe ser un número entero positivo'
-                }), 400
+        # Validar tipos de los campos que se actualizan
+        error = validar_planta(data, parcial=True)
+        if error:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
 
         planta = planta_manager.update(planta_id, data)
+        if planta is None:
+            # Eliminada por otra petición entre la validación y el UPDATE
+            return jsonify({
+                'success': False,
+                'message': f'Planta con ID {planta_id} no encontrada'
+            }), 404
         return jsonify({
             'success': True,
             'message': 'Planta actualizada exitosamente',
@@ -131,7 +571,7 @@ def update_planta(planta_id):
             'message': f'Error al actualizar planta: {str(e)}'
         }), 500
 
-@app.route('/api/plantas/<int:planta_id>', methods=['DELETE'])
+@bp.route('/api/plantas/<int:planta_id>', methods=['DELETE'])
 def delete_planta(planta_id):
     """
     DELETE /api/plantas/{id}
@@ -147,7 +587,7 @@ def delete_planta(planta_id):
         'message': f'Planta con ID {planta_id} no encontrada'
     }), 404
 
-@app.route('/')
+@bp.route('/')
 def index():
     """Ruta raíz: muestra información básica y endpoints del servicio"""
     return jsonify({
@@ -158,18 +598,19 @@ def index():
             'health': '/health',
             'listar_plantas': '/api/plantas',
             'obtener_planta': '/api/plantas/{id}',
-            'crear_planta': '/api/plantas (POST)'
+            'crear_planta': '/api/plantas (POST)',
+            'importar_plantas': '/api/plantas/import (POST)'
         }
     }), 200
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         'success': False,
         'message': 'Endpoint no encontrado'
     }), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     return jsonify({
         'success': False,
@@ -177,16 +618,17 @@ def internal_error(error):
     }), 500
 
 if __name__ == '__main__':
-    import os
+    app = create_app()
 
     # Crear algunas plantas de ejemplo
-    planta_manager.create({
+    manager = app.extensions['planta_manager']
+    manager.create({
         'nombre': 'Monstera Deliciosa',
         'tipo': 'Interior',
         'ubicacion': 'Sala',
         'frecuencia_riego_dias': 7
     })
-    planta_manager.create({
+    manager.create({
         'nombre': 'Suculenta',
         'tipo': 'Interior',
         'ubicacion': 'Ventana',
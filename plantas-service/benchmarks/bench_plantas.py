@@ -0,0 +1,77 @@
+"""
+Microbenchmarks de PlantaManager
+
+Uso (desde plantas-service/):
+    python -m benchmarks.bench_plantas                         # 1k, 10k y 100k plantas
+    python -m benchmarks.bench_plantas --sizes 1000 --ops 200
+    python -m benchmarks.bench_plantas --save-baseline         # fija la línea base
+    python -m benchmarks.bench_plantas --data-dir /tmp/bench   # reutiliza las bases sembradas
+
+Sale con código 1 si alguna operación empeoró respecto de benchmarks/baseline.json.
+"""
+import random
+import sys
+from typing import List
+
+from benchmarks.harness import WARMUP_CALLS, Benchmark, cerrar, main
+from models import PlantaManager
+from seed import UBICACIONES, sembrar_plantas
+
+TIPOS = ('Interior', 'Exterior', 'Suculenta', 'Aromática', 'Huerta')
+PAGINA = 100
+
+
+def sembrar(ruta: str, n: int, rng: random.Random):
+    """Crea la base con n plantas con la siembra masiva de seed.py"""
+    sembrar_plantas(ruta, n, rng)
+
+
+def abrir(ruta: str) -> PlantaManager:
+    return PlantaManager(db_path=ruta)
+
+
+def crear_benchmarks(manager: PlantaManager, n: int, rng: random.Random, ops: int) -> List[Benchmark]:
+    """Operaciones medidas, de solo lectura primero para que las escrituras no las alteren"""
+    def ids(k: int = 1) -> list:
+        return [rng.randint(1, n) for _ in range(k)]
+
+    def pagina(after_id: int):
+        return manager.get_all(after_id=after_id, limit=PAGINA)
+
+    def filtrado(tipo: str, ubicacion: str):
+        return manager.get_all(limit=PAGINA, filtros={'tipo': tipo, 'ubicacion': ubicacion})
+
+    def por_nombre(after_id: int):
+        return manager.get_all(after_id=after_id, limit=PAGINA, sort='nombre')
+
+    def exportar(after_id: int):
+        return sum(1 for _ in manager.iter_all(after_id=after_id, limit=1000))
+
+    def crear(i: int):
+        return manager.create({'nombre': f'Nueva {i}', 'tipo': 'Interior', 'ubicacion': 'Sala',
+                               'frecuencia_riego_dias': 7})
+
+    def actualizar(planta_id: int, frecuencia: int):
+        return manager.update(planta_id, {'frecuencia_riego_dias': frecuencia})
+
+    # Mismas lecturas por id con y sin caché: un acierto no debe tocar la base
+    sin_cache = PlantaManager(db_path=manager.db_path, cache_size=0)
+    calientes = ids(WARMUP_CALLS)
+
+    return [
+        ('get_by_id', manager.get_by_id, [tuple(ids()) for _ in range(ops)]),
+        ('get_by_id_cache_hit', manager.get_by_id, [(calientes[i % len(calientes)],) for i in range(ops)]),
+        ('get_by_id_uncached', sin_cache.get_by_id, [(calientes[i % len(calientes)],) for i in range(ops)]),
+        ('get_many_50', manager.get_many, [(ids(50),) for _ in range(ops)]),
+        ('get_all_page', pagina, [(max(0, rng.randint(0, n) - PAGINA),) for _ in range(ops)]),
+        ('get_all_filtered', filtrado, [(rng.choice(TIPOS), rng.choice(UBICACIONES)) for _ in range(ops)]),
+        ('get_all_sort_nombre', por_nombre, [tuple(ids()) for _ in range(ops)]),
+        ('iter_all_1000', exportar, [(max(0, rng.randint(0, n) - 1000),) for _ in range(max(20, ops // 10))]),
+        ('create', crear, [(i,) for i in range(ops)]),
+        ('update', actualizar, [(*ids(), rng.randint(1, 30)) for _ in range(ops)]),
+    ]
+
+
+if __name__ == '__main__':
+    sys.exit(main(__doc__.strip().split('\n')[0], 'plantas', sembrar, abrir, crear_benchmarks,
+                  default_sizes='1000,10000,100000'))
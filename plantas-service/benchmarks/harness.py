@@ -0,0 +1,232 @@
+"""
+Utilidades de los microbenchmarks: medición de latencia, rendimiento y
+memoria de cada operación, línea base en JSON y detección de regresiones
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Tolerancia relativa antes de considerar que una métrica empeoró (0.25 = 25 %)
+DEFAULT_THRESHOLD = float(os.environ.get('BENCH_THRESHOLD', 0.25))
+# Llamadas medidas con tracemalloc (lo hace todo más lento, por eso son pocas)
+MEMORY_CALLS = 20
+WARMUP_CALLS = 10
+# Métricas comparadas con la línea base (mayor es peor; p95 y p99 varían demasiado entre corridas)
+METRICAS_REGRESION = ('p50_us', 'peak_kb')
+
+Benchmark = Tuple[str, Callable, List[tuple]]
+
+
+def _percentil(ordenados: List[float], p: float) -> float:
+    i = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[i]
+
+
+def medir(funcion: Callable, argumentos: Sequence[tuple], warmup: int = WARMUP_CALLS,
+          memory_calls: int = MEMORY_CALLS) -> dict:
+    """
+    Llama a funcion(*args) por cada elemento de `argumentos` y devuelve latencia
+    (microsegundos), rendimiento (ops/s) y el pico de memoria de una llamada.
+    Las primeras `warmup` tuplas calientan cachés y no se cuentan; las siguientes
+    `memory_calls` se repiten bajo tracemalloc.
+    """
+    calentamiento, medidas = argumentos[:warmup], argumentos[warmup:]
+    if not medidas:
+        raise ValueError('Se necesitan más argumentos que llamadas de calentamiento')
+    for args in calentamiento:
+        funcion(*args)
+
+    latencias = []
+    inicio_total = time.perf_counter()
+    for args in medidas:
+        inicio = time.perf_counter()
+        funcion(*args)
+        latencias.append(time.perf_counter() - inicio)
+    total = time.perf_counter() - inicio_total
+
+    pico = 0
+    tracemalloc.start()
+    try:
+        for args in medidas[:memory_calls]:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            funcion(*args)
+            pico = max(pico, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    ordenados = sorted(l * 1e6 for l in latencias)
+    return {
+        'ops': len(latencias),
+        'mean_us': round(sum(ordenados) / len(ordenados), 2),
+        'p50_us': round(_percentil(ordenados, 50), 2),
+        'p95_us': round(_percentil(ordenados, 95), 2),
+        'p99_us': round(_percentil(ordenados, 99), 2),
+        'ops_per_s': round(len(latencias) / total, 1),
+        'peak_kb': round(pico / 1024, 2),
+    }
+
+
+def entorno() -> dict:
+    """Datos de la máquina y versiones, para saber si dos resultados son comparables"""
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'query_stats': os.environ.get('SQLITE_QUERY_STATS', '0') == '1',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def cargar_base(ruta: str) -> Optional[dict]:
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar(ruta: str, resultados: dict):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def comparar(actual: dict, base: Optional[dict], threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """
+    Regresiones de `actual` respecto de `base`: métricas que crecieron más de
+    `threshold` (relativo) en un mismo tamaño y operación
+    """
+    if not base:
+        return []
+    regresiones = []
+    for tamano, operaciones in actual['results'].items():
+        previas = base.get('results', {}).get(tamano, {})
+        for nombre, metricas in operaciones.items():
+            anterior = previas.get(nombre)
+            if not anterior:
+                continue
+            for metrica in METRICAS_REGRESION:
+                antes, ahora = anterior.get(metrica), metricas.get(metrica)
+                # Diferencias absolutas mínimas: por debajo son ruido de medición
+                if not antes or ahora is None or ahora - antes < (1.0 if metrica == 'peak_kb' else 5.0):
+                    continue
+                cambio = ahora / antes - 1
+                if cambio > threshold:
+                    regresiones.append({
+                        'size': tamano, 'benchmark': nombre, 'metric': metrica,
+                        'baseline': antes, 'current': ahora, 'change': round(cambio, 3),
+                    })
+    return regresiones
+
+
+def reporte(actual: dict, base: Optional[dict], regresiones: List[dict]) -> str:
+    """Tabla de texto con los resultados y la variación de p50 respecto de la base"""
+    marcadas = {(r['size'], r['benchmark']) for r in regresiones}
+    lineas = [f"{'tamaño':>9}  {'operación':<24}{'ops/s':>10}{'p50 µs':>10}{'p95 µs':>10}"
+              f"{'p99 µs':>10}{'pico KB':>10}{'Δp50':>9}"]
+    for tamano, operaciones in actual['results'].items():
+        previas = (base or {}).get('results', {}).get(tamano, {})
+        for nombre, m in operaciones.items():
+            anterior = previas.get(nombre)
+            delta = f"{m['p50_us'] / anterior['p50_us'] - 1:+.0%}" if anterior and anterior.get('p50_us') else '—'
+            marca = '  ← regresión' if (tamano, nombre) in marcadas else ''
+            lineas.append(f"{tamano:>9}  {nombre:<24}{m['ops_per_s']:>10}{m['p50_us']:>10}"
+                          f"{m['p95_us']:>10}{m['p99_us']:>10}{m['peak_kb']:>10}{delta:>9}{marca}")
+    for r in regresiones:
+        lineas.append(f"REGRESIÓN {r['size']} {r['benchmark']} {r['metric']}: "
+                      f"{r['baseline']} → {r['current']} ({r['change']:+.0%})")
+    return '\n'.join(lineas)
+
+
+def ejecutar(benchmarks: List[Benchmark], progreso=None) -> Dict[str, dict]:
+    """Mide cada (nombre, función, argumentos) en orden"""
+    resultados = {}
+    for nombre, funcion, argumentos in benchmarks:
+        resultados[nombre] = medir(funcion, argumentos)
+        if progreso:
+            progreso(nombre, resultados[nombre])
+    return resultados
+
+
+def cerrar(manager):
+    """Cierra el gestor (si tiene cola de escritura) y las conexiones de su base"""
+    if hasattr(manager, 'close'):
+        manager.close()
+    manager._pool.close()
+
+
+def main(descripcion: str, prefijo: str, sembrar: Callable, abrir: Callable,
+         crear_benchmarks: Callable, argv=None, default_sizes: str = '1000,100000,1000000',
+         default_ops: int = 1000) -> int:
+    """
+    CLI común. Por cada tamaño siembra una base (o reutiliza la sembrada en
+    --data-dir), trabaja sobre una copia para que las escrituras no alteren la
+    siguiente corrida, ejecuta los benchmarks, compara con la línea base y
+    opcionalmente la guarda. Devuelve 1 si hay regresiones.
+    """
+    directorio = os.path.dirname(os.path.abspath(sys.modules[crear_benchmarks.__module__].__file__))
+    parser = argparse.ArgumentParser(description=descripcion)
+    parser.add_argument('--sizes', default=default_sizes, help='Tamaños de la base separados por comas')
+    parser.add_argument('--ops', type=int, default=default_ops, help='Llamadas medidas por operación')
+    parser.add_argument('--baseline', default=os.path.join(directorio, 'baseline.json'),
+                        help='Archivo JSON de la línea base')
+    parser.add_argument('--save-baseline', action='store_true', help='Guardar estos resultados como línea base')
+    parser.add_argument('--output', help='Guardar estos resultados en otro archivo JSON')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Tolerancia relativa antes de marcar una regresión')
+    parser.add_argument('--data-dir', help='Directorio donde conservar y reutilizar las bases sembradas')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de los datos y de los argumentos')
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='bench-')
+    os.makedirs(data_dir, exist_ok=True)
+    actual = {'environment': entorno(), 'results': {}}
+    try:
+        for tamano in (int(t) for t in args.sizes.split(',')):
+            semilla = os.path.join(data_dir, f'{prefijo}-{tamano}-{args.seed}.seed.db')
+            if not os.path.exists(semilla):
+                inicio = time.perf_counter()
+                sembrar(semilla + '.tmp', tamano, random.Random(args.seed))
+                os.replace(semilla + '.tmp', semilla)
+                print(f'# {prefijo} {tamano}: base sembrada en {time.perf_counter() - inicio:.1f} s',
+                      file=sys.stderr)
+            trabajo = os.path.join(data_dir, f'{prefijo}-{tamano}.db')
+            shutil.copyfile(semilla, trabajo)
+            manager = abrir(trabajo)
+            try:
+                benchmarks = crear_benchmarks(manager, tamano, random.Random(args.seed),
+                                              args.ops + WARMUP_CALLS)
+                actual['results'][str(tamano)] = ejecutar(
+                    benchmarks, lambda nombre, m: print(f'#   {tamano} {nombre}: {m["p50_us"]} µs p50',
+                                                        file=sys.stderr))
+            finally:
+                cerrar(manager)
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(trabajo + sufijo):
+                    os.remove(trabajo + sufijo)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    base = cargar_base(args.baseline)
+    regresiones = comparar(actual, base, args.threshold)
+    print(reporte(actual, base, regresiones))
+    if base is None:
+        print(f'Sin línea base en {args.baseline} (usa --save-baseline para crearla)')
+    if args.output:
+        guardar(args.output, actual)
+    if args.save_baseline:
+        guardar(args.baseline, actual)
+        print(f'Línea base guardada en {args.baseline}')
+    return 1 if regresiones else 0
@@ -0,0 +1,101 @@
+"""
+Caché LRU en memoria, acotada por tamaño, con TTL opcional y validación
+opcional por versión
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Caché LRU segura entre hilos con contadores de aciertos/fallos"""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """ttl en segundos; None o 0 desactiva la expiración"""
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                       'invalidations': 0, 'stale': 0}
+
+    def get(self, key: Hashable, version: Any = None) -> Optional[Any]:
+        """
+        Valor guardado para `key`. Si se pasa `version` y la entrada se guardó
+        con otra, se descarta (cuenta como `stale` y como fallo); si coincide,
+        la entrada queda validada en este momento (ver get_validated).
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires, entry_version, validated = entry
+            now = time.monotonic()
+            if expires is not None and expires <= now:
+                del self._data[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            if version is not None:
+                if entry_version != version:
+                    del self._data[key]
+                    self._stats['stale'] += 1
+                    self._stats['misses'] += 1
+                    return None
+                self._data[key] = (value, expires, entry_version, now)
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def get_validated(self, key: Hashable, max_age: float) -> Optional[Any]:
+        """
+        Valor de `key` si se guardó o validó contra su versión hace menos de
+        `max_age` segundos; si no, None sin contar un fallo, para que quien
+        llama consulte la versión y use get(key, version).
+        """
+        if max_age <= 0:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires, _, validated = entry
+            now = time.monotonic()
+            if (expires is not None and expires <= now) or now - validated >= max_age:
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, version: Any = None):
+        if self.max_size <= 0:
+            return
+        now = time.monotonic()
+        expires = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires, version, now)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data['size'] = len(self._data)
+        total = data['hits'] + data['misses']
+        data['hit_ratio'] = round(data['hits'] / total, 4) if total else 0.0
+        data['max_size'] = self.max_size
+        data['ttl'] = self.ttl
+        return data
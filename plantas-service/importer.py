@@ -0,0 +1,118 @@
+"""
+Importación masiva de plantas desde NDJSON o CSV
+Lee la entrada como flujo (línea a línea) e inserta por lotes
+"""
+import csv
+import io
+import json
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from models import CAMPOS_REQUERIDOS, PlantaManager, validar_planta
+
+# Máximo de errores detallados que se devuelven en el reporte
+MAX_ERRORES_REPORTE = 100
+
+Registro = Tuple[int, Optional[dict], Optional[str]]
+
+
+class _LectorBinario(io.RawIOBase):
+    """Adapta cualquier objeto con read(n) (p. ej. wsgi.input de gunicorn) a io"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def flujo_de_texto(stream) -> io.TextIOWrapper:
+    """
+    Envuelve el cuerpo de la petición para leerlo como texto UTF-8 línea a línea.
+    Bajo gunicorn request.stream es su wsgi.input, que no implementa la
+    interfaz de io (readable) que necesita TextIOWrapper.
+    Los bytes que no son UTF-8 no cortan la lectura: quedan como surrogates
+    (surrogateescape) y validar_planta rechaza solo la fila que los contiene.
+    """
+    return io.TextIOWrapper(io.BufferedReader(_LectorBinario(stream)), encoding='utf-8',
+                            errors='surrogateescape', newline='')
+
+
+def leer_ndjson(lines: Iterable[str]) -> Iterator[Registro]:
+    """Genera (linea, datos, error) por cada línea no vacía de un flujo NDJSON"""
+    for numero, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield numero, None, f'JSON inválido: {e}'
+            continue
+        if not isinstance(data, dict):
+            yield numero, None, 'Cada línea debe ser un objeto JSON'
+            continue
+        yield numero, data, None
+
+
+def leer_csv(lines: Iterable[str]) -> Iterator[Registro]:
+    """Genera (linea, datos, error) por cada fila de un CSV con cabecera"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        data = {k.strip(): (v.strip() if isinstance(v, str) else v)
+                for k, v in row.items() if k is not None and v is not None}
+        # En CSV todo llega como texto: convertir la frecuencia antes de validar
+        # (si no es un entero queda como texto y validar_planta rechaza la fila)
+        try:
+            data['frecuencia_riego_dias'] = int(data['frecuencia_riego_dias'])
+        except (KeyError, ValueError):
+            pass
+        yield reader.line_num, data, None
+
+
+def leer_registros(lines: Iterable[str], formato: str) -> Iterator[Registro]:
+    if formato == 'csv':
+        return leer_csv(lines)
+    if formato == 'ndjson':
+        return leer_ndjson(lines)
+    raise ValueError(f'Formato no soportado: {formato}')
+
+
+def importar_plantas(manager: PlantaManager, registros: Iterable[Registro],
+                     chunk_size: int = 500,
+                     progreso: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Valida cada registro con las mismas reglas que POST /api/plantas
+    e inserta los válidos en transacciones de `chunk_size` filas.
+    Devuelve un reporte con totales y los primeros errores.
+    """
+    reporte = {'total': 0, 'importadas': 0, 'rechazadas': 0, 'lotes': 0, 'errores': []}
+    lote = []
+
+    def guardar_lote():
+        reporte['importadas'] += manager.create_many(lote)
+        reporte['lotes'] += 1
+        lote.clear()
+        if progreso:
+            progreso(reporte)
+
+    for linea, data, error in registros:
+        reporte['total'] += 1
+        if error is None:
+            error = validar_planta(data)
+        if error:
+            reporte['rechazadas'] += 1
+            if len(reporte['errores']) < MAX_ERRORES_REPORTE:
+                reporte['errores'].append({'linea': linea, 'message': error})
+            continue
+        lote.append({field: data[field] for field in CAMPOS_REQUERIDOS})
+        if len(lote) >= chunk_size:
+            guardar_lote()
+
+    if lote:
+        guardar_lote()
+    return reporte
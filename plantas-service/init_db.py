@@ -1,10 +1,22 @@
 """
 Script para inicializar y poblar la base de datos de Plantas (ejecútalo una vez)
+
+Uso:
+    python init_db.py                                  # datos de ejemplo
+    python init_db.py --import plantas.ndjson          # importación masiva
+    python init_db.py --import plantas.csv --format csv --chunk-size 1000
+    cat plantas.ndjson | python init_db.py --import -
 """
+import argparse
+import io
+import json
+import sys
+
+from importer import importar_plantas, leer_registros
 from models import PlantaManager
 
-if __name__ == '__main__':
-    pm = PlantaManager()
+
+def poblar_ejemplo(pm: PlantaManager):
     # Borrar tablas existentes si quieres (no implementado para seguridad)
 
     # Crear algunas plantas de ejemplo
@@ -22,3 +34,32 @@ if __name__ == '__main__':
     })
     print('Bases de datos de plantas inicializada con datos de ejemplo.')
 
+
+def importar_archivo(pm: PlantaManager, ruta: str, formato: str, chunk_size: int) -> dict:
+    if formato is None:
+        formato = 'csv' if ruta.lower().endswith('.csv') else 'ndjson'
+
+    def progreso(reporte):
+        print(f"  lote {reporte['lotes']}: {reporte['importadas']} importadas, "
+              f"{reporte['rechazadas']} rechazadas", file=sys.stderr)
+
+    if ruta == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        return importar_plantas(pm, leer_registros(stream, formato), chunk_size, progreso)
+    with open(ruta, encoding='utf-8', newline='') as stream:
+        return importar_plantas(pm, leer_registros(stream, formato), chunk_size, progreso)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--import', dest='ruta', help="Archivo NDJSON/CSV a importar ('-' para stdin)")
+    parser.add_argument('--format', choices=['ndjson', 'csv'], help='Formato del archivo (por defecto según extensión)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Filas por transacción')
+    args = parser.parse_args()
+
+    pm = PlantaManager()
+    if args.ruta:
+        reporte = importar_archivo(pm, args.ruta, args.format, args.chunk_size)
+        print(json.dumps(reporte, ensure_ascii=False, indent=2))
+        sys.exit(0 if reporte['rechazadas'] == 0 else 1)
+    poblar_ejemplo(pm)
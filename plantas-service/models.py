@@ -1,81 +1,457 @@
 """
 Modelos de datos para el servicio de Plantas (SQLite)
 """
-import sqlite3
+import base64
+import json
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'plantas.db')
+from cache import LRUCache
+from db import SQLITE_INT_MAX, SQLITE_INT_MIN, get_pool, migrate
+
+DB_PATH = os.environ.get('PLANTAS_DB_PATH',
+                         os.path.join(os.path.dirname(__file__), 'plantas.db'))
+# Caché de lecturas por id (0 desactiva la caché; TTL en segundos, 0 sin expiración)
+CACHE_SIZE = int(os.environ.get('PLANTAS_CACHE_SIZE', 1024))
+CACHE_TTL = float(os.environ.get('PLANTAS_CACHE_TTL', 30))
+# Segundos durante los que una entrada se sirve sin volver a comparar su versión
+# (las escrituras de este proceso actualizan la caché al momento; este margen solo
+# acota cuánto tarda en verse un cambio hecho por otro proceso; 0 compara siempre)
+CACHE_REVALIDATE = float(os.environ.get('PLANTAS_CACHE_REVALIDATE', 1))
+
+# Migraciones de esquema (version, [sentencias]); nunca modificar las ya publicadas
+MIGRATIONS = [
+    (1, ['''
+        CREATE TABLE IF NOT EXISTS plantas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            ubicacion TEXT NOT NULL,
+            frecuencia_riego_dias INTEGER NOT NULL,
+            fecha_creacion TEXT NOT NULL,
+            fecha_actualizacion TEXT NOT NULL
+        )
+    ''']),
+    # Versión de cambios por tabla para ETag / GET condicional
+    (2, [
+        '''
+        CREATE TABLE IF NOT EXISTS versiones (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS plantas_version_insert AFTER INSERT ON plantas
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('plantas', 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS plantas_version_update AFTER UPDATE ON plantas
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('plantas', 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS plantas_version_delete AFTER DELETE ON plantas
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('plantas', 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+    ]),
+    # Índices para filtrar y ordenar el listado (cada entrada termina en el id,
+    # así que también sirven para el desempate y el cursor)
+    (3, [
+        'CREATE INDEX IF NOT EXISTS idx_plantas_tipo_ubicacion ON plantas (tipo, ubicacion)',
+        'CREATE INDEX IF NOT EXISTS idx_plantas_ubicacion ON plantas (ubicacion)',
+        'CREATE INDEX IF NOT EXISTS idx_plantas_nombre ON plantas (nombre)',
+        'CREATE INDEX IF NOT EXISTS idx_plantas_frecuencia ON plantas (frecuencia_riego_dias)',
+    ]),
+    # Versión por planta ('planta:<id>'): valida las entradas de la caché de
+    # cada proceso y el ETag de GET /api/plantas/{id}
+    (4, [
+        '''
+        CREATE TRIGGER IF NOT EXISTS plantas_version_planta_insert AFTER INSERT ON plantas
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('planta:' || NEW.id, 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS plantas_version_planta_update AFTER UPDATE ON plantas
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('planta:' || NEW.id, 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS plantas_version_planta_delete AFTER DELETE ON plantas
+        BEGIN
+            INSERT INTO versiones (scope, version, updated_at)
+            VALUES ('planta:' || OLD.id, 1, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+        ''',
+    ]),
+]
+
+CAMPOS_REQUERIDOS = ['nombre', 'tipo', 'ubicacion', 'frecuencia_riego_dias']
+
+# Columnas que se pueden pedir con ?fields= (el id se incluye siempre)
+CAMPOS_PLANTA = ('id', 'nombre', 'tipo', 'ubicacion', 'frecuencia_riego_dias',
+                 'fecha_creacion', 'fecha_actualizacion')
+
+# Filtros del listado: tipo y ubicacion exactos, nombre por prefijo, frecuencia por rango
+FILTROS_PLANTA = ('tipo', 'ubicacion', 'nombre', 'frecuencia_min', 'frecuencia_max')
+# Columnas por las que se puede ordenar (todas con índice); el id desempata
+ORDENES_PLANTA = ('id', 'nombre', 'tipo', 'ubicacion', 'frecuencia_riego_dias')
+
+def codificar_cursor(planta: dict, sort: str) -> Union[int, str]:
+    """
+    next_cursor de la última planta de una página: el id si se ordena por id y,
+    si no, un token opaco con (columna, valor, id). Así el cursor no depende de
+    que esa fila siga existiendo en la página siguiente.
+    """
+    columna = sort.lstrip('-')
+    if columna == 'id':
+        return planta['id']
+    token = json.dumps([columna, planta[columna], planta['id']], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor: str, sort: str) -> Tuple[int, Any]:
+    """
+    Inverso de codificar_cursor: devuelve (after_id, after_valor). Un id numérico
+    da after_valor None. ValueError si el token es inválido, es de otro orden o
+    trae enteros que no caben en un INTEGER de SQLite.
+    """
+    if cursor.isascii() and cursor.isdigit():
+        after_id = int(cursor)
+        if after_id > SQLITE_INT_MAX:
+            raise ValueError('Cursor fuera de rango')
+        return after_id, None
+    columna = sort.lstrip('-')
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        token_columna, valor, after_id = datos
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+    tipo = int if columna in ('id', 'frecuencia_riego_dias') else str
+    if (token_columna != columna or type(valor) is not tipo
+            or type(after_id) is not int or after_id < 0):
+        raise ValueError(f'El cursor no corresponde al orden {sort}')
+    if after_id > SQLITE_INT_MAX or (tipo is int and not SQLITE_INT_MIN <= valor <= SQLITE_INT_MAX):
+        raise ValueError('Cursor fuera de rango')
+    return after_id, (None if columna == 'id' else valor)
+
+def validar_planta(data, parcial: bool = False) -> Optional[str]:
+    """
+    Valida los datos de una planta nueva (o, con parcial=True, solo los campos
+    presentes de una actualización); devuelve el mensaje de error o None.
+    Comprueba también los tipos y rangos: un null, una lista, un objeto, un entero
+    de más de 64 bits o un texto que no es UTF-8 no deben llegar al INSERT, donde
+    fallarían con un error de SQLite.
+    """
+    if not isinstance(data, dict):
+        return 'El cuerpo debe ser un objeto JSON'
+    for field in CAMPOS_REQUERIDOS:
+        if field not in data:
+            if parcial:
+                continue
+            return f'Campo requerido faltante: {field}'
+        valor = data[field]
+        if field == 'frecuencia_riego_dias':
+            # bool es subclase de int: true/false no son frecuencias
+            if not isinstance(valor, int) or isinstance(valor, bool) or not 0 < valor <= SQLITE_INT_MAX:
+                return 'frecuencia_riego_dias debe ser un número entero positivo'
+        elif not isinstance(valor, str) or not valor.strip():
+            return f'{field} debe ser un texto no vacío'
+        elif not _es_utf8(valor):
+            return f'{field} no es texto UTF-8 válido'
+    return None
+
+def _es_utf8(texto: str) -> bool:
+    """
+    False si el texto tiene surrogates sueltos: bytes inválidos de un cuerpo leído
+    con surrogateescape o un escape \\ud800 de JSON, que SQLite no puede guardar
+    """
+    try:
+        texto.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
 
 class PlantaManager:
     """Gestor de plantas usando SQLite"""
 
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None,
+                 cache_size: int = CACHE_SIZE, cache_ttl: float = CACHE_TTL,
+                 cache_revalidate: float = CACHE_REVALIDATE):
+        self.db_path = db_path or DB_PATH
+        self._pool = get_pool(self.db_path)
+        self._cache = LRUCache(cache_size, cache_ttl)
+        self._cache_revalidate = cache_revalidate
         self._ensure_db()
 
     def _get_conn(self):
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Presta una conexión del pool (usar con `with`)"""
+        return self._pool.connection()
+
+    def pool_stats(self) -> dict:
+        return self._pool.stats()
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats()
 
     def _ensure_db(self):
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS plantas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                tipo TEXT NOT NULL,
-                ubicacion TEXT NOT NULL,
-                frecuencia_riego_dias INTEGER NOT NULL,
-                fecha_creacion TEXT NOT NULL,
-                fecha_actualizacion TEXT NOT NULL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self._get_conn() as conn:
+            migrate(conn, MIGRATIONS)
+
+    def get_version(self, scope: str) -> Tuple[int, Optional[int]]:
+        """Versión de cambios y fecha (epoch) de la última modificación de `scope`"""
+        with self._get_conn() as conn:
+            row = conn.execute('SELECT version, updated_at FROM versiones WHERE scope = ?',
+                               (scope,)).fetchone()
+        return (row['version'], row['updated_at']) if row else (0, None)
 
     def _row_to_dict(self, row) -> dict:
         if row is None:
             return None
         return {k: row[k] for k in row.keys()}
 
+    def _columnas(self, fields: Optional[List[str]]) -> str:
+        """Lista del SELECT para la proyección pedida (None = todas las columnas)"""
+        if not fields:
+            return '*'
+        invalidos = set(fields) - set(CAMPOS_PLANTA)
+        if invalidos:
+            raise ValueError(f"Campos no permitidos: {', '.join(sorted(invalidos))}")
+        return ', '.join(c for c in CAMPOS_PLANTA if c == 'id' or c in fields)
+
+    def _proyectar(self, planta: dict, fields: Optional[List[str]]) -> dict:
+        """Copia de una planta (p. ej. de la caché) con solo los campos pedidos"""
+        if not fields:
+            return dict(planta)
+        return {c: planta[c] for c in CAMPOS_PLANTA if c == 'id' or c in fields}
+
+    def _versiones(self, conn, ids: List[int]) -> Dict[int, int]:
+        """Versión 'planta:<id>' de cada id (0 si la planta nunca cambió desde la migración 4)"""
+        scopes = [f'planta:{i}' for i in ids]
+        rows = conn.execute(f"SELECT scope, version FROM versiones WHERE scope IN ({', '.join('?' * len(scopes))})",
+                            scopes).fetchall()
+        versiones = dict.fromkeys(ids, 0)
+        for row in rows:
+            versiones[int(row['scope'].split(':', 1)[1])] = row['version']
+        return versiones
+
     def create(self, data: dict) -> dict:
         """Crea una nueva planta y devuelve el objeto creado"""
         now = datetime.now().isoformat()
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('''
-            INSERT INTO plantas (nombre, tipo, ubicacion, frecuencia_riego_dias, fecha_creacion, fecha_actualizacion)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (data['nombre'], data['tipo'], data['ubicacion'], data['frecuencia_riego_dias'], now, now))
-        conn.commit()
-        last_id = cur.lastrowid
-        cur.execute('SELECT * FROM plantas WHERE id = ?', (last_id,))
-        row = cur.fetchone()
-        conn.close()
-        return self._row_to_dict(row)
-
-    def get_all(self) -> List[dict]:
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM plantas ORDER BY id')
-        rows = cur.fetchall()
-        conn.close()
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                INSERT INTO plantas (nombre, tipo, ubicacion, frecuencia_riego_dias, fecha_creacion, fecha_actualizacion)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (data['nombre'], data['tipo'], data['ubicacion'], data['frecuencia_riego_dias'], now, now))
+            last_id = cur.lastrowid
+            # Fila y versión se leen antes del commit, en la misma transacción
+            cur.execute('SELECT * FROM plantas WHERE id = ?', (last_id,))
+            row = cur.fetchone()
+            version = self._versiones(conn, [last_id])[last_id]
+            conn.commit()
+        planta = self._row_to_dict(row)
+        self._cache.set(planta['id'], planta, version)
+        return dict(planta)
+
+    def create_many(self, rows: List[dict]) -> int:
+        """Inserta varias plantas ya validadas en una sola transacción"""
+        if not rows:
+            return 0
+        now = datetime.now().isoformat()
+        params = [(r['nombre'], r['tipo'], r['ubicacion'], r['frecuencia_riego_dias'], now, now)
+                  for r in rows]
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.executemany('''
+                INSERT INTO plantas (nombre, tipo, ubicacion, frecuencia_riego_dias, fecha_creacion, fecha_actualizacion)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', params)
+            conn.commit()
+        return len(params)
+
+    def _consulta_listado(self, after_id: int, limit: Optional[int], fields: Optional[List[str]],
+                          filtros: Optional[dict], sort: str, after_valor: Any = None) -> Tuple[str, list]:
+        """
+        SQL del listado con filtros, orden y cursor.
+        sort es una columna de ORDENES_PLANTA, con '-' delante para orden descendente.
+        El cursor es el id de la última fila vista y, al ordenar por otra columna,
+        también su valor (after_valor): se compara la tupla (columna, id). Sin
+        after_valor se lee el de esa fila; si ya no existe es ValueError.
+        """
+        filtros = {k: v for k, v in (filtros or {}).items() if v is not None}
+        invalidos = set(filtros) - set(FILTROS_PLANTA)
+        if invalidos:
+            raise ValueError(f"Filtros no permitidos: {', '.join(sorted(invalidos))}")
+        descendente = sort.startswith('-')
+        columna = sort.lstrip('-')
+        if columna not in ORDENES_PLANTA:
+            raise ValueError(f'Orden no permitido: {sort}')
+
+        condiciones, params = [], []
+        for campo in ('tipo', 'ubicacion'):
+            if campo in filtros:
+                condiciones.append(f'{campo} = ?')
+                params.append(filtros[campo])
+        if 'nombre' in filtros:
+            # Rango en lugar de LIKE para aprovechar el índice (prefijo sensible a mayúsculas)
+            condiciones.append('nombre >= ? AND nombre < ?')
+            params.extend([filtros['nombre'], filtros['nombre'] + '\U0010ffff'])
+        if 'frecuencia_min' in filtros:
+            condiciones.append('frecuencia_riego_dias >= ?')
+            params.append(filtros['frecuencia_min'])
+        if 'frecuencia_max' in filtros:
+            condiciones.append('frecuencia_riego_dias <= ?')
+            params.append(filtros['frecuencia_max'])
+        if after_id:
+            operador = '<' if descendente else '>'
+            if columna == 'id':
+                condiciones.append(f'id {operador} ?')
+                params.append(after_id)
+            else:
+                if after_valor is None:
+                    after_valor = self._valor_de_cursor(columna, after_id)
+                condiciones.append(f'({columna}, id) {operador} (?, ?)')
+                params.extend([after_valor, after_id])
+
+        direccion = ' DESC' if descendente else ''
+        orden = f'id{direccion}' if columna == 'id' else f'{columna}{direccion}, id{direccion}'
+        sql = f'SELECT {self._columnas(fields)} FROM plantas'
+        if condiciones:
+            sql += ' WHERE ' + ' AND '.join(condiciones)
+        sql += f' ORDER BY {orden} LIMIT ?'
+        params.append(-1 if limit is None else limit)
+        return sql, params
+
+    def _valor_de_cursor(self, columna: str, after_id: int) -> Any:
+        """Valor de `columna` en la fila del cursor (para cursores que solo traen el id)"""
+        with self._get_conn() as conn:
+            row = conn.execute(f'SELECT {columna} FROM plantas WHERE id = ?', (after_id,)).fetchone()
+        if row is None:
+            raise ValueError(f'La planta {after_id} del cursor ya no existe; usa el next_cursor devuelto')
+        return row[0]
+
+    def get_all(self, after_id: int = 0, limit: Optional[int] = None,
+                fields: Optional[List[str]] = None, filtros: Optional[dict] = None,
+                sort: str = 'id', after_valor: Any = None) -> List[dict]:
+        """
+        Lista plantas a partir del cursor after_id (paginación por cursor),
+        filtradas y ordenadas en SQL, solo con las columnas `fields`
+        """
+        sql, params = self._consulta_listado(after_id, limit, fields, filtros, sort, after_valor)
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
         return [self._row_to_dict(r) for r in rows]
 
-    def get_by_id(self, planta_id: int) -> Optional[dict]:
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM plantas WHERE id = ?', (planta_id,))
-        row = cur.fetchone()
-        conn.close()
-        return self._row_to_dict(row)
+    def iter_all(self, after_id: int = 0, limit: Optional[int] = None,
+                 chunk_size: int = 500, fields: Optional[List[str]] = None,
+                 filtros: Optional[dict] = None, sort: str = 'id',
+                 after_valor: Any = None) -> Iterator[dict]:
+        """
+        Recorre las plantas leyendo del cursor por bloques (fetchmany).
+        Los parámetros se validan al llamar (ValueError), antes de empezar a iterar.
+        """
+        sql, params = self._consulta_listado(after_id, limit, fields, filtros, sort, after_valor)
+        return self._iter_query(sql, params, chunk_size)
 
-    def update(self, planta_id: int, data: dict) -> Optional[dict]:
-        if not self.get_by_id(planta_id):
+    def _iter_query(self, sql: str, params: list, chunk_size: int) -> Iterator[dict]:
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_dict(row)
+
+    def get_many(self, ids: List[int], fields: Optional[List[str]] = None) -> List[dict]:
+        """
+        Obtiene varias plantas con una sola consulta IN (...), en el orden de `ids`.
+        Las que están en caché (validadas hace poco o con su versión vigente) no
+        se consultan; los ids inexistentes se omiten. Se leen filas completas
+        (para la caché) y se proyectan a `fields`.
+        """
+        self._columnas(fields)  # valida la proyección antes de consultar
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        encontradas = {}
+        for planta_id in ids:
+            planta = self._cache.get_validated(planta_id, self._cache_revalidate)
+            if planta is not None:
+                encontradas[planta_id] = planta
+        pendientes = [i for i in ids if i not in encontradas]
+        if not pendientes:
+            return [self._proyectar(encontradas[i], fields) for i in ids]
+        with self._get_conn() as conn:
+            # Versiones antes que filas: si otro proceso escribe en medio, la
+            # entrada queda con una versión vieja y se descarta en la próxima lectura
+            versiones = self._versiones(conn, pendientes)
+            faltantes = []
+            for planta_id in pendientes:
+                planta = self._cache.get(planta_id, versiones[planta_id])
+                if planta is not None:
+                    encontradas[planta_id] = planta
+                else:
+                    faltantes.append(planta_id)
+            if faltantes:
+                cur = conn.cursor()
+                cur.execute(f"SELECT * FROM plantas WHERE id IN ({', '.join('?' * len(faltantes))})",
+                            faltantes)
+                rows = cur.fetchall()
+                for row in rows:
+                    planta = self._row_to_dict(row)
+                    self._cache.set(planta['id'], planta, versiones[planta['id']])
+                    encontradas[planta['id']] = planta
+        return [self._proyectar(encontradas[i], fields) for i in ids if i in encontradas]
+
+    def get_by_id(self, planta_id: int, fields: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        Planta por id. Un acierto validado hace menos de `cache_revalidate`
+        segundos no toca la base; pasado ese margen la entrada se compara con la
+        versión 'planta:<id>' (una búsqueda por clave primaria), así que los
+        cambios hechos por otros procesos se ven en ese plazo y no al vencer el TTL.
+        """
+        self._columnas(fields)  # valida la proyección antes de consultar
+        planta = self._cache.get_validated(planta_id, self._cache_revalidate)
+        if planta is not None:
+            return self._proyectar(planta, fields)
+        with self._get_conn() as conn:
+            version = self._versiones(conn, [planta_id])[planta_id]
+            planta = self._cache.get(planta_id, version)
+            if planta is not None:
+                return self._proyectar(planta, fields)
+            cur = conn.cursor()
+            cur.execute('SELECT * FROM plantas WHERE id = ?', (planta_id,))
+            row = cur.fetchone()
+        planta = self._row_to_dict(row)
+        if planta is None:
             return None
+        self._cache.set(planta_id, planta, version)
+        return self._proyectar(planta, fields)
+
+    def update(self, planta_id: int, data: dict) -> Optional[dict]:
         fields = []
         values = []
         allowed = ['nombre', 'tipo', 'ubicacion', 'frecuencia_riego_dias']
@@ -88,21 +464,40 @@ class PlantaManager:
         values.append(datetime.now().isoformat())
         values.append(planta_id)
         set_clause = ', '.join(fields) + ', fecha_actualizacion = ?'
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute(f'UPDATE plantas SET {set_clause} WHERE id = ?', tuple(values))
-        conn.commit()
-        conn.close()
-        return self.get_by_id(planta_id)
+        self._cache.invalidate(planta_id)
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(f'UPDATE plantas SET {set_clause} WHERE id = ?', tuple(values))
+            if cur.rowcount == 0:
+                conn.commit()
+                return None
+            cur.execute('SELECT * FROM plantas WHERE id = ?', (planta_id,))
+            row = cur.fetchone()
+            version = self._versiones(conn, [planta_id])[planta_id]
+            conn.commit()
+        planta = self._row_to_dict(row)
+        self._cache.set(planta_id, planta, version)
+        return dict(planta)
 
     def delete(self, planta_id: int) -> bool:
-        conn = self._get_conn()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM plantas WHERE id = ?', (planta_id,))
-        conn.commit()
-        affected = cur.rowcount
-        conn.close()
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute('DELETE FROM plantas WHERE id = ?', (planta_id,))
+            conn.commit()
+            affected = cur.rowcount
+        self._cache.invalidate(planta_id)
         return affected > 0
 
+    def existentes(self, ids: List[int]) -> List[int]:
+        """Devuelve, ordenados, los ids de la lista que existen"""
+        ids = sorted(set(ids))
+        if not ids:
+            return []
+        with self._get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT id FROM plantas WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY id",
+                        ids)
+            return [row['id'] for row in cur.fetchall()]
+
     def exists(self, planta_id: int) -> bool:
         return self.get_by_id(planta_id) is not None
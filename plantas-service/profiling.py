@@ -0,0 +1,500 @@
+"""
+Perfilado bajo demanda de CPU y memoria (endpoints /admin/profile/...)
+CPU: una sesión a la vez, durante N segundos o N peticiones, con cProfile
+(un perfilador por petición, combinados en un único pstats) o por muestreo
+periódico de las pilas de todos los hilos (formato "folded" de los flame
+graphs). Memoria: instantáneas de tracemalloc y diferencias contra una
+instantánea base.
+Con PROFILE_DIR, el worker que inicia una sesión de CPU escribe allí su
+estado y su resultado, así que cualquier worker puede consultarla,
+detenerla o descargarla.
+"""
+import atexit
+import cProfile
+import io
+import marshal
+import os
+import pickle
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import Flask, g, jsonify, request
+
+from metrics import escribir_archivo, escribir_json, leer_json, proceso_vivo
+
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 300))
+PROFILE_MAX_REQUESTS = int(os.environ.get('PROFILE_MAX_REQUESTS', 10000))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+# Duración de una sesión sin seconds ni requests
+DEFAULT_PROFILE_SECONDS = 30
+# Directorio compartido por los workers (sin definir, las sesiones son por proceso)
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or None
+# Cada cuántos segundos el worker de la sesión la guarda y revisa si venció o si otro worker pidió detenerla
+INTERVALO_VIGILANCIA = 0.25
+# Segundos que espera DELETE en otro worker a que el de la sesión la detenga
+ESPERA_DETENCION = 2
+
+MODOS_CPU = ('cprofile', 'sample')
+AGRUPACIONES_MEMORIA = ('lineno', 'filename', 'traceback')
+# Peticiones que no se perfilan ni cuentan para la sesión
+RUTAS_EXCLUIDAS = ('/admin/', '/metrics', '/health')
+
+
+class ProfilingError(Exception):
+    """Operación imposible en el estado actual del perfilador"""
+
+    def __init__(self, message: str, status: int = 409):
+        super().__init__(message)
+        self.status = status
+
+
+def numero_param(args, nombre: str, tipo=int, defecto=None):
+    """Parámetro numérico del query string; ValueError con un mensaje legible si no lo es"""
+    valor = args.get(nombre)
+    if valor is None:
+        return defecto
+    try:
+        return tipo(valor)
+    except ValueError:
+        raise ValueError(f'{nombre} debe ser un número')
+
+
+class CpuProfiler:
+    """
+    Sesión de perfilado de CPU por tiempo o por cantidad de peticiones. Solo
+    se perfilan las peticiones del proceso que la inicia; con `directorio`
+    los demás procesos ven su estado y su resultado.
+    """
+
+    def __init__(self, directorio: Optional[str] = PROFILE_DIR):
+        self._lock = threading.Lock()
+        self.activo = False  # lectura sin lock en cada petición
+        self._directorio = directorio
+        self._id: Optional[str] = None
+        self._sesion: Optional[dict] = None
+        self._inicio = 0.0
+        self._iniciadas = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._muestras: Counter = Counter()
+        self._detener = threading.Event()
+        if directorio:
+            # Si gunicorn recicla el worker a mitad de sesión, se guarda lo perfilado hasta ahí
+            atexit.register(self._al_salir)
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self._directorio, nombre)
+
+    def _ajena(self) -> Optional[dict]:
+        """Estado de la última sesión si la inició otro proceso (según el directorio), o None"""
+        if not self._directorio:
+            return None
+        estado = leer_json(self._ruta('cpu.json'))
+        if estado is None or estado['session']['id'] == self._id:
+            return None
+        sesion = estado['session']
+        if estado['active'] and not proceso_vivo(sesion['pid']):
+            # El worker terminó sin cerrar la sesión (p. ej. por timeout)
+            estado['active'] = False
+        if estado['active']:
+            sesion['elapsed_seconds'] = round(time.time() - sesion['started_at'], 3)
+        return estado
+
+    def _estado(self) -> dict:
+        """Estado de la sesión de este proceso (con self._lock tomado)"""
+        if self._sesion is None:
+            return {'active': False, 'session': None}
+        if self.activo and self._vencida():
+            self._terminar()
+        sesion = dict(self._sesion)
+        fin = sesion['finished_at'] or time.time()
+        sesion['elapsed_seconds'] = round(fin - sesion['started_at'], 3)
+        return {'active': self.activo, 'session': sesion}
+
+    def _guardar(self):
+        """
+        Escribe el estado de la sesión en el directorio y, si terminó, antes su
+        resultado, para que quien vea la sesión terminada lo encuentre (con
+        self._lock tomado)
+        """
+        if not self._directorio:
+            return
+        try:
+            if not self.activo:
+                if self._sesion['mode'] == 'sample':
+                    escribir_archivo(self._ruta(f'cpu-{self._id}.folded'), self._folded())
+                elif self._stats is not None:
+                    escribir_archivo(self._ruta(f'cpu-{self._id}.pstats'), marshal.dumps(self._stats.stats))
+            estado = self._estado()
+            actual = leer_json(self._ruta('cpu.json'))
+            # Una sesión terminada no pisa el estado de una más nueva de otro worker
+            if self.activo or actual is None or actual['session']['id'] == self._id:
+                escribir_json(self._ruta('cpu.json'), estado)
+        except OSError:
+            pass
+
+    def _vigilar(self, sesion_id: str, detener: threading.Event):
+        detencion = self._ruta(f'cpu-{sesion_id}.stop')
+        while not detener.wait(INTERVALO_VIGILANCIA):
+            with self._lock:
+                if self._id != sesion_id or not self.activo:
+                    return
+                if self._vencida() or os.path.exists(detencion):
+                    self._terminar()
+                else:
+                    self._guardar()
+
+    def _al_salir(self):
+        with self._lock:
+            self._terminar()
+
+    def start(self, mode: str = 'cprofile', seconds: Optional[float] = None,
+              requests: Optional[int] = None,
+              interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS) -> dict:
+        if mode not in MODOS_CPU:
+            raise ValueError(f"mode debe ser una de: {', '.join(MODOS_CPU)}")
+        if seconds is None and requests is None:
+            seconds = DEFAULT_PROFILE_SECONDS
+        if seconds is not None and not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise ValueError(f'seconds debe estar entre 0 y {PROFILE_MAX_SECONDS:g}')
+        if requests is not None and not 0 < requests <= PROFILE_MAX_REQUESTS:
+            raise ValueError(f'requests debe estar entre 1 y {PROFILE_MAX_REQUESTS}')
+        if not 0 < interval_ms <= 1000:
+            raise ValueError('interval_ms debe estar entre 0 y 1000')
+        ajena = self._ajena()
+        with self._lock:
+            if self.activo or (ajena is not None and ajena['active']):
+                raise ProfilingError('Ya hay una sesión de perfilado de CPU en curso')
+            self._id = uuid.uuid4().hex
+            self._sesion = {
+                'id': self._id,
+                'pid': os.getpid(),
+                'mode': mode,
+                'seconds': seconds,
+                'requests': requests,
+                'interval_ms': interval_ms if mode == 'sample' else None,
+                'started_at': time.time(),
+                'finished_at': None,
+                'requests_profiled': 0,
+                'samples': 0,
+            }
+            self._inicio = time.monotonic()
+            self._iniciadas = 0
+            self._stats = None
+            self._muestras = Counter()
+            self._detener = threading.Event()
+            self.activo = True
+            if mode == 'sample':
+                threading.Thread(target=self._muestrear, args=(self._detener, interval_ms / 1000),
+                                 name='cpu-profiler', daemon=True).start()
+            if self._directorio:
+                self._limpiar()
+                self._guardar()
+                threading.Thread(target=self._vigilar, args=(self._id, self._detener),
+                                 name='cpu-profiler-vigilancia', daemon=True).start()
+        return self.status()
+
+    def _limpiar(self):
+        """Borra los resultados de sesiones anteriores del directorio"""
+        try:
+            for archivo in os.listdir(self._directorio):
+                if archivo.startswith('cpu-') and not archivo.startswith(f'cpu-{self._id}'):
+                    os.remove(self._ruta(archivo))
+        except OSError:
+            pass
+
+    def _vencida(self) -> bool:
+        sesion = self._sesion
+        return ((sesion['seconds'] is not None
+                 and time.monotonic() - self._inicio >= sesion['seconds'])
+                or (sesion['requests'] is not None
+                    and sesion['requests_profiled'] >= sesion['requests']))
+
+    def _terminar(self):
+        if self.activo:
+            self.activo = False
+            self._sesion['finished_at'] = time.time()
+            self._detener.set()
+            self._guardar()
+
+    def stop(self) -> dict:
+        ajena = self._ajena()
+        if ajena is not None:
+            if ajena['active']:
+                # Se le pide al worker de la sesión que la detenga y se espera a que la guarde
+                with open(self._ruta(f"cpu-{ajena['session']['id']}.stop"), 'w'):
+                    pass
+                limite = time.monotonic() + ESPERA_DETENCION
+                while ajena['active'] and time.monotonic() < limite:
+                    time.sleep(INTERVALO_VIGILANCIA / 2)
+                    ajena = self._ajena() or ajena
+            return ajena
+        with self._lock:
+            if self._sesion is None:
+                raise ProfilingError('No hay ninguna sesión de perfilado de CPU', 404)
+            self._terminar()
+        return self.status()
+
+    def status(self) -> dict:
+        ajena = self._ajena()
+        if ajena is not None:
+            return ajena
+        with self._lock:
+            return self._estado()
+
+    def iniciar_peticion(self):
+        """Hook before_request: devuelve (sesión, perfilador) si la petición cuenta para la sesión"""
+        if not self.activo or request.path.startswith(RUTAS_EXCLUIDAS):
+            return None
+        with self._lock:
+            if not self.activo:
+                return None
+            if self._vencida():
+                self._terminar()
+                return None
+            sesion = self._sesion
+            if sesion['requests'] is not None and self._iniciadas >= sesion['requests']:
+                return None
+            self._iniciadas += 1
+            sesion_id = self._id
+        if sesion['mode'] == 'sample':
+            return sesion_id, None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Otro perfilador ya está activo en este proceso (Python 3.12+): se omite la petición
+            with self._lock:
+                self._iniciadas -= 1
+            return None
+        return sesion_id, perfil
+
+    def terminar_peticion(self, token):
+        """Hook teardown_request: agrega el perfil de la petición a la sesión"""
+        sesion_id, perfil = token
+        if perfil is not None:
+            perfil.disable()
+        with self._lock:
+            if sesion_id != self._id:
+                return
+            if perfil is not None:
+                if self._stats is None:
+                    self._stats = pstats.Stats(perfil)
+                else:
+                    self._stats.add(perfil)
+            self._sesion['requests_profiled'] += 1
+            if self.activo and self._vencida():
+                self._terminar()
+            elif not self.activo:
+                # Petición que seguía en curso al terminar la sesión
+                self._guardar()
+
+    def _muestrear(self, detener: threading.Event, intervalo: float):
+        propio = threading.get_ident()
+        while not detener.wait(intervalo):
+            pilas = []
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pila.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}'
+                                f':{codigo.co_firstlineno})')
+                    frame = frame.f_back
+                pilas.append(';'.join(reversed(pila)))
+            with self._lock:
+                if detener.is_set():
+                    return
+                self._muestras.update(pilas)
+                self._sesion['samples'] += 1
+                if self._vencida():
+                    self._terminar()
+
+    def resultado(self, formato: str = 'raw', sort: str = 'cumulative',
+                  limit: int = 50) -> Tuple[bytes, str, str]:
+        """
+        Resultado de la última sesión terminada: (contenido, mimetype, extensión).
+        cProfile: pstats binario (raw, se abre con pstats o snakeviz) o informe de texto.
+        Muestreo: pilas en formato folded (flamegraph.pl, speedscope).
+        """
+        if formato not in ('raw', 'text'):
+            raise ValueError('format debe ser raw o text')
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            raise ValueError(f'sort no válido: {sort}')
+        ajena = self._ajena()
+        if ajena is not None:
+            return self._resultado_ajeno(ajena, formato, sort, limit)
+        with self._lock:
+            if self._sesion is None:
+                raise ProfilingError('No hay ninguna sesión de perfilado de CPU', 404)
+            if self.activo and self._vencida():
+                self._terminar()
+            if self.activo:
+                raise ProfilingError('La sesión de perfilado sigue en curso')
+            if self._sesion['mode'] == 'sample':
+                return self._folded(), 'text/plain', 'folded'
+            return _formatear_stats(self._stats, formato, sort, limit)
+
+    def _folded(self) -> bytes:
+        return ''.join(f'{pila} {n}\n' for pila, n in self._muestras.most_common()).encode('utf-8')
+
+    def _resultado_ajeno(self, estado: dict, formato: str, sort: str, limit: int) -> Tuple[bytes, str, str]:
+        """Resultado de una sesión de otro proceso, leído del directorio"""
+        if estado['active']:
+            raise ProfilingError('La sesión de perfilado sigue en curso')
+        sesion = estado['session']
+        if sesion['mode'] == 'sample':
+            try:
+                with open(self._ruta(f"cpu-{sesion['id']}.folded"), 'rb') as f:
+                    return f.read(), 'text/plain', 'folded'
+            except FileNotFoundError:
+                raise ProfilingError('No se encontró el resultado de la sesión', 404)
+        ruta = self._ruta(f"cpu-{sesion['id']}.pstats")
+        if not os.path.exists(ruta):
+            raise ProfilingError('La sesión no perfiló ninguna petición', 404)
+        return _formatear_stats(pstats.Stats(ruta), formato, sort, limit)
+
+
+def _formatear_stats(stats: Optional[pstats.Stats], formato: str, sort: str,
+                     limit: int) -> Tuple[bytes, str, str]:
+    """pstats binario (raw) o informe de texto ordenado por `sort`"""
+    if stats is None:
+        raise ProfilingError('La sesión no perfiló ninguna petición', 404)
+    if formato == 'raw':
+        return marshal.dumps(stats.stats), 'application/octet-stream', 'pstats'
+    salida = io.StringIO()
+    stats.stream = salida
+    try:
+        stats.sort_stats(sort).print_stats(limit)
+    finally:
+        stats.stream = sys.stdout
+    return salida.getvalue().encode('utf-8'), 'text/plain', 'txt'
+
+
+class MemoryProfiler:
+    """Instantáneas de tracemalloc y diferencias contra la instantánea base"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._base: Optional[tracemalloc.Snapshot] = None
+
+    @staticmethod
+    def _instantanea() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    def start(self, frames: int = 1) -> dict:
+        """Activa tracemalloc (si hace falta) y toma la instantánea base"""
+        if not 1 <= frames <= 100:
+            raise ValueError('frames debe estar entre 1 y 100')
+        with self._lock:
+            if tracemalloc.is_tracing() and tracemalloc.get_traceback_limit() != frames:
+                tracemalloc.stop()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._base = self._instantanea()
+        return self.status()
+
+    def stop(self) -> dict:
+        with self._lock:
+            tracemalloc.stop()
+            self._base = None
+        return self.status()
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        actual, pico = tracemalloc.get_traced_memory()
+        return {
+            'tracing': tracing,
+            'frames': tracemalloc.get_traceback_limit() if tracing else None,
+            'traced_bytes': actual,
+            'peak_bytes': pico,
+            'baseline': self._base is not None,
+        }
+
+    def top(self, group_by: str = 'lineno', limit: int = 20, diff: bool = False) -> list:
+        """Mayores asignaciones actuales o, con diff, mayores cambios desde la base"""
+        if group_by not in AGRUPACIONES_MEMORIA:
+            raise ValueError(f"group_by debe ser una de: {', '.join(AGRUPACIONES_MEMORIA)}")
+        if not tracemalloc.is_tracing():
+            raise ProfilingError('tracemalloc no está activo')
+        snapshot = self._instantanea()
+        if not diff:
+            return [{
+                'traceback': [f'{f.filename}:{f.lineno}' for f in stat.traceback],
+                'size_bytes': stat.size,
+                'count': stat.count,
+            } for stat in snapshot.statistics(group_by)[:limit]]
+        with self._lock:
+            base = self._base
+        if base is None:
+            raise ProfilingError('No hay instantánea base', 404)
+        return [{
+            'traceback': [f'{f.filename}:{f.lineno}' for f in stat.traceback],
+            'size_bytes': stat.size,
+            'size_diff_bytes': stat.size_diff,
+            'count': stat.count,
+            'count_diff': stat.count_diff,
+        } for stat in snapshot.compare_to(base, group_by)[:limit]]
+
+    def dump(self) -> bytes:
+        """Instantánea actual en el formato de Snapshot.dump (se abre con Snapshot.load)"""
+        if not tracemalloc.is_tracing():
+            raise ProfilingError('tracemalloc no está activo')
+        return pickle.dumps(self._instantanea(), pickle.HIGHEST_PROTOCOL)
+
+
+# tracemalloc es uno por proceso, así que su perfilador también (el de CPU es por aplicación)
+memory_profiler = MemoryProfiler()
+
+
+def parametros_cpu(args) -> dict:
+    """Argumentos de CpuProfiler.start a partir del query string"""
+    parametros = {
+        'mode': args.get('mode', 'cprofile'),
+        'seconds': numero_param(args, 'seconds', float),
+        'requests': numero_param(args, 'requests', int),
+    }
+    interval_ms = numero_param(args, 'interval_ms', float)
+    if interval_ms is not None:
+        parametros['interval_ms'] = interval_ms
+    return parametros
+
+
+def errores_de_perfilado(view):
+    """Decorador: ValueError -> 400 y ProfilingError -> su estado, con el JSON habitual"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        except ProfilingError as e:
+            return jsonify({'success': False, 'message': str(e)}), e.status
+    return wrapper
+
+
+def init_profiling(app: Flask, profiler: CpuProfiler):
+    """Perfila las peticiones mientras haya una sesión de CPU activa (sin costo si no la hay)"""
+    @app.before_request
+    def _profile_inicio():
+        token = profiler.iniciar_peticion()
+        if token is not None:
+            g._profile = token
+
+    @app.teardown_request
+    def _profile_fin(exc):
+        token = g.pop('_profile', None)
+        if token is not None:
+            profiler.terminar_peticion(token)
@@ -0,0 +1,139 @@
+"""
+Siembra rápida de plantas sintéticas para pruebas de volumen (millones de filas)
+
+Uso:
+    python seed.py --plantas 1000000
+    python seed.py --plantas 200000 --tipos "Interior:6,Exterior:2,Suculenta:2"
+    python seed.py --plantas 50000 --frecuencias "3:1,7:5,14:3" --db /tmp/plantas.db --seed 7
+
+Inserta en una sola transacción, con PRAGMAs de carga masiva y los índices y
+triggers de la tabla quitados hasta el final. Ejecutar con el servicio detenido.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+from typing import Callable, Iterator, List, Tuple
+
+from db import bulk_connection, deferred_indexes
+from models import DB_PATH, PlantaManager
+
+# Distribuciones por defecto en formato "valor:peso,..."
+TIPOS = 'Interior:5,Exterior:3,Suculenta:2,Aromática:1,Huerta:1'
+FRECUENCIAS = '2:1,3:2,5:2,7:6,10:2,14:4,21:1,30:1'
+UBICACIONES = ('Sala', 'Cocina', 'Balcón', 'Jardín', 'Ventana', 'Dormitorio', 'Terraza', 'Patio')
+ESPECIES = ('Monstera', 'Potus', 'Ficus', 'Aloe', 'Lavanda', 'Romero', 'Tomate', 'Helecho',
+            'Cactus', 'Orquídea', 'Albahaca', 'Begonia', 'Calathea', 'Sansevieria', 'Menta')
+# Antigüedad máxima de las plantas sembradas
+DIAS = 730
+# Filas generadas por tanda (los sorteos se hacen de a muchos, es más rápido)
+LOTE = 10000
+
+
+def distribucion(texto: str, convertir: Callable = str) -> Tuple[list, List[float]]:
+    """
+    'Interior:5,Exterior:3' -> (['Interior', 'Exterior'], [5.0, 3.0]).
+    Un valor sin peso vale 1.
+    """
+    valores, pesos = [], []
+    for parte in texto.split(','):
+        valor, separador, peso = parte.strip().rpartition(':')
+        if not separador:
+            valor, peso = peso, '1'
+        try:
+            valores.append(convertir(valor.strip()))
+            pesos.append(float(peso))
+        except ValueError:
+            raise ValueError(f'Distribución inválida: {parte.strip()!r} (se espera valor:peso)')
+        if pesos[-1] < 0:
+            raise ValueError(f'Peso negativo en la distribución: {parte.strip()!r}')
+    if not valores or sum(pesos) <= 0:
+        raise ValueError(f'Distribución vacía: {texto!r}')
+    return valores, pesos
+
+
+def generar_plantas(n: int, rng: random.Random, tipos: str = TIPOS, frecuencias: str = FRECUENCIAS,
+                    dias: int = DIAS, primer_id: int = 1) -> Iterator[tuple]:
+    """
+    Filas (nombre, tipo, ubicacion, frecuencia_riego_dias, fecha_creacion,
+    fecha_actualizacion) con fechas de creación crecientes en los últimos `dias`
+    días, como si se hubieran dado de alta en orden. Las distribuciones se
+    validan al llamar (ValueError), no al empezar a iterar.
+    """
+    valores_tipo, pesos_tipo = distribucion(tipos)
+    valores_frec, pesos_frec = distribucion(frecuencias, int)
+    if any(f <= 0 for f in valores_frec):
+        raise ValueError('Las frecuencias de riego deben ser enteros positivos')
+    inicio = time.time() - dias * 86400
+    paso = dias * 86400 / max(1, n)
+
+    def filas():
+        for desde in range(0, n, LOTE):
+            k = min(LOTE, n - desde)
+            sorteo_tipos = rng.choices(valores_tipo, pesos_tipo, k=k)
+            sorteo_frec = rng.choices(valores_frec, pesos_frec, k=k)
+            sorteo_especies = rng.choices(ESPECIES, k=k)
+            sorteo_ubicaciones = rng.choices(UBICACIONES, k=k)
+            for j in range(k):
+                i = desde + j
+                fecha = datetime.fromtimestamp(int(inicio + (i + rng.random()) * paso)).isoformat()
+                yield (f'{sorteo_especies[j]} {primer_id + i}', sorteo_tipos[j], sorteo_ubicaciones[j],
+                       sorteo_frec[j], fecha, fecha)
+    return filas()
+
+
+def sembrar_plantas(db_path: str, n: int, rng: random.Random, tipos: str = TIPOS,
+                    frecuencias: str = FRECUENCIAS, dias: int = DIAS) -> dict:
+    """Agrega n plantas sintéticas a la base (creándola si no existe) y devuelve un reporte"""
+    inicio = time.perf_counter()
+    # Crea o migra el esquema con el gestor y suelta sus conexiones antes de la carga
+    manager = PlantaManager(db_path=db_path, cache_size=0)
+    manager._pool.close()
+
+    with bulk_connection(db_path) as conn:
+        primer_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM plantas').fetchone()[0]
+        conn.execute('BEGIN')
+        try:
+            with deferred_indexes(conn, 'plantas'):
+                conn.executemany('''
+                    INSERT INTO plantas (nombre, tipo, ubicacion, frecuencia_riego_dias,
+                                         fecha_creacion, fecha_actualizacion)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', generar_plantas(n, rng, tipos, frecuencias, dias, primer_id))
+            # Lo que habría hecho el trigger de versiones: invalidar los ETag
+            conn.execute('''
+                INSERT INTO versiones (scope, version, updated_at)
+                VALUES ('plantas', 1, CAST(strftime('%s', 'now') AS INTEGER))
+                ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+            ''')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    segundos = time.perf_counter() - inicio
+    return {
+        'plantas': n,
+        'primer_id': primer_id,
+        'segundos': round(segundos, 2),
+        'filas_por_segundo': round(n / segundos) if segundos else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--plantas', type=int, default=100000, help='Cantidad de plantas a agregar')
+    parser.add_argument('--tipos', default=TIPOS, help='Distribución de tipos (valor:peso,...)')
+    parser.add_argument('--frecuencias', default=FRECUENCIAS,
+                        help='Distribución de frecuencia de riego en días (valor:peso,...)')
+    parser.add_argument('--dias', type=int, default=DIAS, help='Antigüedad máxima de las plantas')
+    parser.add_argument('--db', default=DB_PATH, help='Base de datos a poblar (por defecto PLANTAS_DB_PATH)')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de los datos')
+    args = parser.parse_args()
+
+    try:
+        reporte = sembrar_plantas(args.db, args.plantas, random.Random(args.seed),
+                                  args.tipos, args.frecuencias, args.dias)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(reporte, ensure_ascii=False, indent=2))
@@ -0,0 +1,38 @@
+"""
+Respuestas JSON en streaming para listados grandes
+Codifica las filas a medida que se leen del cursor, manteniendo el
+mismo sobre {"success", "data", "count"} que jsonify.
+"""
+import json
+import os
+from typing import Iterable, Iterator, Optional
+
+from flask import Response
+
+# Filas leídas por fetchmany en cada vuelta
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 500))
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_envelope(rows: Iterable[dict], extra: Optional[dict] = None) -> Iterator[str]:
+    """Genera el JSON {"success": true, "data": [...], "count": N, ...extra} por partes"""
+    yield '{"success":true,"data":['
+    count = 0
+    buffer = []
+    for row in rows:
+        buffer.append(_encoder.encode(row))
+        count += 1
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield (',' if count > len(buffer) else '') + ','.join(buffer)
+            buffer = []
+    if buffer:
+        yield (',' if count > len(buffer) else '') + ','.join(buffer)
+    tail = {'count': count}
+    if extra:
+        tail.update(extra)
+    yield '],' + _encoder.encode(tail)[1:]
+
+
+def stream_json(rows: Iterable[dict], extra: Optional[dict] = None) -> Response:
+    return Response(iter_envelope(rows, extra), mimetype='application/json')
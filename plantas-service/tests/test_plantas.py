@@ -1,15 +1,37 @@
 """
 Pruebas unitarias para el Servicio de Plantas
 """
+import gzip
+import io
+import json
 import pytest
 import sys
 import os
+import threading
+import time
 
 # Agregar el directorio padre al path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import app
-from models import PlantaManager
+from app import create_app
+from models import PlantaManager, MIGRATIONS, codificar_cursor, decodificar_cursor
+from cache import LRUCache
+from importer import flujo_de_texto, importar_plantas, leer_registros
+from db import ConnectionPool, PoolTimeout, migrate, schema_version
+from metrics import MetricsRegistry, instrument_manager
+import admin
+from query_stats import normalizar_sql, forma_parametros, query_stats
+from profiling import CpuProfiler, ProfilingError
+import marshal
+import pickle
+import tracemalloc
+from benchmarks import bench_plantas
+from benchmarks.harness import comparar
+import random
+import sqlite3
+import seed
+
+app = create_app()
 
 @pytest.fixture
 def client():
@@ -19,9 +41,9 @@ def client():
         yield client
 
 @pytest.fixture
-def planta_manager():
+def planta_manager(tmp_path):
     """Fixture para el gestor de plantas"""
-    return PlantaManager()
+    return PlantaManager(db_path=str(tmp_path / 'plantas.db'))
 
 class TestPlantaManager:
     """Pruebas para PlantaManager"""
@@ -105,6 +127,773 @@ class TestPlantaManager:
         eliminada = planta_manager.get_by_id(planta['id'])
         assert eliminada is None
 
+class TestCachePlantas:
+    """Pruebas para la caché LRU de get_by_id"""
+
+    def test_lecturas_desde_cache(self, planta_manager):
+        """Test: Lecturas repetidas se sirven desde memoria"""
+        planta = planta_manager.create({
+            'nombre': 'Calathea',
+            'tipo': 'Interior',
+            'ubicacion': 'Sala',
+            'frecuencia_riego_dias': 4
+        })
+        adquiridas = planta_manager.pool_stats()['acquired']
+        for _ in range(3):
+            assert planta_manager.get_by_id(planta['id'])['nombre'] == 'Calathea'
+        assert planta_manager.get_many([planta['id']])[0]['nombre'] == 'Calathea'
+
+        # Dentro del margen de revalidación los aciertos no tocan la base
+        assert planta_manager.cache_stats()['hits'] == 4
+        assert planta_manager.cache_stats()['misses'] == 0
+        assert planta_manager.pool_stats()['acquired'] == adquiridas
+
+    def test_revalidacion_por_version(self, planta_manager, monkeypatch):
+        """Test: Pasado el margen un acierto compara la versión (sin leer la fila) y vuelve a quedar validado"""
+        planta = planta_manager.create({'nombre': 'Hoya', 'tipo': 'Interior', 'ubicacion': 'Sala',
+                                        'frecuencia_riego_dias': 9})
+        # Pasado el margen (1 s por defecto) pero dentro del TTL
+        reloj = [time.monotonic() + 2]
+        monkeypatch.setattr(time, 'monotonic', lambda: reloj[0])
+        adquiridas = planta_manager.pool_stats()['acquired']
+        assert planta_manager.get_by_id(planta['id'])['nombre'] == 'Hoya'
+        assert planta_manager.pool_stats()['acquired'] == adquiridas + 1
+        assert planta_manager.get_by_id(planta['id'])['nombre'] == 'Hoya'
+        assert planta_manager.pool_stats()['acquired'] == adquiridas + 1
+        stats = planta_manager.cache_stats()
+        assert stats['hits'] == 2 and stats['misses'] == 0 and stats['stale'] == 0
+
+    def test_invalidacion_en_escrituras(self, planta_manager):
+        """Test: update y delete invalidan la entrada en caché"""
+        planta = planta_manager.create({
+            'nombre': 'Ficus',
+            'tipo': 'Interior',
+            'ubicacion': 'Sala',
+            'frecuencia_riego_dias': 7
+        })
+        planta_manager.get_by_id(planta['id'])
+        planta_manager.update(planta['id'], {'ubicacion': 'Oficina'})
+        assert planta_manager.get_by_id(planta['id'])['ubicacion'] == 'Oficina'
+
+        planta_manager.delete(planta['id'])
+        assert planta_manager.get_by_id(planta['id']) is None
+
+    def test_cambios_de_otro_proceso(self, tmp_path, monkeypatch):
+        """Test: Una caché ve los cambios de otro gestor sobre la misma base al revalidar la versión"""
+        reloj = [time.monotonic()]
+        monkeypatch.setattr(time, 'monotonic', lambda: reloj[0])
+        ruta = str(tmp_path / 'compartida.db')
+        # Cada gestor tiene su propia caché, como dos workers de gunicorn
+        a, b = PlantaManager(db_path=ruta), PlantaManager(db_path=ruta, cache_revalidate=5)
+        planta = a.create({'nombre': 'Ficus', 'tipo': 'Interior', 'ubicacion': 'Sala',
+                           'frecuencia_riego_dias': 7})
+        assert b.get_by_id(planta['id'])['nombre'] == 'Ficus'
+        assert b.get_many([planta['id']])[0]['nombre'] == 'Ficus'
+
+        # Dentro del margen de revalidación se sirve la copia sin consultar la versión
+        a.update(planta['id'], {'nombre': 'Ficus Lyrata'})
+        assert b.get_by_id(planta['id'])['nombre'] == 'Ficus'
+        reloj[0] += 5
+        assert b.get_by_id(planta['id'])['nombre'] == 'Ficus Lyrata'
+        a.update(planta['id'], {'nombre': 'Ficus Benjamina'})
+        reloj[0] += 5
+        assert b.get_many([planta['id']])[0]['nombre'] == 'Ficus Benjamina'
+        assert b.cache_stats()['stale'] == 2
+
+        a.delete(planta['id'])
+        reloj[0] += 5
+        assert b.get_by_id(planta['id']) is None
+        assert b.get_many([planta['id']]) == []
+        assert b.update(planta['id'], {'nombre': 'Otra'}) is None
+
+    def test_copias_independientes(self, planta_manager):
+        """Test: Modificar el dict devuelto no altera la caché"""
+        planta = planta_manager.create({
+            'nombre': 'Pilea',
+            'tipo': 'Interior',
+            'ubicacion': 'Mesa',
+            'frecuencia_riego_dias': 6
+        })
+        planta['nombre'] = 'Otra'
+        assert planta_manager.get_by_id(planta['id'])['nombre'] == 'Pilea'
+
+    def test_lru_y_ttl(self, monkeypatch):
+        """Test: Expulsión por tamaño y expiración por TTL"""
+        cache = LRUCache(max_size=2, ttl=10)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        cache.get(1)
+        cache.set(3, 'c')
+        assert cache.get(2) is None
+        assert cache.get(1) == 'a'
+        assert cache.stats()['evictions'] == 1
+
+        reloj = time.monotonic() + 11
+        monkeypatch.setattr(time, 'monotonic', lambda: reloj)
+        assert cache.get(1) is None
+        assert cache.stats()['expirations'] == 1
+
+    def test_get_many(self, planta_manager):
+        """Test: Varias plantas en una consulta, combinando caché y base de datos"""
+        ids = [planta_manager.create({
+            'nombre': f'Planta {i}',
+            'tipo': 'Interior',
+            'ubicacion': 'Sala',
+            'frecuencia_riego_dias': 7
+        })['id'] for i in range(3)]
+        planta_manager._cache.clear()
+        planta_manager.get_by_id(ids[1])
+
+        plantas = planta_manager.get_many([ids[2], 999, ids[0], ids[1]])
+        assert [p['id'] for p in plantas] == [ids[2], ids[0], ids[1]]
+
+    def test_proyeccion_de_campos(self, planta_manager):
+        """Test: fields limita las columnas, también en lecturas desde caché"""
+        creada = planta_manager.create({
+            'nombre': 'Ficus', 'tipo': 'Interior', 'ubicacion': 'Sala', 'frecuencia_riego_dias': 5
+        })
+        campos = ['nombre', 'frecuencia_riego_dias']
+        esperado = {'id': creada['id'], 'nombre': 'Ficus', 'frecuencia_riego_dias': 5}
+
+        assert planta_manager.get_all(fields=campos) == [esperado]
+        assert list(planta_manager.iter_all(fields=campos)) == [esperado]
+        assert planta_manager.get_by_id(creada['id'], fields=campos) == esperado
+        assert planta_manager.get_many([creada['id']], fields=campos) == [esperado]
+        # La proyección no altera la fila completa guardada en caché
+        assert planta_manager.get_by_id(creada['id']) == creada
+
+        with pytest.raises(ValueError):
+            planta_manager.get_all(fields=['nombre', 'id; DROP TABLE plantas'])
+
+class TestFiltrosPlantas:
+    """Pruebas para el filtrado y orden del listado en SQL"""
+
+    @pytest.fixture
+    def catalogo(self, planta_manager):
+        for nombre, tipo, ubicacion, frecuencia in [
+            ('Monstera', 'Interior', 'Sala', 7),
+            ('Menta', 'Exterior', 'Huerta', 2),
+            ('Mandevilla', 'Exterior', 'Balcón', 3),
+            ('Potus', 'Interior', 'Cocina', 4),
+            ('Mostaza', 'Exterior', 'Huerta', 3),
+        ]:
+            planta_manager.create({'nombre': nombre, 'tipo': tipo, 'ubicacion': ubicacion,
+                                   'frecuencia_riego_dias': frecuencia})
+        return planta_manager
+
+    def test_filtros(self, catalogo):
+        """Test: tipo/ubicacion exactos, nombre por prefijo y rango de frecuencia"""
+        nombres = lambda filtros: [p['nombre'] for p in catalogo.get_all(filtros=filtros)]
+        assert nombres({'tipo': 'Interior'}) == ['Monstera', 'Potus']
+        assert nombres({'tipo': 'Exterior', 'ubicacion': 'Huerta'}) == ['Menta', 'Mostaza']
+        assert nombres({'nombre': 'Mo'}) == ['Monstera', 'Mostaza']
+        assert nombres({'frecuencia_min': 3, 'frecuencia_max': 4}) == ['Mandevilla', 'Potus', 'Mostaza']
+        assert nombres({'nombre': 'mo'}) == []
+
+    def test_orden_con_cursor(self, catalogo):
+        """Test: Recorrer por páginas un orden distinto del id usando el id como cursor"""
+        for sort in ('nombre', '-nombre', 'frecuencia_riego_dias', '-frecuencia_riego_dias', '-id'):
+            completo = catalogo.get_all(sort=sort)
+            vistos, after_id = [], 0
+            while True:
+                pagina = catalogo.get_all(after_id, 2, sort=sort)
+                vistos.extend(pagina)
+                if len(pagina) < 2:
+                    break
+                after_id = pagina[-1]['id']
+            assert vistos == completo
+            columna = sort.lstrip('-')
+            claves = [(p[columna], p['id']) for p in completo]
+            assert claves == sorted(claves, reverse=sort.startswith('-'))
+
+    def test_cursor_de_fila_eliminada(self, catalogo):
+        """Test: Con el valor en el cursor se sigue paginando aunque la fila del cursor se borre"""
+        primera = catalogo.get_all(limit=2, sort='nombre')
+        assert [p['nombre'] for p in primera] == ['Mandevilla', 'Menta']
+        cursor = codificar_cursor(primera[-1], 'nombre')
+        catalogo.delete(primera[-1]['id'])
+
+        after_id, after_valor = decodificar_cursor(cursor, 'nombre')
+        assert (after_id, after_valor) == (primera[-1]['id'], 'Menta')
+        resto = catalogo.get_all(after_id, sort='nombre', after_valor=after_valor)
+        assert [p['nombre'] for p in resto] == ['Monstera', 'Mostaza', 'Potus']
+        # Un cursor que solo trae el id de una fila borrada no puede continuar en silencio
+        with pytest.raises(ValueError):
+            catalogo.get_all(after_id, sort='nombre')
+        for invalido, sort in (('no-es-un-token', 'nombre'), (cursor, 'tipo'), (cursor, '-frecuencia_riego_dias')):
+            with pytest.raises(ValueError):
+                decodificar_cursor(invalido, sort)
+
+    def test_usa_indices(self, catalogo):
+        """Test: Los filtros y órdenes se resuelven con índices"""
+        sql, params = catalogo._consulta_listado(3, 10, None, {'nombre': 'M'}, 'nombre')
+        with catalogo._get_conn() as conn:
+            plan = ' '.join(r[-1] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        assert 'idx_plantas_nombre' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_parametros_invalidos(self, catalogo):
+        """Test: Filtros y órdenes desconocidos se rechazan"""
+        with pytest.raises(ValueError):
+            catalogo.get_all(filtros={'notas': 'x'})
+        with pytest.raises(ValueError):
+            catalogo.get_all(sort='fecha_creacion; DROP TABLE plantas')
+
+class TestImportacion:
+    """Pruebas para la importación masiva de plantas"""
+
+    def test_flujo_de_texto_sin_interfaz_io(self):
+        """Test: El cuerpo se lee aunque el stream solo tenga read(n), como wsgi.input de gunicorn"""
+        class SoloRead:
+            def __init__(self, data):
+                self._data = io.BytesIO(data)
+
+            def read(self, size=-1):
+                return self._data.read(size)
+
+        texto = '{"nombre": "Ñandú"}\n{"nombre": "B"}\n'
+        assert list(flujo_de_texto(SoloRead(texto.encode('utf-8')))) == texto.splitlines(keepends=True)
+
+    def test_importar_ndjson_por_lotes(self, planta_manager):
+        """Test: Importar NDJSON en varias transacciones con reporte de errores"""
+        lineas = [
+            '{"nombre": "A", "tipo": "Interior", "ubicacion": "Sala", "frecuencia_riego_dias": 7}',
+            '',
+            '{"nombre": "B", "tipo": "Exterior", "ubicacion": "Patio", "frecuencia_riego_dias": 0}',
+            'no es json',
+            '{"nombre": "C", "tipo": "Exterior", "ubicacion": "Patio", "frecuencia_riego_dias": 3}',
+            '{"nombre": "D", "tipo": "Interior", "ubicacion": "Baño"}',
+            '{"nombre": "E", "tipo": "Interior", "ubicacion": "Cocina", "frecuencia_riego_dias": 5}',
+        ]
+        avances = []
+        reporte = importar_plantas(planta_manager, leer_registros(iter(lineas), 'ndjson'),
+                                   chunk_size=2, progreso=lambda r: avances.append(r['importadas']))
+
+        assert reporte['total'] == 6
+        assert reporte['importadas'] == 3
+        assert reporte['rechazadas'] == 3
+        assert reporte['lotes'] == 2
+        assert avances == [2, 3]
+        assert [e['linea'] for e in reporte['errores']] == [3, 4, 6]
+        assert [p['nombre'] for p in planta_manager.get_all()] == ['A', 'C', 'E']
+
+    def test_tipos_invalidos_se_rechazan(self, planta_manager):
+        """Test: null, listas, objetos y booleanos van a errores sin abortar la importación"""
+        base = {'nombre': 'A', 'tipo': 'Interior', 'ubicacion': 'Sala', 'frecuencia_riego_dias': 7}
+        invalidos = [{'nombre': None}, {'tipo': {'x': 1}}, {'ubicacion': ['Sala']},
+                     {'nombre': '  '}, {'frecuencia_riego_dias': True}, {'frecuencia_riego_dias': 7.5}]
+        lineas = [json.dumps(dict(base, **cambio)) for cambio in invalidos] + [json.dumps(base)]
+        reporte = importar_plantas(planta_manager, leer_registros(iter(lineas), 'ndjson'), chunk_size=2)
+
+        assert reporte['importadas'] == 1
+        assert [e['linea'] for e in reporte['errores']] == [1, 2, 3, 4, 5, 6]
+        assert reporte['errores'][0]['message'] == 'nombre debe ser un texto no vacío'
+        assert [p['nombre'] for p in planta_manager.get_all()] == ['A']
+
+    def test_importar_csv(self, planta_manager):
+        """Test: Importar CSV convirtiendo la frecuencia a entero"""
+        contenido = io.StringIO(
+            'nombre,tipo,ubicacion,frecuencia_riego_dias\n'
+            'Lavanda,Exterior,Jardín,4\n'
+            'Aloe,Interior,Ventana,abc\n'
+        )
+        reporte = importar_plantas(planta_manager, leer_registros(contenido, 'csv'))
+
+        assert reporte['importadas'] == 1
+        assert reporte['errores'][0]['linea'] == 3
+        plantas = planta_manager.get_all()
+        assert plantas[0]['frecuencia_riego_dias'] == 4
+
+    def test_valores_fuera_de_rango_y_no_utf8(self, planta_manager):
+        """Test: Frecuencias no convertibles o de más de 64 bits y bytes no UTF-8 van a errores"""
+        cuerpo = ('nombre,tipo,ubicacion,frecuencia_riego_dias\n'
+                  'Lavanda,Exterior,Jardín,²\n'
+                  'Aloe,Interior,Ventana,100000000000000000000000\n').encode('utf-8')
+        cuerpo += b'Ruda,Exterior,Jard\xedn,3\nSalvia,Exterior,Huerta,4\n'
+        reporte = importar_plantas(planta_manager, leer_registros(flujo_de_texto(io.BytesIO(cuerpo)), 'csv'))
+        assert reporte['importadas'] == 1
+        assert [e['linea'] for e in reporte['errores']] == [2, 3, 4]
+        assert reporte['errores'][2]['message'] == 'ubicacion no es texto UTF-8 válido'
+
+        base = {'nombre': 'A', 'tipo': 'Interior', 'ubicacion': 'Sala'}
+        cuerpo = (json.dumps(dict(base, frecuencia_riego_dias=10 ** 23)).encode('utf-8') + b'\n'
+                  + b'{"nombre": "\xff", "tipo": "Interior", "ubicacion": "Sala", "frecuencia_riego_dias": 7}\n'
+                  + json.dumps(dict(base, frecuencia_riego_dias=7)).encode('utf-8') + b'\n')
+        reporte = importar_plantas(planta_manager, leer_registros(flujo_de_texto(io.BytesIO(cuerpo)), 'ndjson'))
+        assert reporte['importadas'] == 1
+        assert [e['linea'] for e in reporte['errores']] == [1, 2]
+        assert [p['nombre'] for p in planta_manager.get_all()] == ['Salvia', 'A']
+
+class TestConnectionPool:
+    """Pruebas para el pool de conexiones SQLite"""
+
+    def test_reutiliza_conexiones(self, planta_manager):
+        """Test: Las operaciones reutilizan la misma conexión"""
+        planta = planta_manager.create({
+            'nombre': 'Helecho',
+            'tipo': 'Interior',
+            'ubicacion': 'Baño',
+            'frecuencia_riego_dias': 3
+        })
+        planta_manager.update(planta['id'], {'ubicacion': 'Patio'})
+        planta_manager.get_all()
+
+        stats = planta_manager.pool_stats()
+        assert stats['created'] == 1
+        assert stats['reused'] >= 3
+        assert stats['in_use'] == 0
+
+    def test_pragmas_configurados(self, planta_manager):
+        """Test: Las conexiones usan WAL y busy_timeout"""
+        with planta_manager._get_conn() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+
+    def test_pool_acotado(self, tmp_path):
+        """Test: El pool no supera su tamaño máximo"""
+        pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        with pytest.raises(PoolTimeout):
+            pool.acquire()
+        pool.release(conn)
+        assert pool.acquire() is conn
+        assert pool.stats()['timeouts'] == 1
+
+    def test_conexiones_no_se_heredan_tras_fork(self, tmp_path):
+        """Test: En un proceso hijo el pool descarta las conexiones del padre"""
+        pool = ConnectionPool(str(tmp_path / 'fork.db'), max_size=1)
+        heredada = pool.acquire()
+        pool.release(heredada)
+
+        pool._pid = -1  # Simula estar en un proceso distinto al que abrió las conexiones
+        nueva = pool.acquire()
+        assert nueva is not heredada
+        assert pool.stats()['size'] == 1
+
+    def test_migraciones_idempotentes(self, planta_manager):
+        """Test: Volver a abrir la base no reaplica migraciones"""
+        with planta_manager._get_conn() as conn:
+            version = schema_version(conn)
+            assert migrate(conn, MIGRATIONS) == version
+        assert version == MIGRATIONS[-1][0]
+
+    def test_actualizar_planta_inexistente(self, planta_manager):
+        """Test: Actualizar una planta que no existe devuelve None"""
+        assert planta_manager.update(9999, {'nombre': 'Nada'}) is None
+        assert planta_manager.update(9999, {}) is None
+
+class TestCompresion:
+    """Pruebas para la compresión negociada de respuestas"""
+
+    @pytest.fixture(autouse=True)
+    def catalogo(self, client):
+        if client.get('/api/plantas?limit=50').get_json()['count'] < 50:
+            client.post('/api/plantas/import?format=ndjson', data='\n'.join(json.dumps({
+                'nombre': f'Comprimible {i}', 'tipo': 'Interior', 'ubicacion': 'Sala',
+                'frecuencia_riego_dias': 7
+            }) for i in range(50)))
+
+    def test_gzip_en_listados(self, client):
+        """Test: Accept-Encoding: gzip comprime el listado y conserva el JSON"""
+        plano = client.get('/api/plantas?limit=50')
+        response = client.get('/api/plantas?limit=50', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert len(response.data) < len(plano.data)
+        assert json.loads(gzip.decompress(response.data)) == plano.get_json()
+        assert 'Content-Encoding' not in plano.headers
+
+    def test_respuestas_pequenas_sin_comprimir(self, client):
+        """Test: Por debajo de COMPRESS_MIN_SIZE no se comprime"""
+        response = client.get('/api/plantas?limit=1', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        response = client.get('/api/plantas?limit=50', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_gzip_en_streaming(self, client):
+        """Test: Las respuestas en streaming se comprimen bloque a bloque"""
+        response = client.get('/api/plantas?stream=1', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        data = json.loads(gzip.decompress(response.data))
+        assert data['count'] == len(data['data']) >= 50
+
+    def test_etag_debil_y_304(self, client):
+        """Test: La variante comprimida usa ETag débil y sigue validando con 304"""
+        response = client.get('/api/plantas?limit=50', headers={'Accept-Encoding': 'gzip'})
+        etag = response.headers['ETag']
+        assert etag.startswith('W/')
+        response = client.get('/api/plantas?limit=50', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 304
+
+class TestMetricas:
+    """Pruebas para las métricas de /metrics"""
+
+    def test_contadores_por_hilo(self):
+        """Test: Los fragmentos de cada hilo se suman al exportar"""
+        registry = MetricsRegistry()
+        registry.counter('eventos_total', 'Eventos')
+        registry.histogram('espera_seconds', 'Espera', (0.1, 1.0))
+
+        def trabajo():
+            for _ in range(1000):
+                registry.inc('eventos_total', (('origen', 'hilo'),))
+            registry.observe('espera_seconds', (), 0.5)
+
+        hilos = [threading.Thread(target=trabajo) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        texto = registry.render()
+        assert 'eventos_total{origen="hilo"} 4000' in texto
+        assert 'espera_seconds_bucket{le="0.1"} 0' in texto
+        assert 'espera_seconds_bucket{le="1.0"} 4' in texto
+        assert 'espera_seconds_bucket{le="+Inf"} 4' in texto
+        assert 'espera_seconds_count 4' in texto
+
+    def test_suma_entre_procesos(self, tmp_path):
+        """Test: Con un directorio compartido se suman los workers vivos y los retirados"""
+        import multiprocessing
+        from metrics import retirar_proceso
+
+        def registro():
+            registry = MetricsRegistry(str(tmp_path))
+            registry.counter('eventos_total', 'Eventos')
+            registry.histogram('espera_seconds', 'Espera', (0.1, 1.0))
+            registry.gauge('en_curso', 'En curso')
+            return registry
+
+        ctx = multiprocessing.get_context('fork')
+        volcado, salir = ctx.Event(), ctx.Event()
+
+        def worker():
+            registry = registro()
+            registry.inc('eventos_total', value=3)
+            registry.observe('espera_seconds', (), 0.5)
+            registry.inc('en_curso')
+            registry.volcar()
+            volcado.set()
+            salir.wait(10)
+
+        hijo = ctx.Process(target=worker)
+        hijo.start()
+        assert volcado.wait(10)
+        propio = registro()
+        propio.inc('eventos_total')
+        propio.inc('en_curso')
+        texto = propio.render()
+        assert 'eventos_total 4' in texto
+        assert 'espera_seconds_count 1' in texto
+        assert 'en_curso 2' in texto
+
+        salir.set()
+        hijo.join()
+        # Un worker terminado sigue sumando sus contadores, pero no sus gauges
+        assert 'en_curso 1' in propio.render()
+        retirar_proceso(str(tmp_path), hijo.pid)
+        assert not (tmp_path / f'{hijo.pid}.json').exists()
+        texto = propio.render()
+        assert 'eventos_total 4' in texto
+        assert 'espera_seconds_count 1' in texto
+
+    def test_hilos_cortos_no_acumulan_fragmentos(self):
+        """Test: Con un hilo por petición los fragmentos de hilos terminados se suman y se descartan"""
+        registry = MetricsRegistry()
+        registry.counter('eventos_total', 'Eventos')
+        registry.histogram('espera_seconds', 'Espera', (0.1, 1.0))
+
+        def peticion():
+            registry.inc('eventos_total')
+            registry.observe('espera_seconds', (), 0.05)
+
+        for i in range(300):
+            hilo = threading.Thread(target=peticion)
+            hilo.start()
+            hilo.join()
+            if i == 150:
+                assert 'eventos_total 151' in registry.render()
+
+        assert registry.fragmentos() <= 2
+        texto = registry.render()
+        assert 'eventos_total 300' in texto
+        assert 'espera_seconds_bucket{le="0.1"} 300' in texto
+        assert 'espera_seconds_count 300' in texto
+
+    def test_instrumentar_gestor(self, planta_manager):
+        """Test: Cada método público del gestor cuenta llamadas, incluidos los generadores"""
+        registry = MetricsRegistry()
+        instrument_manager(planta_manager, registry)
+        planta_manager.get_all()
+        planta_manager.get_all()
+        list(planta_manager.iter_all())
+
+        texto = registry.render()
+        assert 'sqlite_queries_total{manager="PlantaManager",method="get_all"} 2' in texto
+        assert 'sqlite_queries_total{manager="PlantaManager",method="iter_all"} 1' in texto
+        assert 'pool_stats' not in texto
+
+    def test_endpoint_metrics(self, client):
+        """Test: GET /metrics en formato de texto de Prometheus"""
+        client.get('/api/plantas?limit=1')
+        client.get('/api/plantas/999999')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        texto = response.get_data(as_text=True)
+        assert '# TYPE http_request_duration_seconds histogram' in texto
+        assert 'route="/api/plantas/<int:planta_id>",status="404"' in texto
+        assert 'http_requests_in_flight 1' in texto
+        assert 'method="get_by_id"' in texto
+        assert 'sqlite_db_size_bytes{file="db"}' in texto
+
+class TestQueryStats:
+    """Pruebas para las estadísticas por sentencia y el log de consultas lentas"""
+
+    def test_normalizar_sql(self):
+        """Test: Espacios y listas de parámetros se normalizan; los valores no se exponen"""
+        assert normalizar_sql('SELECT *\n  FROM plantas WHERE id IN (?, ?,?)') == \
+            'SELECT * FROM plantas WHERE id IN (?...)'
+        assert forma_parametros((1, 'x', None)) == '(int, str, NoneType)'
+        assert forma_parametros(list(range(20))) == '(20 parámetros)'
+
+    def test_registrar_consultas_lentas(self, planta_manager, monkeypatch):
+        """Test: Cada sentencia se acumula con sus filas y las lentas guardan su plan"""
+        for i in range(3):
+            planta_manager.create({
+                'nombre': f'Planta {i}',
+                'tipo': 'Interior',
+                'ubicacion': 'Sala',
+                'frecuencia_riego_dias': 3
+            })
+        query_stats.reset()
+        monkeypatch.setattr(query_stats, 'slow_ms', 0)
+        planta_manager.get_all(filtros={'tipo': 'Interior'})
+
+        snapshot = query_stats.snapshot()
+        select = [s for s in snapshot['statements'] if 'WHERE tipo = ?' in s['sql']]
+        assert select and select[0]['count'] == 1 and select[0]['rows'] == 3
+        lenta = [q for q in snapshot['slow_queries'] if 'WHERE tipo = ?' in q['sql']][0]
+        assert lenta['params'].startswith('(str')
+        assert any('idx_plantas_tipo' in paso for paso in lenta['plan'])
+        assert 'Interior' not in json.dumps(lenta)
+
+        query_stats.reset()
+        assert query_stats.snapshot()['statements'] == []
+
+    def test_endpoint_admin_queries(self, client, monkeypatch):
+        """Test: /admin/queries solo existe con ADMIN_TOKEN y exige la cabecera"""
+        monkeypatch.setattr(admin, 'ADMIN_TOKEN', None)
+        assert client.get('/admin/queries').status_code == 404
+
+        monkeypatch.setattr(admin, 'ADMIN_TOKEN', 'secreto')
+        assert client.get('/admin/queries').status_code == 401
+        assert client.get('/admin/queries', headers={'X-Admin-Token': 'otro'}).status_code == 401
+
+        client.get('/api/plantas?limit=1')
+        headers = {'X-Admin-Token': 'secreto'}
+        response = client.get('/admin/queries?order_by=count&limit=5', headers=headers)
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['enabled'] is True and 0 < len(data['statements']) <= 5
+        assert client.get('/admin/queries?order_by=sql', headers=headers).status_code == 400
+
+        assert client.delete('/admin/queries', headers=headers).status_code == 200
+        data = client.get('/admin/queries', headers=headers).get_json()['data']
+        assert data['slow_queries'] == []
+
+class TestPerfilado:
+    """Pruebas para el perfilado bajo demanda de CPU y memoria"""
+
+    @pytest.fixture
+    def admin_headers(self, monkeypatch):
+        monkeypatch.setattr(admin, 'ADMIN_TOKEN', 'secreto')
+        return {'X-Admin-Token': 'secreto'}
+
+    def test_validar_sesion(self):
+        """Test: Parámetros inválidos y sesiones simultáneas se rechazan"""
+        profiler = CpuProfiler()
+        with pytest.raises(ValueError):
+            profiler.start(mode='perf')
+        with pytest.raises(ValueError):
+            profiler.start(seconds=0)
+        profiler.start(seconds=60)
+        with pytest.raises(ProfilingError):
+            profiler.resultado()
+        with pytest.raises(ProfilingError):
+            profiler.start(seconds=60)
+        profiler.stop()
+
+    def test_sesion_compartida_entre_workers(self, tmp_path):
+        """Test: Con un directorio compartido otro worker consulta, detiene y descarga la sesión"""
+        dueno, otro = CpuProfiler(str(tmp_path)), CpuProfiler(str(tmp_path))
+        sesion = dueno.start(requests=1)['session']
+        estado = otro.status()
+        assert estado['active'] and estado['session']['id'] == sesion['id']
+        with pytest.raises(ProfilingError):
+            otro.start(seconds=60)
+        with pytest.raises(ProfilingError):
+            otro.resultado()
+
+        with app.test_request_context('/api/plantas'):
+            token = dueno.iniciar_peticion()
+            sum(range(1000))
+            dueno.terminar_peticion(token)
+        estado = otro.status()
+        assert estado['active'] is False
+        assert estado['session']['requests_profiled'] == 1
+        contenido, _, extension = otro.resultado('text')
+        assert extension == 'txt' and b'function calls' in contenido
+
+        # Detener desde otro worker: el dueño lo nota y guarda la sesión
+        dueno.start(seconds=60)
+        assert otro.stop()['active'] is False
+        assert dueno.status()['active'] is False
+        with pytest.raises(ProfilingError):
+            otro.resultado()  # sin peticiones perfiladas
+
+    def test_cprofile_por_peticiones(self, client, admin_headers):
+        """Test: La sesión termina tras N peticiones y se descarga como pstats"""
+        assert client.post('/admin/profile/cpu').status_code == 401
+        response = client.post('/admin/profile/cpu?mode=cprofile&requests=2', headers=admin_headers)
+        assert response.status_code == 202
+        assert client.post('/admin/profile/cpu', headers=admin_headers).status_code == 409
+
+        client.get('/health')  # excluida: no cuenta para la sesión
+        client.get('/api/plantas?limit=5')
+        assert client.get('/admin/profile/cpu', headers=admin_headers).get_json()['data']['active']
+        client.get('/api/plantas/999999')
+
+        estado = client.get('/admin/profile/cpu', headers=admin_headers).get_json()['data']
+        assert estado['active'] is False
+        assert estado['session']['requests_profiled'] == 2
+
+        response = client.get('/admin/profile/cpu/download', headers=admin_headers)
+        assert response.status_code == 200
+        assert 'plantas-service-cpu.pstats' in response.headers['Content-Disposition']
+        stats = marshal.loads(response.data)
+        assert any(funcion == 'get_plantas' for _, _, funcion in stats)
+
+        texto = client.get('/admin/profile/cpu/download?format=text&sort=tottime&limit=5',
+                           headers=admin_headers).get_data(as_text=True)
+        assert 'function calls' in texto
+        assert client.get('/admin/profile/cpu/download?sort=x', headers=admin_headers).status_code == 400
+
+    def test_muestreo_por_tiempo(self, client, admin_headers):
+        """Test: El muestreo genera pilas en formato folded"""
+        response = client.post('/admin/profile/cpu?mode=sample&seconds=0.2&interval_ms=1',
+                               headers=admin_headers)
+        assert response.status_code == 202
+        time.sleep(0.3)
+        response = client.get('/admin/profile/cpu/download', headers=admin_headers)
+        assert response.status_code == 200
+        lineas = response.get_data(as_text=True).splitlines()
+        assert lineas and all(linea.rsplit(' ', 1)[1].isdigit() for linea in lineas)
+
+    def test_memoria(self, client, admin_headers):
+        """Test: tracemalloc con instantánea base, diferencias y descarga"""
+        try:
+            response = client.post('/admin/profile/memory?frames=2', headers=admin_headers)
+            assert response.status_code == 200
+            assert response.get_json()['data']['tracing'] is True
+            retenidos = [bytearray(1000) for _ in range(200)]
+
+            data = client.get('/admin/profile/memory?diff=1&limit=5',
+                              headers=admin_headers).get_json()['data']
+            assert len(data['top']) <= 5
+            assert any('test_plantas.py' in linea
+                       for stat in data['top'] for linea in stat['traceback'])
+            assert client.get('/admin/profile/memory?group_by=x',
+                              headers=admin_headers).status_code == 400
+
+            response = client.get('/admin/profile/memory/download', headers=admin_headers)
+            assert isinstance(pickle.loads(response.data), tracemalloc.Snapshot)
+            del retenidos
+        finally:
+            data = client.delete('/admin/profile/memory', headers=admin_headers).get_json()['data']
+        assert data['tracing'] is False
+        assert client.get('/admin/profile/memory', headers=admin_headers).status_code == 409
+
+class TestBenchmarks:
+    """Pruebas para la suite de microbenchmarks"""
+
+    def test_comparar_con_linea_base(self):
+        """Test: Solo se marcan los aumentos por encima de la tolerancia y del ruido mínimo"""
+        base = {'results': {'1000': {
+            'get_by_id': {'p50_us': 100.0, 'peak_kb': 10.0},
+            'create': {'p50_us': 2.0, 'peak_kb': 1.0},
+        }}}
+        actual = {'results': {'1000': {
+            'get_by_id': {'p50_us': 140.0, 'peak_kb': 11.0},
+            'create': {'p50_us': 4.0, 'peak_kb': 1.0},
+            'update': {'p50_us': 50.0, 'peak_kb': 1.0},
+        }}}
+        regresiones = comparar(actual, base, threshold=0.25)
+        assert [(r['benchmark'], r['metric']) for r in regresiones] == [('get_by_id', 'p50_us')]
+        assert regresiones[0]['change'] == 0.4
+        assert comparar(actual, None) == []
+
+    def test_ejecutar_suite(self, tmp_path, capsys):
+        """Test: La suite siembra, mide, guarda la línea base y se compara con ella"""
+        baseline = str(tmp_path / 'baseline.json')
+        argv = ['--sizes', '200', '--ops', '20', '--baseline', baseline, '--data-dir', str(tmp_path)]
+        assert bench_plantas.main('bench', 'plantas', bench_plantas.sembrar, bench_plantas.abrir,
+                                  bench_plantas.crear_benchmarks, argv + ['--save-baseline']) == 0
+        with open(baseline, encoding='utf-8') as f:
+            resultados = json.load(f)['results']['200']
+        assert set(resultados) >= {'get_by_id', 'get_all_page', 'create', 'update'}
+        assert resultados['create']['ops'] == 20
+        assert resultados['get_all_page']['peak_kb'] > 0
+        # Un acierto de caché no toca la base: es más rápido que la misma lectura sin caché
+        assert resultados['get_by_id_cache_hit']['p50_us'] < resultados['get_by_id_uncached']['p50_us']
+
+        # Segunda corrida: reutiliza la base sembrada y compara (tolerancia amplia para no depender del ruido)
+        capsys.readouterr()
+        bench_plantas.main('bench', 'plantas', bench_plantas.sembrar, bench_plantas.abrir,
+                           bench_plantas.crear_benchmarks, argv + ['--threshold', '100'])
+        salida = capsys.readouterr()
+        assert 'base sembrada' not in salida.err
+        assert 'get_all_filtered' in salida.out and 'Sin línea base' not in salida.out
+
+class TestSiembra:
+    """Pruebas para la siembra masiva de datos sintéticos"""
+
+    def test_sembrar_plantas(self, tmp_path):
+        """Test: La siembra respeta las distribuciones y restaura índices, triggers y WAL"""
+        ruta = str(tmp_path / 'siembra.db')
+        reporte = seed.sembrar_plantas(ruta, 2000, random.Random(1),
+                                       tipos='Interior:3,Huerta:1', frecuencias='7')
+        assert reporte['plantas'] == 2000 and reporte['primer_id'] == 1
+        # Una segunda siembra agrega a continuación
+        assert seed.sembrar_plantas(ruta, 10, random.Random(2))['primer_id'] == 2001
+
+        conn = sqlite3.connect(ruta)
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        tipos = dict(conn.execute('SELECT tipo, COUNT(*) FROM plantas WHERE id <= 2000 GROUP BY tipo'))
+        assert set(tipos) == {'Interior', 'Huerta'} and tipos['Interior'] > 2 * tipos['Huerta']
+        assert conn.execute('SELECT DISTINCT frecuencia_riego_dias FROM plantas WHERE id <= 2000').fetchall() == [(7,)]
+        fechas = [r[0] for r in conn.execute('SELECT fecha_creacion FROM plantas WHERE id <= 2000 ORDER BY id')]
+        assert fechas == sorted(fechas)
+        nombres = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'plantas'")}
+        assert {'idx_plantas_nombre', 'idx_plantas_tipo_ubicacion', 'plantas_version_insert'} <= nombres
+        conn.close()
+
+        pm = PlantaManager(db_path=ruta, cache_size=0)
+        assert pm.get_version('plantas')[0] == 2
+        assert len(pm.get_all(limit=50, filtros={'tipo': 'Huerta'})) == 50
+        pm._pool.close()
+
+    def test_distribucion_invalida(self):
+        """Test: Distribuciones mal escritas o frecuencias no positivas se rechazan"""
+        assert seed.distribucion('Interior:2,Exterior') == (['Interior', 'Exterior'], [2.0, 1.0])
+        for texto in ('Interior:x', 'Interior:-1', 'Interior:0'):
+            with pytest.raises(ValueError):
+                seed.distribucion(texto)
+        with pytest.raises(ValueError):
+            seed.generar_plantas(10, random.Random(1), frecuencias='0:1')
+
 class TestPlantasAPI:
     """Pruebas para los endpoints de la API"""
 
@@ -116,6 +905,16 @@ class TestPlantasAPI:
         assert data['status'] == 'healthy'
         assert data['service'] == 'plantas-service'
 
+    def test_create_app_estado_propio(self):
+        """Test: Cada create_app() arma su propio gestor, registro de métricas y perfilador"""
+        otra = create_app({'TESTING': True})
+        for nombre in ('planta_manager', 'metrics', 'cpu_profiler'):
+            assert otra.extensions[nombre] is not app.extensions[nombre]
+        otra.test_client().get('/api/plantas/999999')
+        serie = 'route="/api/plantas/<int:planta_id>",status="404"'
+        assert serie in otra.extensions['metrics'].render()
+        assert serie not in create_app().extensions['metrics'].render()
+
     def test_get_plantas_vacio(self, client):
         """Test: Obtener plantas cuando la lista está vacía"""
         response = client.get('/api/plantas')
@@ -193,6 +992,18 @@ class TestPlantasAPI:
         assert data['data']['ubicacion'] == 'Balcón'
         assert data['data']['frecuencia_riego_dias'] == 28
 
+    def test_actualizar_planta_eliminada_en_paralelo(self, client, monkeypatch):
+        """Test: Si la planta se elimina entre la validación y el UPDATE se responde 404"""
+        create_response = client.post('/api/plantas', json={
+            'nombre': 'Helecho', 'tipo': 'Interior', 'ubicacion': 'Baño', 'frecuencia_riego_dias': 3
+        })
+        planta_id = create_response.get_json()['data']['id']
+        monkeypatch.setattr(app.extensions['planta_manager'], 'update', lambda *args: None)
+
+        response = client.put(f'/api/plantas/{planta_id}', json={'ubicacion': 'Sala'})
+        assert response.status_code == 404
+        assert response.get_json()['success'] is False
+
     def test_eliminar_planta(self, client):
         """Test: Eliminar planta"""
         # Crear planta
@@ -222,6 +1033,252 @@ class TestPlantasAPI:
         data = response.get_json()
         assert data['success'] is False
 
+    def test_paginacion_por_cursor(self, client):
+        """Test: Recorrer el listado de plantas con after_id/limit"""
+        for i in range(3):
+            client.post('/api/plantas', json={
+                'nombre': f'Paginada {i}',
+                'tipo': 'Interior',
+                'ubicacion': 'Sala',
+                'frecuencia_riego_dias': 7
+            })
+
+        vistos = []
+        after_id = 0
+        while True:
+            response = client.get(f'/api/plantas?after_id={after_id}&limit=2')
+            assert response.status_code == 200
+            data = response.get_json()
+            assert data['count'] <= 2
+            vistos.extend(p['id'] for p in data['data'])
+            if data['next_cursor'] is None:
+                break
+            after_id = data['next_cursor']
+
+        assert vistos == sorted(vistos)
+        assert len(vistos) == len(set(vistos))
+        assert len(vistos) >= 3
+
+    def test_paginacion_parametros_invalidos(self, client):
+        """Test: limit fuera de rango o no numérico"""
+        assert client.get('/api/plantas?limit=0').status_code == 400
+        assert client.get('/api/plantas?limit=abc').status_code == 400
+        assert client.get('/api/plantas?after_id=-1').status_code == 400
+
+    def test_enteros_fuera_de_rango(self, client):
+        """Test: after_id y limit que no caben en 64 bits responden 400, también en streaming"""
+        enorme = 2 ** 70
+        token = codificar_cursor({'id': enorme, 'frecuencia_riego_dias': 7}, 'frecuencia_riego_dias')
+        for url in (f'/api/plantas?after_id={enorme}', f'/api/plantas?after_id={enorme}&stream=1',
+                    f'/api/plantas?stream=1&limit={enorme}', f'/api/plantas?sort=frecuencia_riego_dias&after_id={token}',
+                    '/api/plantas?after_id=%C2%B2'):
+            response = client.get(url)
+            assert response.status_code == 400, url
+            assert response.get_json()['success'] is False
+        assert client.get(f'/api/plantas?stream=1&limit={2 ** 63 - 1}').status_code == 200
+
+    def test_importar_plantas_endpoint(self, client):
+        """Test: POST /api/plantas/import con cuerpo CSV"""
+        cuerpo = ('nombre,tipo,ubicacion,frecuencia_riego_dias\n'
+                  'Romero,Exterior,Huerta,5\n'
+                  'Menta,Exterior,Huerta,2\n')
+        response = client.post('/api/plantas/import?format=csv', data=cuerpo,
+                               content_type='text/csv')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['success'] is True
+        assert data['data']['importadas'] == 2
+        assert data['data']['rechazadas'] == 0
+
+        # Un cuerpo que no es UTF-8 no aborta la importación a mitad de camino
+        cuerpo = b'nombre,tipo,ubicacion,frecuencia_riego_dias\nRuda,Exterior,Huerta,3\n\xff\xfe,Interior,Sala,4\n'
+        response = client.post('/api/plantas/import?format=csv&chunk_size=1', data=cuerpo,
+                               content_type='text/csv')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['importadas'] == 1
+        assert data['errores'] == [{'linea': 3, 'message': 'nombre no es texto UTF-8 válido'}]
+
+    def test_get_condicional_plantas(self, client):
+        """Test: If-None-Match devuelve 304 hasta que cambian las plantas"""
+        response = client.get('/api/plantas?limit=5')
+        etag = response.headers['ETag']
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+        response = client.get('/api/plantas?limit=5', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+        # Otra página no comparte ETag
+        otra = client.get('/api/plantas?limit=6', headers={'If-None-Match': etag})
+        assert otra.status_code == 200
+
+        client.post('/api/plantas', json={
+            'nombre': 'Nueva',
+            'tipo': 'Interior',
+            'ubicacion': 'Sala',
+            'frecuencia_riego_dias': 7
+        })
+        response = client.get('/api/plantas?limit=5', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert 'Last-Modified' in response.headers
+
+    def test_plantas_existentes(self, client):
+        """Test: Consultar en lote qué ids existen"""
+        planta_id = client.post('/api/plantas', json={
+            'nombre': 'Existente',
+            'tipo': 'Interior',
+            'ubicacion': 'Sala',
+            'frecuencia_riego_dias': 7
+        }).get_json()['data']['id']
+
+        response = client.get(f'/api/plantas/existentes?ids={planta_id},99999')
+        assert response.status_code == 200
+        assert response.get_json()['data']['existentes'] == [planta_id]
+
+        assert client.get('/api/plantas/existentes?ids=a,b').status_code == 400
+        # Un id fuera del rango de SQLite es un 400 con el JSON habitual, no un 500
+        response = client.get(f'/api/plantas/existentes?ids={planta_id},{2 ** 70}')
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+        assert client.get('/api/plantas/existentes').status_code == 400
+
+    def test_obtener_varias_plantas_por_ids(self, client):
+        """Test: GET /api/plantas?ids=1,2,3"""
+        ids = [client.post('/api/plantas', json={
+            'nombre': nombre,
+            'tipo': 'Exterior',
+            'ubicacion': 'Jardín',
+            'frecuencia_riego_dias': 3
+        }).get_json()['data']['id'] for nombre in ('Rosa', 'Tulipán')]
+
+        response = client.get(f'/api/plantas?ids={ids[1]},{ids[0]},99999')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [p['nombre'] for p in data['data']] == ['Tulipán', 'Rosa']
+        assert data['not_found'] == [99999]
+
+        for fuera_de_rango in (2 ** 70, 2 ** 63, 0, -1):
+            response = client.get(f'/api/plantas?ids={ids[0]},{fuera_de_rango}')
+            assert response.status_code == 400
+            assert response.get_json()['success'] is False
+
+    def test_exportar_plantas_en_streaming(self, client, monkeypatch):
+        """Test: GET /api/plantas?stream=1 devuelve todas las filas sin límite de página"""
+        import streaming
+        monkeypatch.setattr(streaming, 'STREAM_CHUNK_SIZE', 2)
+        for i in range(5):
+            client.post('/api/plantas', json={
+                'nombre': f'Exportada {i}',
+                'tipo': 'Interior',
+                'ubicacion': 'Sala',
+                'frecuencia_riego_dias': 7
+            })
+        paginado = client.get('/api/plantas?limit=1000').get_json()
+
+        response = client.get('/api/plantas?stream=1')
+        assert response.status_code == 200
+        assert response.is_streamed
+        data = response.get_json()
+        assert data['success'] is True
+        assert data['data'] == paginado['data']
+        assert data['count'] == len(paginado['data'])
+
+        ultimo = paginado['data'][-1]['id']
+        vacio = client.get(f'/api/plantas?stream=1&after_id={ultimo}').get_json()
+        assert vacio == {'success': True, 'data': [], 'count': 0}
+        assert client.get('/api/plantas?stream=1&limit=2').get_json()['count'] == 2
+
+    def test_parametro_fields(self, client):
+        """Test: ?fields= en el listado y el detalle de plantas"""
+        planta_id = client.post('/api/plantas', json={
+            'nombre': 'Potus',
+            'tipo': 'Interior',
+            'ubicacion': 'Cocina',
+            'frecuencia_riego_dias': 4
+        }).get_json()['data']['id']
+
+        data = client.get(f'/api/plantas/{planta_id}?fields=nombre').get_json()['data']
+        assert data == {'id': planta_id, 'nombre': 'Potus'}
+
+        response = client.get(f'/api/plantas?after_id={planta_id - 1}&fields=nombre,frecuencia_riego_dias')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['data'] == [{'id': planta_id, 'nombre': 'Potus', 'frecuencia_riego_dias': 4}]
+        assert data['next_cursor'] is None
+
+        respuesta = client.get(f'/api/plantas?ids={planta_id}&fields=tipo').get_json()
+        assert respuesta['data'] == [{'id': planta_id, 'tipo': 'Interior'}]
+
+        assert client.get('/api/plantas?fields=notas').status_code == 400
+        assert client.get(f'/api/plantas/{planta_id}?fields=').status_code == 400
+
+    def test_filtrar_y_ordenar_plantas(self, client):
+        """Test: GET /api/plantas con filtros, sort y next_cursor"""
+        for nombre, frecuencia in (('Zinnia', 2), ('Zarzamora', 5), ('Zapallo', 3)):
+            client.post('/api/plantas', json={
+                'nombre': nombre,
+                'tipo': 'Exterior',
+                'ubicacion': 'Parcela',
+                'frecuencia_riego_dias': frecuencia
+            })
+
+        primera = client.get('/api/plantas?ubicacion=Parcela&sort=-frecuencia_riego_dias&limit=2').get_json()
+        assert [p['nombre'] for p in primera['data']] == ['Zarzamora', 'Zapallo']
+        segunda = client.get('/api/plantas?ubicacion=Parcela&sort=-frecuencia_riego_dias&limit=2'
+                             f"&after_id={primera['next_cursor']}").get_json()
+        assert [p['nombre'] for p in segunda['data']] == ['Zinnia']
+        assert segunda['next_cursor'] is None
+
+        data = client.get('/api/plantas?nombre=Za&sort=nombre&frecuencia_max=4').get_json()['data']
+        assert [p['nombre'] for p in data] == ['Zapallo']
+
+        assert client.get('/api/plantas?sort=notas').status_code == 400
+        assert client.get('/api/plantas?frecuencia_min=x').status_code == 400
+        assert client.get(f'/api/plantas?frecuencia_min={2 ** 70}').status_code == 400
+        assert client.get(f'/api/plantas?frecuencia_max={2 ** 63}&stream=1').status_code == 400
+        assert client.get(f'/api/plantas?frecuencia_max={2 ** 63 - 1}').status_code == 200
+
+    def test_tipos_invalidos_en_alta_y_actualizacion(self, client):
+        """Test: Un campo null u objeto responde 400 en POST y PUT en lugar de 500"""
+        response = client.post('/api/plantas', json={'nombre': None, 'tipo': 'Interior',
+                                                     'ubicacion': 'Sala', 'frecuencia_riego_dias': 7})
+        assert response.status_code == 400
+        planta_id = client.post('/api/plantas', json={'nombre': 'Pilea', 'tipo': 'Interior',
+                                                      'ubicacion': 'Sala', 'frecuencia_riego_dias': 7}
+                                ).get_json()['data']['id']
+        response = client.post('/api/plantas', json={'nombre': 'Pilea', 'tipo': 'Interior',
+                                                     'ubicacion': 'Sala', 'frecuencia_riego_dias': 10 ** 23})
+        assert response.status_code == 400
+        for cambio in ({'nombre': None}, {'ubicacion': {'piso': 2}}, {'frecuencia_riego_dias': 'x'},
+                       {'frecuencia_riego_dias': 2 ** 63}):
+            assert client.put(f'/api/plantas/{planta_id}', json=cambio).status_code == 400
+        assert client.get(f'/api/plantas/{planta_id}').get_json()['data']['nombre'] == 'Pilea'
+
+    def test_cursor_por_valor(self, client):
+        """Test: next_cursor con otro orden lleva el valor y sobrevive al borrado de su fila"""
+        for nombre in ('Zinnia A', 'Zinnia B', 'Zinnia C', 'Zinnia D'):
+            client.post('/api/plantas', json={'nombre': nombre, 'tipo': 'Exterior',
+                                              'ubicacion': 'Cantero', 'frecuencia_riego_dias': 2})
+        url = '/api/plantas?ubicacion=Cantero&sort=nombre&limit=2&fields=tipo'
+        primera = client.get(url).get_json()
+        assert [p['id'] for p in primera['data']] == sorted(p['id'] for p in primera['data'])
+        # La columna del orden se usa para el cursor pero no se agrega a la respuesta
+        assert set(primera['data'][0]) == {'id', 'tipo'}
+        client.delete(f"/api/plantas/{primera['data'][-1]['id']}")
+
+        segunda = client.get(f"{url}&after_id={primera['next_cursor']}").get_json()
+        assert len(segunda['data']) == 2 and segunda['next_cursor'] is None
+        completa = client.get('/api/plantas?ubicacion=Cantero&sort=nombre&after_id='
+                              f"{primera['next_cursor']}&stream=1").get_json()
+        assert [p['nombre'] for p in completa['data']] == ['Zinnia C', 'Zinnia D']
+
+        assert client.get('/api/plantas?sort=nombre&after_id=%%%').status_code == 400
+        assert client.get(f"/api/plantas?sort=tipo&after_id={primera['next_cursor']}").status_code == 400
+        # Cursor numérico de una fila borrada con otro orden: 400 en vez de una página vacía
+        assert client.get(f"/api/plantas?sort=nombre&after_id={primera['data'][-1]['id']}").status_code == 400
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
 